@@ -8,16 +8,19 @@ import zipfile
 import psutil
 import platform
 from flask import Flask, render_template, redirect, url_for, session
-from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from dotenv import load_dotenv
 from flask import send_from_directory
 from routes.user_routes import user_bp
 from routes.admin_routes import admin_bp
 from routes.contact_routes import contact_bp
 from routes.bot_manager import bot_bp
+from routes.job_routes import job_bp
 from auth_google import auth_bp, init_oauth
-from utils.db_utils import get_all_users
-from utils.upload_utils import get_user_paths
+from utils.app_dispatcher import UserAppDispatcher, discover_user_apps
+from utils.app_registry import get_registry
+from utils.app_limiter import limiter_from_env
+from utils.db_utils import close_pool, init_request_db
+from utils.migrations import ensure_schema
 
 load_dotenv()
 
@@ -27,11 +30,13 @@ app.config['SESSION_TYPE'] = 'filesystem'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
 
 init_oauth(app)
+init_request_db(app)
 
 app.register_blueprint(user_bp, url_prefix="/user")
 app.register_blueprint(admin_bp, url_prefix="/admin")
 app.register_blueprint(contact_bp, url_prefix="/contact")
 app.register_blueprint(bot_bp, url_prefix="/bot")
+app.register_blueprint(job_bp, url_prefix="/jobs")
 app.register_blueprint(auth_bp)
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -41,49 +46,54 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(STATIC_IMAGE_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+APP_MOUNT_MODE = os.getenv("APP_MOUNT_MODE", "lazy")  # "lazy" imports apps on first request, "eager" at boot
+APP_HOSTING = os.getenv("APP_HOSTING", "inprocess")  # "subprocess" runs each app in its own venv process
+APP_MEMORY_BUDGET_MB = int(os.getenv("APP_MEMORY_BUDGET_MB", "0"))  # 0 disables idle-app eviction
+ASYNC_WORKERS = os.getenv("GUNICORN_WORKER_CLASS") == "eventlet"
+
 def register_all_apps():
-    from importlib.util import spec_from_file_location, module_from_spec
-    from importlib import invalidate_caches
-
-    mapping = {}
-
-    all_users = get_all_users()
-
-    for user in all_users:
-        google_id = user["google_id"]
-        user_id = str(user["id"])
-        base_path, script_dir, venv_path = get_user_paths(google_id)
-
-        if not os.path.isdir(script_dir):
-            continue
-
-        for folder in os.listdir(script_dir):
-            app_dir = os.path.join(script_dir, folder)
-            main_file = os.path.join(app_dir, "main.py")
-
-            if os.path.isdir(app_dir) and os.path.exists(main_file):
-                try:
-                    invalidate_caches()
-                    modname = f"{google_id}_{folder}_app"
-                    spec = spec_from_file_location(modname, main_file)
-                    if spec and spec.loader:
-                        module = module_from_spec(spec)
-                        sys.modules[modname] = module
-                        spec.loader.exec_module(module)
-
-                        if hasattr(module, "app"):
-                            mount_path = f"/u/{user_id}/{folder}"
-                            mapping[mount_path] = module.app
-                            print(f"✅ Mounted: {mount_path}")
-                        else:
-                            print(f"⚠️ No app found in {main_file}")
-                    else:
-                        print(f"❌ Could not create spec for {main_file}")
-                except Exception as e:
-                    print(f"❌ Failed to load {folder} for user {user_id}: {e}")
-
-    app.wsgi_app = DispatcherMiddleware(app.wsgi_app, mapping)
-    print("✅ All user apps registered successfully.")
+    # Full scan, done once at boot. Later uploads/deletes reach every worker
+    # through the registry journal (see utils/app_registry.py).
+    registry = get_registry()
+    registry.snapshot()
+    mounts = discover_user_apps()
+
+    dispatcher = app.extensions.get("user_app_dispatcher")
+    if dispatcher is None:
+        dispatcher = UserAppDispatcher(app.wsgi_app, mounts, lazy=APP_MOUNT_MODE != "eager",
+                                       registry=registry, hosting=APP_HOSTING,
+                                       memory_budget=APP_MEMORY_BUDGET_MB * 1024 * 1024,
+                                       limiter=limiter_from_env(), retry_after=int(os.getenv("APP_RETRY_AFTER", "5")),
+                                       async_check=ASYNC_WORKERS,
+                                       load_retry=int(os.getenv("APP_LOAD_RETRY_SECONDS", "30")))
+        app.wsgi_app = dispatcher
+        app.extensions["user_app_dispatcher"] = dispatcher
+    else:
+        dispatcher.set_mounts(mounts)
+
+    print(f"✅ {len(mounts)} user apps registered ({APP_MOUNT_MODE} mode, {APP_HOSTING} hosting).")
+
+def before_fork():
+    """Called in the gunicorn master (preload mode) once all apps are imported."""
+    dispatcher = app.extensions.get("user_app_dispatcher")
+    if dispatcher is not None:
+        # Import-time stats are recorded once, under the master's pid
+        dispatcher.stats.flush()
+    # Workers open their own DB connections (the pool resets itself on a pid change)
+    close_pool()
+
+def reinit_after_fork():
+    """Reset per-process state inherited from the gunicorn master (preload mode)."""
+    import threading
+    from utils.app_stats import AppStats
+
+    dispatcher = app.extensions.get("user_app_dispatcher")
+    if dispatcher is not None:
+        dispatcher.lock = threading.RLock()
+        hosts = dispatcher.stats.hosts
+        dispatcher.stats = AppStats()
+        dispatcher.stats.hosts = hosts
+    print(f"✅ Worker {os.getpid()} reinitialized after fork.")
 
 @app.route("/")
 def home():
@@ -99,6 +109,14 @@ def admin_login_page():
         return redirect(url_for("admin_bp.admin_panel"))
     return redirect(url_for("user_bp.admin_login"))
 
+# Serialised by a file lock, so every worker can call it; only the first one does work.
+# Serving on an older schema would fail on every request, so a failure stops startup here.
+try:
+    ensure_schema(auto_migrate=os.getenv("DB_AUTO_MIGRATE", "1") == "1")
+except Exception as e:
+    print(f"❌ Database schema is not up to date, not starting: {e}")
+    raise
+
 register_all_apps()
 
 
@@ -1,35 +1,60 @@
 from flask import Blueprint, redirect, url_for, session, request, current_app
-from utils.db_utils import get_db
+from utils.db_utils import db_cursor
+from utils.oidc_cache import load_provider_metadata, OIDC_METADATA_TTL
 from authlib.integrations.flask_client import OAuth
+from authlib.integrations.base_client.registry import OAUTH_CLIENT_PARAMS
 import os
+import time
+import mysql.connector
 
 auth_bp = Blueprint('auth_bp', __name__)
 oauth = OAuth()
 
+GOOGLE_METADATA_URL = os.getenv("GOOGLE_METADATA_URL", "https://accounts.google.com/.well-known/openid-configuration")
+
+def _google_metadata(fetch=True):
+    """Provider metadata and JWKS from the disk cache (utils/oidc_cache.py); with fetch=False the network is never used."""
+    metadata = load_provider_metadata(GOOGLE_METADATA_URL, fetch=fetch)
+    return {key: value for key, value in metadata.items() if key not in OAUTH_CLIENT_PARAMS}
+
 def init_oauth(app):
     oauth.init_app(app)
-
+    # Registered once per process. No network at import (every worker, every CLI);
+    # metadata is fetched on the first login if not cached.
     oauth.register(
         name='google',
         client_id=os.getenv("GOOGLE_CLIENT_ID"),
         client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-        server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
+        server_metadata_url=GOOGLE_METADATA_URL,
         client_kwargs={
             'scope': 'openid email profile',
-        }
+        },
+        # Pre-loaded metadata ("_loaded_at", "jwks") stops authlib fetching it on first use
+        **_google_metadata(fetch=False)
     )
 
+def ensure_google_metadata():
+    """Refresh the Google metadata once this worker's copy is missing or older than the TTL."""
+    metadata = oauth.google.server_metadata
+    if time.time() - metadata.get('_loaded_at', 0) > OIDC_METADATA_TTL:
+        # The same dict authlib itself fills in load_server_metadata()
+        metadata.update(_google_metadata())
+
 @auth_bp.route('/login')
 def login():
     if 'google_id' in session:
         return redirect(url_for('user_bp.dashboard'))
     
+    # Long-running workers pick up refreshed metadata once their copy is older than the TTL
+    ensure_google_metadata()
+
     redirect_uri = url_for('auth_bp.callback', _external=True)
     return oauth.google.authorize_redirect(redirect_uri)
 
 @auth_bp.route('/login/callback')
 def callback():
     try:
+        ensure_google_metadata()
         token = oauth.google.authorize_access_token()
         userinfo = token['userinfo']
 
@@ -37,27 +62,24 @@ def callback():
         session['email'] = userinfo['email']
         session['name'] = userinfo.get('name', '')
 
-        # Check and Insert into database
-        conn = get_db()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT id FROM clients WHERE google_id = %s", (session['google_id'],))
-        user = cursor.fetchone()
-
-        if not user:
-            cursor.execute(
-                "INSERT INTO clients (google_id, email, name, plan) VALUES (%s, %s, %s, %s)",
-                (session['google_id'], session['email'], session['name'], 'free')
-            )
-            conn.commit()
-
-        # Fetch user_id and store in session
-        cursor.execute("SELECT id FROM clients WHERE google_id = %s", (session['google_id'],))
-        user = cursor.fetchone()
-        session['user_id'] = user[0]
-
-        cursor.close()
-        conn.close()
+        with db_cursor(commit=True) as cursor:
+            # Returning users (nearly every login) cost one read on uq_clients_google_id; only a first
+            # login inserts, so AUTO_INCREMENT ids aren't burnt the way INSERT ... ON DUPLICATE KEY does
+            cursor.execute("SELECT id FROM clients WHERE google_id = %s", (session['google_id'],))
+            user = cursor.fetchone()
+            if user:
+                session['user_id'] = user[0]
+            else:
+                try:
+                    cursor.execute(
+                        "INSERT INTO clients (google_id, email, name, plan) VALUES (%s, %s, %s, %s)",
+                        (session['google_id'], session['email'], session['name'], 'free')
+                    )
+                    session['user_id'] = cursor.lastrowid
+                except mysql.connector.IntegrityError:
+                    # A concurrent first login inserted the row; a locking read sees it despite our snapshot
+                    cursor.execute("SELECT id FROM clients WHERE google_id = %s FOR UPDATE", (session['google_id'],))
+                    session['user_id'] = cursor.fetchone()[0]
 
         return redirect(url_for('user_bp.post_login'))
 
@@ -0,0 +1,87 @@
+"""
+Benchmark: in-process dispatch vs out-of-process hosting (utils/app_proxy.py)
+for a small Flask app.
+
+    python benchmarks/bench_hosting.py [--requests 2000]
+
+The app has no venv of its own here, so the host process runs on the
+platform interpreter; latency is the same with a real per-app venv.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench_hosting_")
+os.environ["APP_HOST_RUN_DIR"] = os.path.join(WORK_DIR, "run")
+
+from werkzeug.test import EnvironBuilder
+from utils.app_dispatcher import load_user_app
+from utils.app_proxy import ProxyApp
+
+SAMPLE_APP = '''
+from flask import Flask, jsonify, request
+app = Flask(__name__)
+
+@app.route("/")
+def index():
+    return "<h1>hello</h1>" * 50
+
+@app.route("/echo", methods=["POST"])
+def echo():
+    return jsonify(size=len(request.get_data()))
+'''
+
+
+def run(app, requests, path, method="GET", data=None):
+    latencies = []
+    for _ in range(requests):
+        environ = EnvironBuilder(path=path, method=method, data=data).get_environ()
+        started = time.perf_counter()
+        body = b"".join(app(environ, lambda status, headers, exc_info=None: None))
+        latencies.append(time.perf_counter() - started)
+        assert body
+    latencies.sort()
+    total = sum(latencies)
+    return requests / total, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    app_dir = os.path.join(WORK_DIR, "demo")
+    os.makedirs(app_dir)
+    main_file = os.path.join(app_dir, "main.py")
+    with open(main_file, "w") as f:
+        f.write(SAMPLE_APP)
+
+    started = time.perf_counter()
+    in_process = load_user_app("bench_demo_app", main_file)
+    in_process_cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    proxied = ProxyApp("/u/0/demo", main_file).start()
+    proxied_cold = time.perf_counter() - started
+
+    try:
+        print(f"cold start: in-process {in_process_cold * 1000:.0f} ms, subprocess {proxied_cold * 1000:.0f} ms")
+        print(f"{'case':<22} {'mode':<11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        cases = [("GET / (2.5 KB)", "/", "GET", None), ("POST /echo (256 KB)", "/echo", "POST", b"x" * 256 * 1024)]
+        for label, path, method, data in cases:
+            for mode, app in (("in-process", in_process), ("subprocess", proxied)):
+                rps, p50, p99 = run(app, args.requests, path, method, data)
+                print(f"{label:<22} {mode:<11} {rps:>8.0f} {p50:>8.2f} {p99:>8.2f}")
+    finally:
+        proxied.process.stop()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
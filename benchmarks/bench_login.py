@@ -0,0 +1,154 @@
+"""
+Benchmark: first Google login on a cold worker, against a local stand-in
+OpenID provider (metadata, JWKS and token endpoints with --latency seconds
+of simulated network delay per call).
+
+    python benchmarks/bench_login.py [--rounds 20] [--latency 0.05] [--db]
+
+Each round re-registers the OAuth client, as a freshly started worker does,
+then runs /login and /login/callback. Scenarios:
+  no cache     authlib fetches metadata and JWKS during the first login
+  cache miss   utils/oidc_cache.py fetches them once and writes the file
+  cache hit    metadata and JWKS come from the disk cache
+
+Without --db the clients upsert runs against an in-memory stand-in, so only
+the OAuth part is timed; with --db it uses the MySQL from .env.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench_login_")
+os.environ["APP_REGISTRY_DIR"] = WORK_DIR
+
+from joserfc import jwt
+from joserfc.jwk import RSAKey, KeySet
+
+CLIENT_ID = "bench-client"
+KEY = RSAKey.generate_key(2048, parameters={"kid": "bench"})
+LATENCY = 0.05
+
+
+class StandInProvider(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _json(self, body):
+        time.sleep(LATENCY)
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        base = f"http://127.0.0.1:{self.server.server_port}"
+        if self.path == "/.well-known/openid-configuration":
+            self._json({"issuer": base, "authorization_endpoint": base + "/authorize",
+                        "token_endpoint": base + "/token", "jwks_uri": base + "/jwks",
+                        "id_token_signing_alg_values_supported": ["RS256"]})
+        elif self.path == "/jwks":
+            self._json(KeySet([KEY]).as_dict(private=False))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        now = int(time.time())
+        # The benchmark passes the login's nonce as the authorization code
+        claims = {"iss": f"http://127.0.0.1:{self.server.server_port}", "aud": CLIENT_ID, "sub": "1234567890",
+                  "email": "bench@example.com", "name": "Bench", "nonce": form["code"][0],
+                  "iat": now, "exp": now + 3600}
+        self._json({"access_token": "bench-token", "token_type": "Bearer", "expires_in": 3600,
+                    "id_token": jwt.encode({"alg": "RS256", "kid": "bench"}, claims, KEY)})
+
+
+class FakeUpsertCursor:
+    """In-memory stand-in for the clients upsert (no --db)."""
+    ids = {}
+    lastrowid = None
+
+    def execute(self, sql, params):
+        self.lastrowid = self.ids.setdefault(params[0], len(self.ids) + 1)
+
+
+def main():
+    global LATENCY
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--db", action="store_true")
+    args = parser.parse_args()
+    LATENCY = args.latency
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GOOGLE_METADATA_URL"] = f"http://127.0.0.1:{server.server_port}/.well-known/openid-configuration"
+    os.environ["GOOGLE_CLIENT_ID"] = CLIENT_ID
+    os.environ["GOOGLE_CLIENT_SECRET"] = "bench-secret"
+
+    from contextlib import contextmanager
+    from flask import Flask, Blueprint
+    import auth_google
+    from utils import oidc_cache
+
+    if not args.db:
+        @contextmanager
+        def fake_db_cursor(**kwargs):
+            yield FakeUpsertCursor()
+        auth_google.db_cursor = fake_db_cursor
+
+    app = Flask(__name__)
+    app.secret_key = "bench"
+    user_bp = Blueprint("user_bp", __name__)
+    user_bp.add_url_rule("/post-login", "post_login", lambda: "ok")
+    app.register_blueprint(user_bp)
+    app.register_blueprint(auth_google.auth_bp)
+    auth_google.init_oauth(app)
+
+    def cold_login():
+        started = time.perf_counter()
+        auth_google.register_google()  # what a freshly started worker does
+        client = app.test_client()
+        location = client.get("/login").headers["Location"]
+        query = parse_qs(urlparse(location).query)
+        resp = client.get(f"/login/callback?code={query['nonce'][0]}&state={query['state'][0]}")
+        assert resp.headers["Location"].endswith("/post-login"), resp.headers["Location"]
+        return time.perf_counter() - started
+
+    cache_dir = oidc_cache.OIDC_CACHE_DIR
+    real_loader = auth_google.load_provider_metadata
+    scenarios = {
+        "no cache": lambda: auth_google.__dict__.update(load_provider_metadata=lambda url: {}),
+        "cache miss": lambda: (auth_google.__dict__.update(load_provider_metadata=real_loader),
+                               shutil.rmtree(cache_dir, ignore_errors=True)),
+        "cache hit": lambda: auth_google.__dict__.update(load_provider_metadata=real_loader),
+    }
+
+    print(f"Stand-in provider latency: {LATENCY * 1000:.0f} ms per call, {args.rounds} cold logins each")
+    for name, prepare in scenarios.items():
+        times = []
+        for _ in range(args.rounds):
+            prepare()
+            times.append(cold_login())
+        times.sort()
+        print(f"{name:>10}: median {times[len(times) // 2] * 1000:7.1f} ms   "
+              f"p90 {times[int(len(times) * 0.9)] * 1000:7.1f} ms")
+
+    server.shutdown()
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: werkzeug DispatcherMiddleware vs UserAppDispatcher (MountRouter)
+for /u/<user_id>/<folder> lookups at 10, 1k and 50k mounts.
+
+    python benchmarks/bench_router.py [--requests 200000]
+"""
+import os
+import sys
+import random
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from utils.app_dispatcher import UserAppDispatcher
+
+
+def hosted_app(environ, start_response):
+    return environ["PATH_INFO"]
+
+
+def platform_app(environ, start_response):
+    return "platform"
+
+
+def build(mount_count, apps_per_user=5):
+    mount_paths = [f"/u/{i // apps_per_user}/app_{i % apps_per_user}" for i in range(mount_count)]
+
+    werkzeug_dispatcher = DispatcherMiddleware(platform_app, {p: hosted_app for p in mount_paths})
+
+    router_dispatcher = UserAppDispatcher(platform_app, {p: (p, None) for p in mount_paths})
+    for p in mount_paths:  # skip the import step
+        router_dispatcher.router.match(p)[0].app = hosted_app
+    return mount_paths, werkzeug_dispatcher, router_dispatcher
+
+
+def bench(dispatcher, paths, rounds):
+    def run():
+        for path in paths:
+            dispatcher({"PATH_INFO": path, "SCRIPT_NAME": ""}, None)
+    seconds = min(timeit.repeat(run, number=1, repeat=rounds))
+    return seconds / len(paths) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mounts':>8} {'werkzeug ns/req':>16} {'router ns/req':>14} {'speedup':>8}")
+    for mount_count in (10, 1000, 50000):
+        mount_paths, werkzeug_dispatcher, router_dispatcher = build(mount_count)
+        rng = random.Random(mount_count)
+        # Mix of deep app URLs, app roots and platform URLs that miss every mount
+        paths = []
+        for _ in range(args.requests):
+            pick = rng.random()
+            if pick < 0.7:
+                paths.append(rng.choice(mount_paths) + "/static/js/app.js")
+            elif pick < 0.9:
+                paths.append(rng.choice(mount_paths))
+            else:
+                paths.append("/user/dashboard")
+
+        werkzeug_ns = bench(werkzeug_dispatcher, paths, args.rounds)
+        router_ns = bench(router_dispatcher, paths, args.rounds)
+        print(f"{mount_count:>8} {werkzeug_ns:>16.0f} {router_ns:>14.0f} {werkzeug_ns / router_ns:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark: creating an app venv with `python -m venv` per upload (the old
+path) vs claiming a pre-built one from utils/venv_pool.py.
+
+    python benchmarks/bench_venv_pool.py [--rounds 5]
+
+Pool fill time is reported separately: it happens in the background, off
+the upload path. Each claimed venv is checked by running its pip.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench_venv_pool_")
+os.environ["APP_REGISTRY_DIR"] = os.path.join(WORK_DIR, "registry")
+
+
+def median(times):
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    os.environ["VENV_POOL_SIZE"] = str(args.rounds)
+
+    from utils import venv_pool
+    bin_dir = "Scripts" if os.name == "nt" else "bin"
+
+    subprocess_times = []
+    for i in range(args.rounds):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "venv", os.path.join(WORK_DIR, f"plain{i}")], check=True)
+        subprocess_times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    venv_pool.refill()
+    fill_seconds = time.perf_counter() - started
+
+    claim_times = []
+    for i in range(args.rounds):
+        venv_path = os.path.join(WORK_DIR, f"claimed{i}")
+        started = time.perf_counter()
+        assert venv_pool.claim(venv_path), "pool ran dry"
+        claim_times.append(time.perf_counter() - started)
+        subprocess.run([os.path.join(venv_path, bin_dir, "pip"), "--version"], check=True, capture_output=True)
+
+    print(f"python -m venv per upload: median {median(subprocess_times) * 1000:8.1f} ms")
+    print(f"claim from pool:           median {median(claim_times) * 1000:8.1f} ms")
+    print(f"(background fill of {args.rounds} venvs: {fill_seconds:.1f}s)")
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
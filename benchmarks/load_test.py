@@ -0,0 +1,180 @@
+"""
+Load test: sync vs eventlet gunicorn workers on an I/O-bound bot.
+
+Starts a local upstream that answers after --upstream-delay seconds (standing
+in for the sites bots scrape) and a small Flask bot that calls it once per
+request. The bot is mounted at /u/1/bot behind the platform's own
+UserAppDispatcher and limiter (as app.py builds them, minus the DB-backed
+app discovery) and served by gunicorn with gunicorn.conf.py for each worker
+class; --clients concurrent keep-alive clients drive it for --duration
+seconds. Shed requests (503 from the per-app limiter) are counted apart from
+errors.
+
+    python benchmarks/load_test.py [--workers 3] [--clients 50] [--duration 10]
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MOUNT_PATH = "/u/1/bot"
+
+BOT_APP = '''
+import os
+import requests
+from flask import Flask
+
+app = Flask(__name__)
+UPSTREAM = os.environ["UPSTREAM_URL"]
+
+@app.route("/")
+def scrape():
+    return requests.get(UPSTREAM, timeout=30).text
+'''
+
+# The platform's WSGI stack in front of the bot
+PLATFORM_APP = '''
+import os
+import sys
+sys.path.insert(0, os.environ["PLATFORM_ROOT"])
+from flask import Flask
+from utils.app_dispatcher import UserAppDispatcher
+from utils.app_limiter import limiter_from_env
+
+platform = Flask("platform")
+app = UserAppDispatcher(platform.wsgi_app, {os.environ["BOT_MOUNT"]: ("load_test_bot", os.environ["BOT_MAIN"])},
+                        limiter=limiter_from_env(), async_check=os.getenv("GUNICORN_WORKER_CLASS") == "eventlet")
+'''
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_upstream(delay):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = b"<html>question data</html>"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_for(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("gunicorn did not start")
+
+
+def drive(port, clients, duration):
+    latencies = []
+    errors = [0]
+    shed = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        mine = []
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", MOUNT_PATH + "/")
+                response = conn.getresponse()
+                response.read()
+                if response.status == 503:
+                    with lock:
+                        shed[0] += 1
+                    continue
+                if response.status != 200:
+                    raise RuntimeError(response.status)
+                mine.append(time.perf_counter() - started)
+            except Exception:
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    p = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000 if latencies else 0
+    return len(latencies) / elapsed, p(0.5), p(0.99), shed[0], errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--upstream-delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    upstream = start_upstream(args.upstream_delay)
+    work_dir = tempfile.mkdtemp(prefix="load_test_")
+    bot_dir = os.path.join(work_dir, "bot")
+    os.makedirs(bot_dir)
+    with open(os.path.join(bot_dir, "main.py"), "w") as f:
+        f.write(BOT_APP)
+    with open(os.path.join(work_dir, "platform_app.py"), "w") as f:
+        f.write(PLATFORM_APP)
+
+    env = dict(os.environ, UPSTREAM_URL=f"http://127.0.0.1:{upstream.server_port}/", PLATFORM_ROOT=ROOT,
+               BOT_MOUNT=MOUNT_PATH, BOT_MAIN=os.path.join(bot_dir, "main.py"),
+               APP_REGISTRY_DIR=os.path.join(work_dir, "registry"),  # limiter slot files
+               GUNICORN_WORKERS=str(args.workers), GUNICORN_PRELOAD="0", GUNICORN_WORKER_CONNECTIONS="1000")
+    print(f"{args.clients} clients, {args.workers} workers, upstream delay {args.upstream_delay * 1000:.0f} ms")
+    print(f"{'worker':<10} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'shed':>7} {'errors':>7}")
+    try:
+        for worker_class in ("sync", "eventlet"):
+            port = free_port()
+            server = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "platform_app:app", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+                 "-b", f"127.0.0.1:{port}", "--log-level", "warning"],
+                cwd=work_dir, env=dict(env, GUNICORN_WORKER_CLASS=worker_class), stdout=subprocess.DEVNULL)
+            try:
+                wait_for(port)
+                rps, p50, p99, shed, errors = drive(port, args.clients, args.duration)
+                print(f"{worker_class:<10} {rps:>8.1f} {p50:>9.0f} {p99:>9.0f} {shed:>7} {errors:>7}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        upstream.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Check read-replica routing (DB_REPLICA_HOSTS in utils/db_utils.py) against
+two local MySQL instances, e.g. a primary on 3306 and a replica on 3307:
+
+    docker run -d -p 3306:3306 -e MYSQL_ALLOW_EMPTY_PASSWORD=1 -e MYSQL_DATABASE=bot-database mysql:8
+    docker run -d -p 3307:3306 -e MYSQL_ALLOW_EMPTY_PASSWORD=1 -e MYSQL_DATABASE=bot-database mysql:8
+    DB_REPLICA_HOSTS=127.0.0.1:3307 python benchmarks/replica_routing.py
+
+Replication is not required: the script only reports which server (by
+@@port) answered each read. It expects:
+  1. a fresh session reads from the replica,
+  2. the same session reads from the primary right after it commits a write,
+  3. reads fall back to the primary when the replica is unreachable.
+"""
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from flask import Flask
+import utils.db_utils as db_utils
+from utils.db_utils import db_cursor, init_request_db, pool_stats
+
+
+def served_by():
+    with db_cursor(read_only=True) as cursor:
+        cursor.execute("SELECT @@port")
+        return cursor.fetchone()[0]
+
+
+def main():
+    if not db_utils.DB_REPLICA_HOSTS:
+        sys.exit("Set DB_REPLICA_HOSTS (e.g. 127.0.0.1:3307) to the second instance first.")
+
+    app = Flask(__name__)
+    app.secret_key = "replica-check"
+    init_request_db(app)
+
+    @app.route("/read")
+    def read():
+        return str(served_by())
+
+    @app.route("/write-then-read")
+    def write_then_read():
+        with db_cursor(commit=True) as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS replica_check (id INT PRIMARY KEY)")
+        return str(served_by())
+
+    client = app.test_client()
+    print(f"1. fresh session read          -> port {client.get('/read').get_data(as_text=True)}")
+    print(f"2. read in the writing request -> port {client.get('/write-then-read').get_data(as_text=True)}")
+    print(f"   next read, same session     -> port {client.get('/read').get_data(as_text=True)}")
+    print(f"   read, other session         -> port {app.test_client().get('/read').get_data(as_text=True)}")
+
+    replica = db_utils.get_replicas()[0]
+    replica.pool.close_all()
+    replica.host, replica.port = "127.0.0.1", "1"  # nothing listens there
+    print(f"3. replica unreachable         -> port {app.test_client().get('/read').get_data(as_text=True)}")
+    print(pool_stats())
+
+
+if __name__ == "__main__":
+    main()
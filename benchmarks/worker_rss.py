@@ -0,0 +1,47 @@
+"""
+Per-worker memory of a running gunicorn: RSS, USS (private) and PSS
+(proportional share) for the master and each worker.
+
+    python benchmarks/worker_rss.py --pid <gunicorn master pid>
+
+Run it once with GUNICORN_PRELOAD=0 and once with GUNICORN_PRELOAD=1, after
+the same warm-up traffic. With preload, worker USS drops because the
+platform and user apps live in pages shared with the master; RSS alone
+hides this since shared pages are counted in every worker.
+"""
+import argparse
+import psutil
+
+MB = 1024 * 1024
+
+
+def describe(process):
+    try:
+        info = process.memory_full_info()
+    except psutil.AccessDenied:
+        info = process.memory_info()
+    return info.rss, getattr(info, "uss", 0), getattr(info, "pss", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pid", type=int, required=True, help="gunicorn master pid")
+    args = parser.parse_args()
+
+    master = psutil.Process(args.pid)
+    workers = master.children()
+
+    print(f"{'process':<16} {'RSS MB':>8} {'USS MB':>8} {'PSS MB':>8}")
+    totals = [0, 0, 0]
+    for label, process in [("master", master)] + [(f"worker {w.pid}", w) for w in workers]:
+        rss, uss, pss = describe(process)
+        print(f"{label:<16} {rss / MB:>8.1f} {uss / MB:>8.1f} {pss / MB:>8.1f}")
+        for i, value in enumerate((rss, uss, pss)):
+            totals[i] += value
+    print(f"{'total':<16} {totals[0] / MB:>8.1f} {totals[1] / MB:>8.1f} {totals[2] / MB:>8.1f}")
+    if workers:
+        print(f"avg worker USS: {sum(describe(w)[1] for w in workers) / len(workers) / MB:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Gunicorn settings for the bot manager (used by gunicorn_start.sh).
+#
+# GUNICORN_PRELOAD=1 imports the platform and every user app once in the
+# master; workers fork from it and share those pages copy-on-write instead
+# of each importing razorpay, authlib and all bots on their own.
+import os
+import gc
+import sys
+from dotenv import load_dotenv
+
+# Read .env before the settings below; app.py loads it too late for them
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+workers = int(os.getenv("GUNICORN_WORKERS", "3"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+# GUNICORN_WORKER_CLASS=eventlet serves many I/O-bound bot requests per worker
+# cooperatively. Check the hosted apps first: python -m utils.async_compat
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+if worker_class == "eventlet":
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+    # Long-polling bots must not be killed by the sync-style request timeout
+    timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+    # The mysql-connector C extension would block the whole hub on every query
+    os.environ.setdefault("DB_USE_PURE", "1")
+
+if preload_app:
+    # Lazy mounting would import apps after fork, in every worker; load them in the master instead
+    os.environ.setdefault("APP_MOUNT_MODE", "eager")
+
+
+def when_ready(server):
+    app_module = sys.modules.get("app")
+    if preload_app and app_module is not None:
+        app_module.before_fork()
+        # Move everything loaded so far out of the GC's reach so collections
+        # in the workers don't write to (and un-share) those pages
+        gc.freeze()
+        server.log.info("Preloaded platform and user apps; gc frozen before fork")
+
+
+def post_fork(server, worker):
+    app_module = sys.modules.get("app")
+    if preload_app and app_module is not None:
+        app_module.reinit_after_fork()
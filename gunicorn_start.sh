@@ -3,8 +3,9 @@ echo "🔋 Activating virtual environment..."
 source /home/bot-ssh/htdocs/bot.online2study.in/venv/bin/activate
 
 echo "🚀 Starting Gunicorn with UNIX socket..."
+# Worker count and preload mode come from gunicorn.conf.py (GUNICORN_WORKERS, GUNICORN_PRELOAD)
 exec gunicorn app:app \
+    --config gunicorn.conf.py \
     --bind unix:/home/bot-ssh/htdocs/bot.online2study.in/flask_app.sock \
-    --workers 3 \
     --access-logfile - \
     --error-logfile -
@@ -1,6 +1,19 @@
-from flask import Blueprint, render_template, request, session, redirect, url_for, jsonify
-from utils.db_utils import get_db, get_all_users, get_user_id
-from utils.email_utils import send_upgrade_confirmation
+from flask import Blueprint, render_template, request, session, redirect, url_for, jsonify, current_app
+from utils.db_utils import db_cursor, get_all_users, get_user_id, pool_stats, invalidate_user_cache, PLAN_LIMITS
+from utils.user_cache import get_user_cache
+from utils.email_utils import send_upgrade_confirmation, send_upgrade_confirmations
+from utils.jobs import submit_job, job_urls, JobQueueFull
+from utils.app_stats import load_all_stats, stats_by_user
+from utils.db_metrics import endpoint_stats, load_endpoint_stats, query_stats, load_query_stats, recent_slow_queries
+from utils.pagination import page_request, fetch_page, jsonable
+from utils.venv_store import store_stats
+from utils.venv_pool import pool_status
+from utils.upload_utils import get_user_paths
+from utils.app_registry import publish_unmount
+from routes.bot_manager import STATIC_IMAGE_FOLDER
+from utils.app_builder import PREVIOUS_DIR
+import os
+import shutil
 
 admin_bp = Blueprint('admin_bp', __name__, url_prefix='/admin')
 
@@ -12,56 +25,176 @@ def require_admin():
 
 @admin_bp.route("/")
 def admin_panel():
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT c.id, c.name, c.email, c.plan, c.created_at, COUNT(b.id) as total_apps
-        FROM clients c LEFT JOIN bots b ON c.id = b.user_id
-        GROUP BY c.id ORDER BY c.created_at DESC
-    """)
-    users = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return render_template("admin_panel.html", users=users)
+    # ?plan=&from=&to=&sort=newest|oldest&limit=&after=<cursor>&format=json
+    try:
+        page = page_request(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    filters, params = [], []
+    plan = request.args.get("plan", "")
+    if plan:
+        filters.append("plan = %s")
+        params.append(plan)
+
+    with db_cursor(dictionary=True, read_only=True) as cursor:
+        users, next_cursor = fetch_page(
+            cursor, "SELECT id, name, email, plan, created_at, bot_count AS total_apps FROM clients",
+            filters, params, page)
+
+    # Per-user resource usage of hosted apps, summed over all workers
+    usage = stats_by_user(collect_app_stats())
+    for user in users:
+        user_usage = usage.get(str(user["id"]), {})
+        user["app_requests"] = user_usage.get("requests", 0)
+        user["app_cpu_seconds"] = user_usage.get("cpu_seconds", 0.0)
+        user["app_peak_rss_mb"] = user_usage.get("peak_rss", 0) / 1048576
+        user["app_usage"] = user_usage.get("apps", {})
+
+    if request.args.get("format") == "json":
+        return jsonify({"users": [jsonable(user) for user in users], "next_cursor": next_cursor})
+    return render_template("admin_panel.html", users=users, next_cursor=next_cursor,
+                           filters=request.args)
+
+def collect_app_stats():
+    """Flush this worker's numbers, then add up every worker's stats file."""
+    dispatcher = current_app.extensions.get("user_app_dispatcher")
+    if dispatcher is not None:
+        dispatcher.stats.flush()
+    totals = load_all_stats()
+
+    # Live, cross-worker slot and queue usage for each app
+    if dispatcher is not None and dispatcher.limiter is not None:
+        for mount_path, stats in totals.items():
+            usage = dispatcher.limiter.usage(mount_path)
+            stats["active"] = usage["active"]
+            stats["queue_depth"] = usage["queued"]
+            stats["concurrency_limit"] = usage["limit"]
+    return totals
+
+@admin_bp.route("/app-stats")
+def app_stats():
+    usage = stats_by_user(collect_app_stats())
+    if request.args.get("format") == "json":
+        return jsonify(usage)
+
+    with db_cursor(dictionary=True, read_only=True) as cursor:
+        cursor.execute("SELECT id, name, email FROM clients")
+        names = {str(row["id"]): row for row in cursor.fetchall()}
+
+    rows = []
+    for user_id, user_usage in usage.items():
+        for folder, stats in user_usage["apps"].items():
+            rows.append(dict(stats, user_id=user_id, folder=folder,
+                             user=names.get(user_id, {}).get("name") or user_id,
+                             email=names.get(user_id, {}).get("email", "")))
+    rows.sort(key=lambda row: row["cpu_seconds"] + row["host_cpu_seconds"], reverse=True)
+    return render_template("admin_app_stats.html", rows=rows, usage=usage, names=names)
+
+@admin_bp.route("/db-pool")
+def db_pool_stats():
+    """This worker's MySQL pool (checkouts, waits for a free connection, open/idle) and user cache hit counts."""
+    return jsonify(dict(pool_stats(), user_cache=get_user_cache().snapshot()))
+
+@admin_bp.route("/db-stats")
+def db_endpoint_stats():
+    """Queries and MySQL time per endpoint, summed over all workers, most DB time first."""
+    endpoint_stats.flush()
+    totals = load_endpoint_stats()
+    ranked = sorted(totals.items(), key=lambda item: item[1]["db_seconds"], reverse=True)
+    return jsonify([dict(stats, endpoint=endpoint) for endpoint, stats in ranked])
+
+@admin_bp.route("/top-queries")
+def top_queries():
+    """SQL statements by total MySQL time over all workers, with latency histograms and the latest slow queries."""
+    query_stats.flush()
+    limit = min(request.args.get("limit", 20, type=int), 200)
+    return jsonify({"queries": load_query_stats()[:limit],
+                    "slow": recent_slow_queries(request.args.get("slow", 20, type=int))})
+
+@admin_bp.route("/venv-store")
+def venv_store_stats():
+    """Stored app venvs (hit ratio, build seconds saved, entries) and the pre-built venv pool."""
+    return jsonify(dict(store_stats(), pool=pool_status()))
 
 @admin_bp.route("/change-plan", methods=["POST"])
 def change_user_plan():
     data = request.get_json()
     user_id = data["user_id"]
     plan = data["plan"]
+    if plan not in PLAN_LIMITS:
+        return jsonify({"status": "error", "message": f"Unknown plan: {plan}"}), 400
 
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE clients SET plan = %s WHERE id = %s", (plan, user_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("UPDATE clients SET plan = %s WHERE id = %s", (plan, user_id))
+    invalidate_user_cache()
     return jsonify({"status": "success", "message": f"Plan updated to {plan}"})
 
+def _user_apps(cursor, user_ids):
+    """{user_id: (google_id, {folder, ...})} for users about to be deleted: their bots rows plus any app folder on disk."""
+    cursor.execute(f"SELECT id, google_id FROM clients WHERE id IN ({_placeholders(user_ids)})", user_ids)
+    users = {row[0]: (row[1], set()) for row in cursor.fetchall()}
+    cursor.execute(f"SELECT user_id, folder_name FROM bots WHERE user_id IN ({_placeholders(user_ids)})", user_ids)
+    for user_id, folder_name in cursor.fetchall():
+        if user_id in users:
+            users[user_id][1].add(folder_name)
+    return users
+
+def _remove_user_apps(users):
+    """After the rows are deleted: unmount every app in all workers (stopping its host) and delete the files."""
+    for user_id, (google_id, folders) in users.items():
+        google_id = str(google_id or "")
+        if not google_id or os.path.basename(google_id) != google_id or google_id in (".", ".."):
+            print(f"⚠️ Not removing files of user {user_id}: unusable google_id {google_id!r}")
+            continue
+        temp_upload_path, script_dir, _ = get_user_paths(google_id)
+        folders = folders | {name for name in os.listdir(script_dir)
+                             if os.path.isfile(os.path.join(script_dir, name, "main.py"))}
+        for folder in sorted(folders):
+            try:
+                publish_unmount(user_id, folder)
+            except Exception as e:
+                print(f"⚠️ Could not unmount {folder} of user {user_id}: {e}")
+        # App code with its venvs, the versions edits replaced, icons, leftover uploads
+        for path in (script_dir, os.path.join(PREVIOUS_DIR, google_id), temp_upload_path,
+                     os.path.join(STATIC_IMAGE_FOLDER, google_id)):
+            shutil.rmtree(path, ignore_errors=True)
+        print(f"✅ Removed {len(folders)} apps of deleted user {user_id}")
+
 @admin_bp.route("/delete-user/<int:user_id>", methods=["DELETE"])
 def delete_user(user_id):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM bots WHERE user_id = %s", (user_id,))
-    cursor.execute("DELETE FROM clients WHERE id = %s", (user_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        users = _user_apps(cursor, [user_id])
+        cursor.execute("DELETE FROM bots WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM clients WHERE id = %s", (user_id,))
+    invalidate_user_cache()
+    _remove_user_apps(users)
     return jsonify({"status": "success", "message": "User deleted"})
 
 @admin_bp.route("/requests")
 def view_upgrade_requests():
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT id, name, email, current_plan, requested_plan, message, created_at, status
-        FROM upgrade_requests
-        ORDER BY created_at DESC
-    """)
-    requests = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return render_template("admin_requests.html", requests=requests)
+    # ?status=&from=&to=&sort=newest|oldest&limit=&after=<cursor>&format=json
+    try:
+        page = page_request(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    filters, params = [], []
+    status = request.args.get("status", "")
+    if status:
+        filters.append("status = %s")
+        params.append(status)
+
+    with db_cursor(dictionary=True, read_only=True) as cursor:
+        requests, next_cursor = fetch_page(
+            cursor, """SELECT id, name, email, current_plan, requested_plan, message, created_at, status
+                       FROM upgrade_requests""",
+            filters, params, page)
+
+    if request.args.get("format") == "json":
+        return jsonify({"requests": [jsonable(req) for req in requests], "next_cursor": next_cursor})
+    return render_template("admin_requests.html", requests=requests, next_cursor=next_cursor,
+                           filters=request.args)
 
 @admin_bp.route("/update-request", methods=["POST"])
 def update_request_status():
@@ -69,32 +202,141 @@ def update_request_status():
     request_id = data["request_id"]
     new_status = data["status"]
 
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT user_id, requested_plan FROM upgrade_requests WHERE id = %s", (request_id,))
-    request_data = cursor.fetchone()
+    user = None
+    with db_cursor(dictionary=True, commit=True) as cursor:
+        cursor.execute("SELECT user_id, requested_plan FROM upgrade_requests WHERE id = %s", (request_id,))
+        request_data = cursor.fetchone()
 
-    if not request_data:
-        return jsonify({"status": "error", "message": "Request not found"}), 404
+        if not request_data:
+            return jsonify({"status": "error", "message": "Request not found"}), 404
 
-    user_id = request_data["user_id"]
-    requested_plan = request_data["requested_plan"]
+        user_id = request_data["user_id"]
+        requested_plan = request_data["requested_plan"]
 
-    cursor.execute("UPDATE upgrade_requests SET status = %s WHERE id = %s", (new_status, request_id))
+        cursor.execute("UPDATE upgrade_requests SET status = %s WHERE id = %s", (new_status, request_id))
+
+        if new_status == "approved":
+            cursor.execute("UPDATE clients SET plan = %s WHERE id = %s", (requested_plan, user_id))
+            cursor.execute("SELECT email, name FROM clients WHERE id = %s", (user_id,))
+            user = cursor.fetchone()
 
     if new_status == "approved":
-        cursor.execute("UPDATE clients SET plan = %s WHERE id = %s", (requested_plan, user_id))
-        cursor.execute("SELECT email, name FROM clients WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        if user:
-            send_upgrade_confirmation(user["email"], user["name"], requested_plan)
+        invalidate_user_cache()
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Send the email after the connection is back in the pool, not while holding it
+    if user:
+        send_upgrade_confirmation(user["email"], user["name"], requested_plan)
 
     msg = f"Request marked as {new_status}"
     if new_status == "approved":
         msg += f" and user upgraded to {requested_plan}"
 
     return jsonify({"status": "success", "message": msg})
+
+# --- Bulk operations: one statement per step, all in one transaction ---
+
+BULK_MAX_IDS = 1000
+
+def _bulk_ids(data, key):
+    """Validated, de-duplicated list of integer ids from the JSON body, or raise ValueError."""
+    ids = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids:
+        raise ValueError(f"'{key}' must be a non-empty list of ids")
+    if len(ids) > BULK_MAX_IDS:
+        raise ValueError(f"At most {BULK_MAX_IDS} ids per request")
+    return sorted({int(i) for i in ids})
+
+def _placeholders(ids):
+    return ", ".join(["%s"] * len(ids))
+
+@admin_bp.route("/bulk/change-plan", methods=["POST"])
+def bulk_change_plan():
+    """{"user_ids": [...], "plan": "gold"}"""
+    data = request.get_json(silent=True)
+    try:
+        user_ids = _bulk_ids(data, "user_ids")
+        plan = data["plan"]
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if plan not in PLAN_LIMITS:
+        return jsonify({"status": "error", "message": f"Unknown plan: {plan}"}), 400
+
+    with db_cursor(commit=True) as cursor:
+        cursor.execute(f"UPDATE clients SET plan = %s WHERE id IN ({_placeholders(user_ids)})", [plan] + user_ids)
+        updated = cursor.rowcount
+    invalidate_user_cache()
+    return jsonify({"status": "success", "message": f"{updated} users moved to {plan}", "updated": updated})
+
+@admin_bp.route("/bulk/delete-users", methods=["POST"])
+def bulk_delete_users():
+    """{"user_ids": [...]}"""
+    try:
+        user_ids = _bulk_ids(request.get_json(silent=True), "user_ids")
+    except (ValueError, TypeError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    with db_cursor(commit=True) as cursor:
+        users = _user_apps(cursor, user_ids)
+        cursor.execute(f"DELETE FROM bots WHERE user_id IN ({_placeholders(user_ids)})", user_ids)
+        cursor.execute(f"DELETE FROM clients WHERE id IN ({_placeholders(user_ids)})", user_ids)
+        deleted = cursor.rowcount
+    invalidate_user_cache()
+    _remove_user_apps(users)
+    return jsonify({"status": "success", "message": f"{deleted} users deleted", "deleted": deleted})
+
+@admin_bp.route("/bulk/update-requests", methods=["POST"])
+def bulk_update_requests():
+    """
+    {"request_ids": [...], "status": "approved" | "denied"}; only pending requests are changed.
+    When a user has several of them in the batch, their latest request decides the plan.
+    """
+    data = request.get_json(silent=True)
+    try:
+        request_ids = _bulk_ids(data, "request_ids")
+        new_status = data["status"]
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if new_status not in ("approved", "denied"):
+        return jsonify({"status": "error", "message": "status must be 'approved' or 'denied'"}), 400
+
+    recipients = []
+    with db_cursor(dictionary=True, commit=True) as cursor:
+        # Lock the pending rows so two admins can't approve (and email) the same request twice
+        cursor.execute(f"""
+            SELECT r.id, r.user_id, c.email, c.name, r.requested_plan
+            FROM upgrade_requests r JOIN clients c ON c.id = r.user_id
+            WHERE r.id IN ({_placeholders(request_ids)}) AND r.status = 'pending'
+            ORDER BY r.created_at, r.id
+            FOR UPDATE
+        """, request_ids)
+        pending = cursor.fetchall()
+        pending_ids = [row["id"] for row in pending]
+        # Oldest first, so each user ends up with their latest request
+        latest = {row["user_id"]: row for row in pending}
+
+        if pending_ids:
+            cursor.execute(f"UPDATE upgrade_requests SET status = %s WHERE id IN ({_placeholders(pending_ids)})",
+                           [new_status] + pending_ids)
+            if new_status == "approved":
+                user_ids = list(latest)
+                cases = " ".join(["WHEN %s THEN %s"] * len(user_ids))
+                cursor.execute(f"UPDATE clients SET plan = CASE id {cases} END WHERE id IN ({_placeholders(user_ids)})",
+                               [v for user_id in user_ids for v in (user_id, latest[user_id]["requested_plan"])]
+                               + user_ids)
+                recipients = [[row["email"], row["name"], row["requested_plan"]]
+                              for row in latest.values() if row["email"]]
+
+    result = {"status": "success", "updated": len(pending_ids),
+              "skipped": len(request_ids) - len(pending_ids),
+              "message": f"{len(pending_ids)} requests marked as {new_status}"}
+    if new_status == "approved" and pending_ids:
+        invalidate_user_cache()
+    if recipients:
+        # Emails go out from the job pool, not inside this request
+        try:
+            job_id = submit_job(send_upgrade_confirmations, recipients, owner="admin")
+            result["email_job"] = job_urls(job_id)
+        except JobQueueFull as e:
+            print(f"⚠️ Upgrade emails not queued: {e}")
+            result["message"] += " (confirmation emails could not be queued)"
+    return jsonify(result)
@@ -1,6 +1,8 @@
+import math
 from flask import Blueprint, render_template, request, redirect, url_for, session
 # Import the new helper function and remove get_user_plan if only used for limit calculation here
-from utils.db_utils import get_db, get_user_id, get_user_plan, get_user_apps, get_latest_upgrade_request, get_plan_limit
+from utils.db_utils import db_cursor
+from utils.user_context import get_user_context
 
 contact_bp = Blueprint('contact_bp', __name__)
 
@@ -9,25 +11,19 @@ def profile():
     if "user_logged_in" not in session:
         return redirect(url_for("user_bp.login"))
 
-    google_id = session["google_id"]
-    user_id = get_user_id(google_id)
+    # Plan, limit, app count and latest upgrade request in one query
+    user = get_user_context()
     name = session.get("name", "User")
     email = session["email"]
-    user_plan = get_user_plan(google_id) # Keep this to display the plan name
-    apps = get_user_apps(user_id)
-    app_count = len(apps)
-    # Use the helper function to get the limit
-    plan_limit = get_plan_limit(user_plan)
-
-    upgrade_request = get_latest_upgrade_request(user_id)
 
     return render_template("profile.html",
         name=name,
         email=email,
-        user_plan=user_plan,
-        app_count=app_count,
-        plan_limit=plan_limit,
-        upgrade_request=upgrade_request
+        user_plan=user.plan,
+        app_count=user.app_count,
+        plan_limit=user.plan_limit,
+        is_infinite=math.isinf(user.plan_limit),
+        upgrade_request=user.latest_upgrade_request
     )
 
 @contact_bp.route("/contact", methods=["GET", "POST"])
@@ -35,13 +31,13 @@ def contact():
     if "user_logged_in" not in session:
         return redirect(url_for("user_bp.login"))
 
-    google_id = session["google_id"]
-    user_id = get_user_id(google_id)
+    user = get_user_context()
+    user_id = user.user_id
     name = session.get("name", "User")
     email = session["email"]
-    current_plan = get_user_plan(google_id) # Keep this
+    current_plan = user.plan
 
-    latest = get_latest_upgrade_request(user_id)
+    latest = user.latest_upgrade_request
 
     if request.method == "POST":
         if latest and latest["status"] == "pending":
@@ -50,15 +46,11 @@ def contact():
         requested_plan = request.form["requested_plan"]
         message = request.form["message"]
 
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO upgrade_requests (user_id, name, email, current_plan, requested_plan, message, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
-        """, (user_id, name, email, current_plan, requested_plan, message))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor(commit=True) as cursor:
+            cursor.execute("""
+                INSERT INTO upgrade_requests (user_id, name, email, current_plan, requested_plan, message, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            """, (user_id, name, email, current_plan, requested_plan, message))
 
         return render_template("contact.html", success=True)
 
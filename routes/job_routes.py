@@ -0,0 +1,118 @@
+from flask import Blueprint, Response, jsonify, request, session, send_from_directory, abort, stream_with_context
+from utils.jobs import read_status, job_dir, log_path, JOB_ID_RE
+import os
+import json
+import time
+
+job_bp = Blueprint('job_bp', __name__)
+
+# Only eventlet workers keep an event stream open (for at most
+# JOB_EVENTS_MAX_SECONDS, then EventSource reconnects and resumes from
+# Last-Event-ID). A sync worker would be held for the whole build, so there
+# the dashboard polls /jobs/<id> and /jobs/<id>/log instead, and /events
+# answers with what is there now and ends.
+STREAM_JOBS = os.getenv("GUNICORN_WORKER_CLASS") == "eventlet"
+JOB_EVENTS_MAX_SECONDS = float(os.getenv("JOB_EVENTS_MAX_SECONDS", "25"))
+JOB_EVENTS_POLL_SECONDS = 0.5
+JOB_POLL_RETRY_MS = 2000
+
+# Job ids are random 128-bit tokens handed to whoever submitted the job, so
+# jobs without an owner (the bots' own, for not logged-in visitors) are
+# readable by anyone holding the id. Jobs submitted with an owner (app builds:
+# the user's google_id, admin jobs: "admin") are only shown to that session.
+
+def _can_see(status):
+    owner = status.get("owner")
+    if not owner or session.get("is_admin"):
+        return True
+    return owner != "admin" and session.get("google_id") == owner
+
+def _load_status(job_id):
+    """The job's status if it exists and this session may see it, else None."""
+    if not JOB_ID_RE.match(job_id):
+        return None
+    status = read_status(job_id)
+    if status is None or not _can_see(status):
+        return None
+    return status
+
+def _public_status(job_id, status):
+    status.pop("traceback", None)
+    status.pop("owner", None)
+    status["artifact_urls"] = [f"/jobs/{job_id}/artifacts/{name}" for name in status.get("artifacts", [])]
+    return status
+
+def _read_log(job_id, offset):
+    """Whole log lines written after byte offset, and the offset after them."""
+    try:
+        with open(log_path(job_id), "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+    except OSError:
+        chunk = b""
+    # Only whole lines; a partial one is returned by the next read
+    chunk = chunk[:chunk.rfind(b"\n") + 1]
+    return chunk.decode("utf-8", "replace").splitlines(), offset + len(chunk)
+
+@job_bp.route("/<job_id>")
+def job_status(job_id):
+    status = _load_status(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": "Job not found."}), 404
+    return jsonify(_public_status(job_id, status))
+
+@job_bp.route("/<job_id>/log")
+def job_log(job_id):
+    """Log lines after ?offset= (a byte offset), for clients polling instead of streaming."""
+    if _load_status(job_id) is None:
+        return jsonify({"status": "error", "message": "Job not found."}), 404
+    offset = request.args.get("offset", 0, type=int)
+    lines, offset = _read_log(job_id, max(offset, 0))
+    return jsonify({"offset": offset, "lines": lines})
+
+@job_bp.route("/<job_id>/events")
+def job_events(job_id):
+    """
+    Server-sent events for one job: "status" whenever status.json changes and
+    "log" with new log lines (event id = byte offset into the log), then "end"
+    once the job is done or failed. On sync workers a request gets one pass
+    and ends, and EventSource comes back after JOB_POLL_RETRY_MS.
+    """
+    if _load_status(job_id) is None:
+        abort(404)
+    try:
+        offset = int(request.headers.get("Last-Event-ID", "0"))
+    except ValueError:
+        offset = 0
+
+    def events():
+        nonlocal offset
+        yield f"retry: {1000 if STREAM_JOBS else JOB_POLL_RETRY_MS}\n\n"
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        last_status = None
+        while True:
+            # Read the status first, so the log read after it has everything a finished job wrote
+            status = read_status(job_id) or {}
+            lines, offset = _read_log(job_id, offset)
+            if lines:
+                data = "\n".join(f"data: {line}" for line in lines)
+                yield f"id: {offset}\nevent: log\n{data}\n\n"
+            if status != last_status:
+                last_status = status
+                yield f"id: {offset}\nevent: status\ndata: {json.dumps(_public_status(job_id, dict(status)))}\n\n"
+            if status.get("status") in ("done", "failed"):
+                yield "event: end\ndata: {}\n\n"
+                return
+            if not STREAM_JOBS or time.monotonic() > deadline:
+                return
+            time.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@job_bp.route("/<job_id>/artifacts/<path:filename>")
+def job_artifact(job_id, filename):
+    status = _load_status(job_id)
+    if status is None or status.get("status") != "done":
+        abort(404)
+    return send_from_directory(os.path.join(job_dir(job_id), "artifacts"), filename, as_attachment=True)
@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, session
 from flask_login import login_required, current_user
-from .models import User # User मॉडल इम्पोर्ट करें
-from . import db # db इम्पोर्ट करें
+import math
 import razorpay
+from utils.db_utils import db_cursor, invalidate_user_cache
+from utils.user_context import get_user_context
+from routes.job_routes import STREAM_JOBS
 import json
 from datetime import datetime, timedelta
 
@@ -31,12 +33,9 @@ def post_login():
         return redirect(url_for('user_bp.login'))
 
     if not session.get("plan"):
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT plan FROM clients WHERE google_id=%s", (session["google_id"],))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("SELECT plan FROM clients WHERE google_id=%s", (session["google_id"],))
+            result = cursor.fetchone()
 
         if result and result[0]:
             session["plan"] = result[0]
@@ -59,12 +58,9 @@ def choose_plan():
     plan = request.form.get("plan")
     session['plan'] = plan
 
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE clients SET plan=%s WHERE google_id=%s", (plan, session['google_id']))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("UPDATE clients SET plan=%s WHERE google_id=%s", (plan, session['google_id']))
+    invalidate_user_cache()
 
     if plan == "enterprise":
         flash("Please contact us to activate Enterprise Plan.", "info")
@@ -76,12 +72,13 @@ def dashboard():
     if "google_id" not in session:
         return redirect(url_for('user_bp.login'))
 
-    user_id = session.get("user_id")
-    apps = get_user_apps(user_id)  # Updated to load only user's apps
+    # One query for id/plan/limit, one for the app list
+    user = get_user_context()
+    user_id = user.user_id
+    apps = user.apps  # Updated to load only user's apps
 
-    plan = session.get("plan", "free") # डिफ़ॉल्ट रूप से 'free' प्लान मानें यदि सेशन में नहीं है
-    # plan_limit = float('inf') if plan == "gold" else (10 if plan == "silver" else 3) # पुरानी हार्डकोडेड सीमा
-    plan_limit = get_plan_limit(plan) # get_plan_limit फ़ंक्शन का उपयोग करें
+    plan = user.plan # Database value, so an approved upgrade shows without logging in again
+    plan_limit = user.plan_limit
     app_count = len(apps)
     is_infinite = math.isinf(plan_limit)
 
@@ -93,7 +90,8 @@ def dashboard():
         plan_limit=plan_limit,
         user_plan=plan,
         is_infinite=is_infinite,
-        user_email=session.get("email")
+        user_email=session.get("email"),
+        stream_jobs=STREAM_JOBS
     )
 
 @user_bp.route('/pay/<plan_name>')
@@ -176,6 +174,8 @@ def payment_success():
         client.utility.verify_payment_signature(params_dict)
 
         # सिग्नेचर सफल होने पर:
+        # Imported here: the SQLAlchemy models are only used by this route, and failing to import them must not take down the whole blueprint
+        from models import User, db
         user = User.query.get(current_user.id)
         user.razorpay_payment_id = payment_id
         user.razorpay_order_id = order_id
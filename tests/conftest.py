@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+# Stats files, limiter slots etc. go to a throwaway registry, never the real apps/.registry
+os.environ["APP_REGISTRY_DIR"] = tempfile.mkdtemp(prefix="tests_registry_")
+os.environ["USER_CACHE_TTL"] = "0"
@@ -0,0 +1,138 @@
+"""
+Admin bulk endpoints: request validation (nothing reaches the DB on a bad
+body) and user deletion cleaning up each user's apps, not just their rows.
+"""
+import os
+import pytest
+from flask import Flask
+from utils import db_utils
+from routes import admin_routes
+from routes.admin_routes import admin_bp
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.db.statements.append(sql)
+        if sql.startswith("SELECT id, google_id FROM clients"):
+            self.rows = [(user_id, self.db.users[user_id]) for user_id in params if user_id in self.db.users]
+        elif sql.startswith("SELECT user_id, folder_name FROM bots"):
+            self.rows = [bot for bot in self.db.bots if bot[0] in params]
+        else:
+            self.rows = []
+        self.rowcount = len(params or ())
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    in_transaction = False
+
+    def __init__(self):
+        self.statements = []
+        self.users = {1: "111", 2: "222"}
+        self.bots = [(1, "quiz"), (2, "shop")]
+
+    def cursor(self, dictionary=False, buffered=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def acquire(self):
+        return self
+
+    def release(self, conn, discard=False):
+        pass
+
+
+@pytest.fixture
+def admin(tmp_path, monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(db_utils, "get_pool", lambda: db)
+    monkeypatch.setattr(admin_routes, "invalidate_user_cache", lambda: None)
+
+    def get_user_paths(google_id):
+        paths = (str(tmp_path / "uploads" / google_id), str(tmp_path / "apps" / google_id), None)
+        for path in paths[:2]:
+            os.makedirs(path, exist_ok=True)
+        return paths
+    monkeypatch.setattr(admin_routes, "get_user_paths", get_user_paths)
+    monkeypatch.setattr(admin_routes, "STATIC_IMAGE_FOLDER", str(tmp_path / "images"))
+    monkeypatch.setattr(admin_routes, "PREVIOUS_DIR", str(tmp_path / "previous"))
+    unmounted = []
+    monkeypatch.setattr(admin_routes, "publish_unmount", lambda user_id, folder: unmounted.append((user_id, folder)))
+
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(admin_bp)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_logged_in=True, is_admin=True)
+    client.db, client.unmounted, client.root = db, unmounted, tmp_path
+    return client
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/admin/bulk/change-plan", {"user_ids": [1], "plan": "platinum"}),
+    ("/admin/bulk/change-plan", {"user_ids": [], "plan": "gold"}),
+    ("/admin/bulk/change-plan", {"user_ids": ["x"], "plan": "gold"}),
+    ("/admin/bulk/change-plan", {"user_ids": [1]}),
+    ("/admin/bulk/delete-users", {"user_ids": "1"}),
+    ("/admin/bulk/delete-users", {"user_ids": list(range(10000))}),
+    ("/admin/bulk/update-requests", {"request_ids": [1], "status": "maybe"}),
+    ("/admin/bulk/update-requests", {"request_ids": [1]}),
+])
+def test_bad_bulk_requests_are_rejected(admin, path, body):
+    response = admin.post(path, json=body)
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
+    assert admin.db.statements == []
+
+
+def test_unknown_plan_is_rejected_for_one_user(admin):
+    assert admin.post("/admin/change-plan", json={"user_id": 1, "plan": "platinum"}).status_code == 400
+    assert admin.db.statements == []
+
+
+def make_app(root, google_id, folder):
+    app_dir = root / "apps" / google_id / folder
+    (app_dir / "venv").mkdir(parents=True)
+    (app_dir / "main.py").write_text("app = None\n")
+    (root / "images" / google_id / folder).mkdir(parents=True)
+
+
+def test_bulk_delete_removes_apps(admin):
+    make_app(admin.root, "111", "quiz")
+    make_app(admin.root, "111", "orphan")  # on disk only
+    make_app(admin.root, "222", "shop")
+
+    response = admin.post("/admin/bulk/delete-users", json={"user_ids": [1]})
+    assert response.status_code == 200
+    assert sorted(admin.unmounted) == [(1, "orphan"), (1, "quiz")]
+    assert not (admin.root / "apps" / "111").exists()
+    assert not (admin.root / "images" / "111").exists()
+    assert (admin.root / "apps" / "222" / "shop" / "main.py").exists()
+
+
+def test_single_delete_removes_apps(admin):
+    make_app(admin.root, "222", "shop")
+    (admin.root / "previous" / "222" / "shop").mkdir(parents=True)
+    assert admin.delete("/admin/delete-user/2").status_code == 200
+    assert admin.unmounted == [(2, "shop")]
+    assert not (admin.root / "apps" / "222").exists()
+    assert not (admin.root / "previous" / "222").exists()
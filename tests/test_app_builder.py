@@ -0,0 +1,76 @@
+"""
+Edits keep the version they replace (code and venv) until the next edit,
+and rollback_app swaps it back in.
+"""
+import shutil
+import zipfile
+import pytest
+from utils import app_builder
+
+
+class FakeJob:
+    log_path = None
+
+    def progress(self, message, percent=None):
+        pass
+
+    def log(self, line):
+        pass
+
+
+def write_zip(tmp_path, name, code):
+    path = tmp_path / name
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("main.py", code)
+    return str(path)
+
+
+@pytest.fixture
+def builder(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_builder, "PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr(app_builder, "BUILD_STAGING_DIR", str(tmp_path / "staging"))
+    monkeypatch.setattr(app_builder, "PREVIOUS_DIR", str(tmp_path / "previous"))
+    monkeypatch.setattr(app_builder, "BUILDS_DIR", str(tmp_path / "builds"))
+    monkeypatch.setattr(app_builder, "copy_venv", shutil.copytree)
+    monkeypatch.setattr(app_builder, "sync_requirements", lambda *args, **kwargs: "unchanged")
+    monkeypatch.setattr(app_builder, "relocate_venv", lambda venv_path, old_path: None)
+    mounted = []
+    monkeypatch.setattr(app_builder, "publish_mount", lambda user_id, google_id, folder: mounted.append(folder))
+
+    app_dir = tmp_path / "apps" / "g1" / "bot"
+    (app_dir / "venv").mkdir(parents=True)
+    (app_dir / "main.py").write_text("v1")
+    return tmp_path, app_dir, mounted
+
+
+def rebuild(tmp_path, code):
+    app_builder.rebuild_app(FakeJob(), "g1", 1, "bot", write_zip(tmp_path, f"{code}.zip", code))
+
+
+def test_edit_keeps_the_replaced_version_until_the_next_edit(builder):
+    tmp_path, app_dir, _ = builder
+    previous = tmp_path / "previous" / "g1" / "bot"
+
+    rebuild(tmp_path, "v2")
+    assert (app_dir / "main.py").read_text() == "v2"
+    assert (previous / "main.py").read_text() == "v1"
+    assert (previous / "venv").is_dir()
+
+    rebuild(tmp_path, "v3")
+    assert (previous / "main.py").read_text() == "v2"
+    assert not list((tmp_path / "staging").iterdir())
+
+
+def test_rollback_swaps_the_previous_version_back(builder):
+    tmp_path, app_dir, mounted = builder
+    with pytest.raises(ValueError):
+        app_builder.rollback_app("g1", 1, "bot")
+
+    rebuild(tmp_path, "v2")
+    app_builder.rollback_app("g1", 1, "bot")
+    assert (app_dir / "main.py").read_text() == "v1"
+    assert mounted[-1] == "bot"
+
+    # Rolling back again undoes the rollback
+    app_builder.rollback_app("g1", 1, "bot")
+    assert (app_dir / "main.py").read_text() == "v2"
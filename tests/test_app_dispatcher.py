@@ -0,0 +1,75 @@
+"""
+Lazy mounting: an app is imported on its first request, and an app whose
+import fails is answered with a 503 instead of being re-imported on every
+request, until the backoff expires or a new version is published.
+"""
+import os
+import time
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from utils.app_dispatcher import UserAppDispatcher
+
+
+def platform(environ, start_response):
+    return Response("platform", status=404)(environ, start_response)
+
+
+def write_app(tmp_path, body):
+    folder = tmp_path / "bot"
+    folder.mkdir(exist_ok=True)
+    main_file = folder / "main.py"
+    main_file.write_text(body)
+    return str(main_file)
+
+
+GOOD_APP = """
+def app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"hello"]
+"""
+
+BROKEN_APP = """
+import os
+open(os.path.join(os.path.dirname(__file__), "imports.log"), "a").write("x")
+raise RuntimeError("boom")
+"""
+
+
+def test_app_is_imported_on_first_request(tmp_path):
+    main_file = write_app(tmp_path, GOOD_APP)
+    dispatcher = UserAppDispatcher(platform, {"/u/1/bot": ("t_good_app", main_file)})
+    assert dispatcher.apps == {}
+
+    response = Client(dispatcher).get("/u/1/bot/")
+    assert response.status_code == 200
+    assert response.data == b"hello"
+    assert "/u/1/bot" in dispatcher.apps
+
+
+def test_failed_import_is_not_retried_until_backoff(tmp_path):
+    main_file = write_app(tmp_path, BROKEN_APP)
+    imports_log = os.path.join(os.path.dirname(main_file), "imports.log")
+    dispatcher = UserAppDispatcher(platform, {"/u/1/bot": ("t_broken_app", main_file)}, load_retry=60)
+    client = Client(dispatcher)
+
+    for _ in range(3):
+        response = client.get("/u/1/bot/")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "60"
+    assert open(imports_log).read() == "x"
+
+    # Backoff over: imported again
+    dispatcher.router.match("/u/1/bot")[0].failed_at = time.monotonic() - 61
+    assert client.get("/u/1/bot/").status_code == 503
+    assert open(imports_log).read() == "xx"
+
+
+def test_publishing_a_new_version_retries_at_once(tmp_path):
+    main_file = write_app(tmp_path, BROKEN_APP)
+    dispatcher = UserAppDispatcher(platform, {"/u/1/bot": ("t_fixed_app", main_file)}, load_retry=60)
+    client = Client(dispatcher)
+    assert client.get("/u/1/bot/").status_code == 503
+
+    write_app(tmp_path, GOOD_APP)
+    dispatcher.add_mount("/u/1/bot", "t_fixed_app", main_file)
+    assert client.get("/u/1/bot/").status_code == 200
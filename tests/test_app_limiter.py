@@ -0,0 +1,80 @@
+"""
+Per-app concurrency caps: requests over the cap wait in a bounded queue,
+anything beyond it (or waiting too long) is shed with a 503, and a shed
+request never pays for importing a cold app.
+"""
+import os
+import threading
+import time
+from werkzeug.test import Client
+from utils.app_limiter import AppLimiter, limiter_from_env
+from utils.app_dispatcher import UserAppDispatcher
+
+
+def test_slots_then_queue_then_shed(tmp_path):
+    limiter = AppLimiter(max_concurrency=1, max_queue=1, queue_timeout=5, limits_dir=str(tmp_path))
+    held = limiter.acquire("/u/1/bot")
+    assert held is not None and held.waited == 0
+
+    queued = {}
+    waiter = threading.Thread(target=lambda: queued.setdefault("slot", limiter.acquire("/u/1/bot")))
+    waiter.start()
+    deadline = time.monotonic() + 2
+    while limiter.usage("/u/1/bot")["queued"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # Slot taken and the only queue place too
+    assert limiter.acquire("/u/1/bot") is None
+    assert limiter.usage("/u/1/bot") == {"active": 1, "queued": 1, "limit": 1}
+
+    held.release()
+    waiter.join()
+    assert queued["slot"] is not None and queued["slot"].waited > 0
+    queued["slot"].release()
+    assert limiter.usage("/u/1/bot")["active"] == 0
+
+
+def test_queue_wait_times_out(tmp_path):
+    limiter = AppLimiter(max_concurrency=1, max_queue=1, queue_timeout=0.1, limits_dir=str(tmp_path))
+    held = limiter.acquire("/u/1/bot")
+    assert limiter.acquire("/u/1/bot") is None
+    held.release()
+
+
+def test_total_cap_spans_apps(tmp_path):
+    limiter = AppLimiter(max_concurrency=5, max_queue=0, total=1, limits_dir=str(tmp_path))
+    held = limiter.acquire("/u/1/a")
+    assert limiter.acquire("/u/1/b") is None
+    held.release()
+    assert limiter.acquire("/u/1/b") is not None
+
+
+def test_sync_workers_do_not_queue_by_default(monkeypatch):
+    monkeypatch.delenv("APP_MAX_QUEUE", raising=False)
+    monkeypatch.delenv("APP_MAX_CONCURRENCY", raising=False)
+    monkeypatch.setenv("GUNICORN_WORKER_CLASS", "sync")
+    assert limiter_from_env().max_queue == 0
+    monkeypatch.setenv("GUNICORN_WORKER_CLASS", "eventlet")
+    assert limiter_from_env().max_queue == 50
+
+
+def test_shed_request_does_not_import_a_cold_app(tmp_path):
+    folder = tmp_path / "bot"
+    folder.mkdir()
+    (folder / "main.py").write_text(
+        "import os\n"
+        "open(os.path.join(os.path.dirname(__file__), 'imports.log'), 'a').write('x')\n"
+        "def app(environ, start_response):\n"
+        "    start_response('200 OK', [])\n"
+        "    return [b'ok']\n")
+    limiter = AppLimiter(max_concurrency=1, max_queue=0, limits_dir=str(tmp_path / "limits"))
+    dispatcher = UserAppDispatcher(None, {"/u/1/bot": ("t_limited_app", str(folder / "main.py"))}, limiter=limiter)
+
+    held = limiter.acquire("/u/1/bot")
+    response = Client(dispatcher).get("/u/1/bot/")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert not os.path.exists(folder / "imports.log")
+
+    held.release()
+    assert Client(dispatcher).get("/u/1/bot/").status_code == 200
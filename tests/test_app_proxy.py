@@ -0,0 +1,90 @@
+"""
+Subprocess hosting end to end: a real host process on a Unix socket, with
+request and response bodies streamed in chunks, and hosts replaced when the
+code they were started with changes.
+"""
+import os
+import time
+import shutil
+import pytest
+from werkzeug.test import Client
+from utils import app_proxy
+from utils.app_proxy import ProxyApp, AppProcess
+from utils.app_dispatcher import UserAppDispatcher
+
+ECHO_APP = """
+def app(environ, start_response):
+    body = environ["wsgi.input"].read()
+    if environ["PATH_INFO"] == "/big":
+        start_response("200 OK", [("Content-Type", "application/octet-stream")])
+        return (b"x" * 65536 for _ in range(32))
+    if environ["PATH_INFO"] == "/fail":
+        raise RuntimeError("boom")
+    start_response("200 OK", [("Content-Type", "text/plain"), ("X-Version", "%s")])
+    return [b"echo:", body]
+"""
+
+
+@pytest.fixture
+def hosted(tmp_path, monkeypatch):
+    # AF_UNIX paths are short; pytest's tmp_path may be too long for a socket
+    run_dir = os.path.join("/tmp", f"apphost-{os.getpid()}-{time.monotonic_ns()}")
+    monkeypatch.setattr(app_proxy, "RUN_DIR", run_dir)
+    folder = tmp_path / "bot"
+    folder.mkdir()
+    main_file = folder / "main.py"
+    main_file.write_text(ECHO_APP % "1")
+
+    def start():
+        return ProxyApp("/u/1/bot", str(main_file)).start()
+
+    yield main_file, start
+    AppProcess("/u/1/bot", str(main_file)).stop()
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def test_bodies_stream_both_ways(hosted):
+    main_file, start = hosted
+    client = Client(start())
+
+    payload = os.urandom(300 * 1024)
+    response = client.post("/", data=payload)
+    assert response.status_code == 200
+    assert response.data == b"echo:" + payload
+
+    response = client.get("/big")
+    assert len(response.data) == 32 * 65536
+
+    # The pooled connection is still usable after a full body was read
+    assert client.get("/").data == b"echo:"
+
+
+def test_app_error_becomes_500(hosted):
+    main_file, start = hosted
+    client = Client(start())
+    assert client.get("/fail").status_code == 500
+    assert client.get("/").status_code == 200
+
+
+def test_host_running_old_code_is_replaced(hosted):
+    main_file, start = hosted
+    assert Client(start()).get("/").headers["X-Version"] == "1"
+    old_pid = AppProcess("/u/1/bot", str(main_file)).read_pid()[0]
+
+    main_file.write_text(ECHO_APP % "2")
+    os.utime(main_file, ns=(time.time_ns() + 10**9,) * 2)
+    assert Client(start()).get("/").headers["X-Version"] == "2"
+    assert AppProcess("/u/1/bot", str(main_file)).read_pid()[0] != old_pid
+
+
+def test_remove_stops_a_host_started_by_another_worker(hosted):
+    main_file, start = hosted
+    start()
+    host = AppProcess("/u/1/bot", str(main_file))
+    assert host.is_running()
+
+    # This worker never loaded the app
+    dispatcher = UserAppDispatcher(None, {"/u/1/bot": ("t_proxy_app", str(main_file))}, hosting="subprocess")
+    dispatcher.remove_mount("/u/1/bot")
+    assert not host.is_running()
+    assert host.read_pid() == (None, None)
@@ -0,0 +1,51 @@
+"""
+The mount journal: workers only see entries published after their snapshot,
+and a worker that lags behind a compaction still gets every change exactly once.
+"""
+import os
+from utils.app_registry import AppRegistry
+
+
+def test_poll_returns_only_new_entries(tmp_path):
+    publisher = AppRegistry(str(tmp_path))
+    publisher.publish("add", "/u/1/old", "m", "main.py")
+
+    worker = AppRegistry(str(tmp_path))
+    worker.snapshot()
+    assert not worker.changed()
+
+    publisher.publish("add", "/u/1/new", "m", "main.py")
+    assert worker.changed()
+    assert [e["mount_path"] for e in worker.poll()] == ["/u/1/new"]
+    assert worker.poll() == []
+
+
+def test_compaction_keeps_latest_entry_per_mount(tmp_path):
+    registry = AppRegistry(str(tmp_path), compact_entries=4)
+    for _ in range(3):
+        registry.publish("add", "/u/1/a", "m", "main.py")
+    registry.publish("remove", "/u/1/b")
+    registry.publish("add", "/u/1/a", "m2", "main.py")
+
+    with open(registry.journal_path) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 2
+
+
+def test_worker_behind_a_compaction_sees_each_change_once(tmp_path):
+    publisher = AppRegistry(str(tmp_path), compact_entries=3)
+    worker = AppRegistry(str(tmp_path))
+    publisher.publish("add", "/u/1/a", "m", "main.py")
+    worker.snapshot()
+    publisher.publish("add", "/u/1/b", "m", "main.py")
+    assert [e["mount_path"] for e in worker.poll()] == ["/u/1/b"]
+
+    inode = os.stat(publisher.journal_path).st_ino
+    publisher.publish("remove", "/u/1/a")
+    publisher.publish("add", "/u/1/b", "m2", "main.py")  # 4 entries: compacted to 2
+    assert os.stat(publisher.journal_path).st_ino != inode
+
+    entries = worker.poll()
+    assert [(e["op"], e["mount_path"]) for e in entries] == [("remove", "/u/1/a"), ("add", "/u/1/b")]
+    assert entries[-1]["modname"] == "m2"
+    assert worker.poll() == []
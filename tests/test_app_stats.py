@@ -0,0 +1,56 @@
+import os
+import json
+import threading
+import subprocess
+import sys
+from werkzeug.wsgi import FileWrapper
+from utils import app_stats
+from utils.app_stats import AppStats, load_all_stats, wrap_response, StatsResponse
+
+
+def test_stats_of_dead_workers_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_stats, "STATS_DIR", str(tmp_path))
+    stats = AppStats()
+    stats.record_request("/u/1/bot", 0.01)
+    stats.flush()
+
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    for name in (f"{dead.pid}-1.json", f"{os.getpid()}-1.json"):  # exited, and a recycled pid
+        with open(tmp_path / name, "w") as f:
+            json.dump({"/u/1/bot": {"requests": 100}}, f)
+
+    assert load_all_stats()["/u/1/bot"]["requests"] == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_counters_survive_concurrent_requests():
+    stats = AppStats()
+
+    def hammer():
+        for _ in range(2000):
+            stats.record_eviction("/u/1/bot")
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert stats.apps["/u/1/bot"]["evictions"] == 16000
+
+
+def test_file_wrapper_results_pass_through(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"data")
+    stats = AppStats()
+    f = open(path, "rb")
+    result = FileWrapper(f)
+
+    response = wrap_response(result, {"wsgi.file_wrapper": FileWrapper}, stats, "/u/1/bot", 0.0)
+    assert response is result
+    response.close()
+    assert f.closed
+    assert stats.apps["/u/1/bot"]["requests"] == 1
+
+    other = wrap_response([b"x"], {"wsgi.file_wrapper": FileWrapper}, stats, "/u/1/bot", 0.0)
+    assert isinstance(other, StatsResponse)
@@ -0,0 +1,92 @@
+"""
+Login callback: a returning user costs one indexed SELECT and no INSERT (no
+AUTO_INCREMENT id burnt); only a first login inserts.
+"""
+import pytest
+from flask import Flask, Blueprint
+from utils import db_utils
+import auth_google
+from auth_google import auth_bp, init_oauth
+
+# Stand-in for routes.user_routes, where the callback redirects to
+user_bp = Blueprint("user_bp", __name__)
+user_bp.add_url_rule("/post-login", "post_login", lambda: "ok")
+user_bp.add_url_rule("/dashboard", "dashboard", lambda: "ok")
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.row = None
+        self.lastrowid = None
+
+    def execute(self, sql, params=None):
+        self.db.statements.append(sql.split()[0])
+        if sql.startswith("SELECT id FROM clients"):
+            self.row = (self.db.users[params[0]],) if params[0] in self.db.users else None
+        elif sql.startswith("INSERT INTO clients"):
+            self.lastrowid = self.db.users[params[0]] = len(self.db.users) + 100
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    in_transaction = False
+
+    def __init__(self):
+        self.statements = []
+        self.users = {"g-old": 7}
+
+    def cursor(self, dictionary=False, buffered=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def acquire(self):
+        return self
+
+    def release(self, conn, discard=False):
+        pass
+
+
+@pytest.fixture
+def login(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(db_utils, "get_pool", lambda: db)
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(user_bp, url_prefix="/user")
+    init_oauth(app)
+    monkeypatch.setattr(auth_google, "ensure_google_metadata", lambda: None)
+
+    def log_in(google_id):
+        userinfo = {"sub": google_id, "email": f"{google_id}@example.com", "name": "N"}
+        monkeypatch.setattr(auth_google.oauth.google, "authorize_access_token", lambda: {"userinfo": userinfo})
+        client = app.test_client()
+        response = client.get("/login/callback")
+        assert response.status_code == 302
+        with client.session_transaction() as session:
+            return session.get("user_id")
+
+    log_in.db = db
+    return log_in
+
+
+def test_returning_user_only_selects(login):
+    assert login("g-old") == 7
+    assert login.db.statements == ["SELECT"]
+
+
+def test_first_login_inserts(login):
+    user_id = login("g-new")
+    assert user_id == login.db.users["g-new"]
+    assert login.db.statements == ["SELECT", "INSERT"]
@@ -0,0 +1,76 @@
+"""
+db_cursor(commit=True) is one unit of work: committed on a clean exit,
+rolled back when the block raises, also on the shared request connection.
+"""
+import pytest
+from flask import Flask
+from utils import db_utils
+from utils.db_utils import db_cursor, init_request_db
+
+
+class RecordingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.calls.append(sql)
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    in_transaction = False
+
+    def __init__(self):
+        self.calls = []
+
+    def cursor(self, dictionary=False, buffered=False):
+        return RecordingCursor(self)
+
+    def commit(self):
+        self.calls.append("COMMIT")
+
+    def rollback(self):
+        self.calls.append("ROLLBACK")
+
+
+class RecordingPool:
+    conn = None
+
+    def __init__(self):
+        RecordingPool.conn = RecordingConnection()
+
+    def acquire(self):
+        return self.conn
+
+    def release(self, conn, discard=False):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    monkeypatch.setattr(db_utils, "get_pool", RecordingPool)
+    app = Flask(__name__)
+    init_request_db(app)
+    with app.test_request_context():
+        yield lambda: RecordingPool.conn
+
+
+def test_clean_unit_commits(conn):
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("DELETE FROM bots")
+    assert conn().calls == ["DELETE FROM bots", "COMMIT"]
+
+
+def test_failed_unit_rolls_back(conn):
+    with pytest.raises(RuntimeError):
+        with db_cursor(commit=True) as cursor:
+            cursor.execute("DELETE FROM bots")
+            raise RuntimeError("second statement failed")
+    assert conn().calls == ["DELETE FROM bots", "ROLLBACK"]
+
+    # The next unit on the same request connection doesn't commit the half-done one
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("UPDATE clients")
+    assert conn().calls[-2:] == ["UPDATE clients", "COMMIT"]
@@ -0,0 +1,88 @@
+"""
+Job API visibility: ownerless jobs are readable by id, owned jobs (builds,
+admin jobs) only by their owner's session, and the owner never leaks.
+Sync workers get the log by polling and event streams that end at once.
+"""
+import os
+import uuid
+import pytest
+from flask import Flask
+from utils import jobs
+from routes import job_routes
+from routes.job_routes import job_bp
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(job_bp, url_prefix="/jobs")
+    return app.test_client()
+
+
+def make_job(owner=None, status="running"):
+    job_id = uuid.uuid4().hex
+    os.makedirs(os.path.join(jobs.job_dir(job_id), "artifacts"))
+    jobs.write_status(job_id, id=job_id, status=status, owner=owner)
+    with open(jobs.log_path(job_id), "w") as f:
+        f.write("line one\n")
+    return job_id
+
+
+def login(client, google_id, is_admin=False):
+    with client.session_transaction() as session:
+        session["google_id"] = google_id
+        session["is_admin"] = is_admin
+
+
+def test_ownerless_job_is_public(client):
+    job_id = make_job()
+    response = client.get(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    assert "owner" not in response.get_json()
+
+
+def test_build_job_only_for_its_owner(client):
+    job_id = make_job(owner="g-123")
+    for path in (f"/jobs/{job_id}", f"/jobs/{job_id}/events", f"/jobs/{job_id}/log"):
+        assert client.get(path).status_code == 404
+
+    login(client, "g-other")
+    assert client.get(f"/jobs/{job_id}").status_code == 404
+
+    login(client, "g-123")
+    response = client.get(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "running"
+    assert "owner" not in response.get_json()
+
+
+def test_admin_jobs_only_for_admins(client):
+    job_id = make_job(owner="admin")
+    login(client, "admin")  # a user whose google_id happens to be "admin"
+    assert client.get(f"/jobs/{job_id}").status_code == 404
+    login(client, "g-1", is_admin=True)
+    assert client.get(f"/jobs/{job_id}").status_code == 200
+
+
+def test_log_is_polled_by_offset_in_whole_lines(client):
+    job_id = make_job()
+    first = client.get(f"/jobs/{job_id}/log").get_json()
+    assert first == {"offset": len(b"line one\n"), "lines": ["line one"]}
+
+    with open(jobs.log_path(job_id), "a") as f:
+        f.write("line two\npartial")
+    second = client.get(f"/jobs/{job_id}/log?offset={first['offset']}").get_json()
+    assert second["lines"] == ["line two"]
+    assert client.get(f"/jobs/{job_id}/log?offset={second['offset']}").get_json()["lines"] == []
+
+
+def test_events_end_after_one_pass_on_sync_workers(client, monkeypatch):
+    monkeypatch.setattr(job_routes, "STREAM_JOBS", False)
+    job_id = make_job(status="running")
+    body = client.get(f"/jobs/{job_id}/events").get_data(as_text=True)
+    assert body.startswith(f"retry: {job_routes.JOB_POLL_RETRY_MS}")
+    assert "data: line one" in body
+    assert "event: status" in body
+    assert "event: end" not in body
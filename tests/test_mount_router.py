@@ -0,0 +1,38 @@
+from utils.mount_router import MountRouter, split_mount_path
+
+
+def test_match_returns_mount_and_prefix_length():
+    router = MountRouter()
+    router.add(1, "bot", "app")
+
+    path = "/u/1/bot/static/app.js"
+    value, end = router.match(path)
+    assert value == "app"
+    assert path[:end] == "/u/1/bot"
+    assert path[end:] == "/static/app.js"
+
+    value, end = router.match("/u/1/bot")
+    assert value == "app" and end == len("/u/1/bot")
+
+
+def test_no_match_outside_the_mount_scheme():
+    router = MountRouter()
+    router.add("1", "bot", "app")
+    for path in ("/", "/u", "/u/1", "/u/1/other", "/u/2/bot", "/x/1/bot", "/u/1/botx/"):
+        assert router.match(path) == (None, 0)
+
+
+def test_remove_drops_empty_users():
+    router = MountRouter()
+    router.add("1", "a", "A")
+    router.add("1", "b", "B")
+    assert len(router) == 2
+
+    assert router.remove("1", "a") == "A"
+    assert router.remove("1", "b") == "B"
+    assert router.remove("1", "b") is None
+    assert router.users == {}
+
+
+def test_split_mount_path():
+    assert split_mount_path("/u/12/my_bot") == ("12", "my_bot")
@@ -0,0 +1,92 @@
+"""
+Keyset pagination walked end to end against SQLite, which orders NULLs the
+way MySQL does (first ascending, last descending): every row comes back
+exactly once, in order, whatever the page size and however many rows have
+no created_at.
+"""
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from utils.pagination import fetch_page, page_request, encode_cursor, decode_cursor, PAGE_SIZE, MAX_PAGE_SIZE
+
+
+class SqliteCursor:
+    """%s-placeholder cursor over sqlite3 returning dict rows with datetimes, like mysql-connector's."""
+
+    def __init__(self, conn):
+        self.cursor = conn.cursor()
+
+    def execute(self, sql, params=()):
+        params = [p.isoformat(" ") if isinstance(p, datetime) else p for p in params]
+        self.cursor.execute(sql.replace("%s", "?"), params)
+
+    def fetchall(self):
+        columns = [d[0] for d in self.cursor.description]
+        rows = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+        for row in rows:
+            if row["created_at"] is not None:
+                row["created_at"] = datetime.fromisoformat(row["created_at"])
+        return rows
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE clients (id INTEGER PRIMARY KEY, plan TEXT, created_at TEXT)")
+    start = datetime(2024, 1, 1)
+    for row_id in range(1, 24):
+        # Every third row predates the created_at column; some share a timestamp
+        created_at = None if row_id % 3 == 0 else (start + timedelta(days=row_id // 2)).isoformat(" ")
+        conn.execute("INSERT INTO clients VALUES (?, ?, ?)", (row_id, "gold" if row_id % 2 else "free", created_at))
+    return SqliteCursor(conn)
+
+
+def walk(cursor, sort, limit, filters=(), params=()):
+    seen = []
+    after = None
+    while True:
+        args = {"sort": sort, "limit": str(limit)}
+        if after:
+            args["after"] = after
+        rows, after = fetch_page(cursor, "SELECT id, plan, created_at FROM clients", filters, params, page_request(args))
+        assert len(rows) <= limit
+        seen.extend(rows)
+        if after is None:
+            return seen
+
+
+def expected_order(cursor, sort):
+    order = "DESC" if sort == "newest" else "ASC"
+    cursor.execute(f"SELECT id, plan, created_at FROM clients ORDER BY created_at {order}, id {order}")
+    return [row["id"] for row in cursor.fetchall()]
+
+
+@pytest.mark.parametrize("sort", ["newest", "oldest"])
+@pytest.mark.parametrize("limit", [1, 2, 5, 7, 50])
+def test_every_row_once_in_order(cursor, sort, limit):
+    ids = [row["id"] for row in walk(cursor, sort, limit)]
+    assert ids == expected_order(cursor, sort)
+
+
+def test_filters_apply_on_every_page(cursor):
+    rows = walk(cursor, "newest", 3, ["plan = %s"], ["gold"])
+    assert rows and all(row["plan"] == "gold" for row in rows)
+    assert len(rows) == 12
+
+
+def test_cursor_round_trip():
+    for created_at in (datetime(2024, 5, 1, 12, 30), None):
+        assert decode_cursor(encode_cursor({"created_at": created_at, "id": 9})) == (created_at, 9)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_limit_parsing():
+    assert page_request({})["limit"] == PAGE_SIZE
+    assert page_request({"limit": ""})["limit"] == PAGE_SIZE
+    assert page_request({"limit": "5"})["limit"] == 5
+    assert page_request({"limit": "100000"})["limit"] == MAX_PAGE_SIZE
+    with pytest.raises(ValueError):
+        page_request({"limit": "many"})
+    with pytest.raises(ValueError):
+        page_request({"sort": "random"})
@@ -0,0 +1,120 @@
+"""
+Round trips per page, counted by TimedCursor on g.db_queries. The pool hands
+out a fake connection that answers every SELECT, so no MySQL is needed; a
+change that adds a query to one of these pages fails here.
+"""
+import os
+import pytest
+from flask import Flask, g
+from utils import db_utils
+from utils.db_utils import init_request_db
+from routes.user_routes import user_bp
+from routes.contact_routes import contact_bp
+from routes.bot_manager import bot_bp
+from routes.job_routes import job_bp
+from auth_google import auth_bp
+from conftest import ROOT
+
+
+class FakeCursor:
+    def __init__(self, conn, dictionary):
+        self.conn = conn
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        if "FROM clients c" in sql:
+            row = {"id": 7, "plan": "silver", "bot_count": 1, "requested_plan": None,
+                   "request_status": None, "request_created_at": None}
+            self.rows = [row]
+        elif "FROM bots" in sql:
+            self.rows = [{"id": 1, "user_id": 7, "button_name": "Quiz", "folder_name": "quiz",
+                          "image_url": "/static/images/default-icon.png", "created_at": None}]
+        else:
+            self.rows = []
+        self.rowcount = 1
+        self.lastrowid = 1
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    in_transaction = False
+
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self, dictionary=False, buffered=False):
+        return FakeCursor(self, dictionary)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    def acquire(self):
+        return self.conn
+
+    def release(self, conn, discard=False):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(db_utils, "get_pool", FakePool)
+
+    app = Flask(__name__, template_folder=os.path.join(ROOT, "templates"), static_folder=os.path.join(ROOT, "static"))
+    app.secret_key = "test"
+    init_request_db(app)
+    app.register_blueprint(user_bp, url_prefix="/user")
+    app.register_blueprint(contact_bp, url_prefix="/contact")
+    app.register_blueprint(bot_bp, url_prefix="/bot")
+    app.register_blueprint(job_bp, url_prefix="/jobs")
+    app.register_blueprint(auth_bp)
+
+    counts = []
+
+    @app.after_request
+    def remember_queries(response):
+        counts.append(g.get("db_queries", 0))
+        return response
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(google_id="g-7", user_id=7, user_logged_in=True, email="a@example.com", name="A")
+    client.queries = counts
+    return client
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/user/dashboard", 2),   # user context + app list
+    ("/contact/profile", 1),  # user context only
+    ("/contact/contact", 1),
+])
+def test_page_queries(client, path, expected):
+    response = client.get(path)
+    assert response.status_code == 200
+    assert client.queries == [expected]
+
+
+def test_upgrade_request_queries(client):
+    response = client.post("/contact/contact", data={"requested_plan": "gold", "message": "more apps"})
+    assert response.status_code == 200
+    # user context + the insert
+    assert client.queries == [2]
@@ -0,0 +1,62 @@
+"""
+Incremental requirement sync on edit: a project dropped from
+requirements.txt is only uninstalled when nothing left still depends on it,
+and the venv is rebuilt when the installed dependency graph can't be read.
+"""
+import json
+import pytest
+from utils import upload_utils
+
+
+@pytest.fixture
+def venv(tmp_path, monkeypatch):
+    venv_path = tmp_path / "venv"
+    venv_path.mkdir()
+    lock = {"requirements_hash": "old", "requirements": ["requests==2.31.0", "urllib3==2.0.7"]}
+    (venv_path / upload_utils.LOCK_FILE).write_text(json.dumps(lock))
+    (tmp_path / "requirements.txt").write_text("requests==2.31.0\nsix==1.16.0\n")
+
+    calls = []
+    monkeypatch.setattr(upload_utils, "_run_pip", lambda venv_path, args, cwd=None, log_path=None: calls.append(args))
+    monkeypatch.setattr(upload_utils, "install_requirements",
+                        lambda venv_path, path, cwd=None, log_path=None: calls.append(["install", open(path).read()]))
+    monkeypatch.setattr(upload_utils, "write_lock", lambda venv_path, path: None)
+    return str(venv_path), str(tmp_path / "requirements.txt"), calls
+
+
+def test_dependency_of_a_remaining_requirement_is_kept(venv, monkeypatch):
+    venv_path, req_path, calls = venv
+    monkeypatch.setattr(upload_utils, "_dependency_graph",
+                        lambda venv_path: {"requests": ["urllib3", "idna"], "urllib3": [], "six": []})
+    assert upload_utils.sync_requirements(venv_path, req_path) == "synced"
+    assert calls == [["install", "six==1.16.0\n"]]
+
+
+def test_unused_requirement_is_uninstalled(venv, monkeypatch):
+    venv_path, req_path, calls = venv
+    monkeypatch.setattr(upload_utils, "_dependency_graph", lambda venv_path: {"requests": ["idna"], "urllib3": []})
+    upload_utils.sync_requirements(venv_path, req_path)
+    assert calls[-1] == ["uninstall", "-y", "urllib3"]
+
+
+def test_unreadable_graph_rebuilds_the_venv(venv, monkeypatch):
+    venv_path, req_path, calls = venv
+    built = []
+    monkeypatch.setattr(upload_utils, "_dependency_graph", lambda venv_path: None)
+    monkeypatch.setattr(upload_utils, "build_venv", lambda venv_path, path, cwd=None, log_path=None: built.append(venv_path))
+    assert upload_utils.sync_requirements(venv_path, req_path) == "built"
+    assert built == [venv_path]
+    assert not any(args[0] == "uninstall" for args in calls)
+
+
+def test_required_by_follows_transitive_dependencies():
+    graph = {"flask": ["werkzeug", "jinja2"], "jinja2": ["markupsafe"], "werkzeug": ["markupsafe"]}
+    assert upload_utils._required_by(graph, ["flask"]) == {"flask", "werkzeug", "jinja2", "markupsafe"}
+
+
+def test_hashed_requirements_are_fully_reinstalled(venv):
+    venv_path, req_path, calls = venv
+    with open(req_path, "w") as f:
+        f.write("requests==2.31.0 \\\n    --hash=sha256:abc\n")
+    assert upload_utils.sync_requirements(venv_path, req_path) == "installed"
+    assert calls == [["install", open(req_path).read()]]
@@ -0,0 +1,36 @@
+from utils.user_cache import TTLCache
+
+
+def test_hits_until_invalidated_by_any_worker(tmp_path):
+    worker_a = TTLCache(ttl=60, registry_dir=str(tmp_path))
+    worker_b = TTLCache(ttl=60, registry_dir=str(tmp_path))
+    plans = {"g-1": "free"}
+
+    assert worker_a.get("g-1", lambda: plans["g-1"]) == "free"
+    plans["g-1"] = "gold"
+    assert worker_a.get("g-1", lambda: plans["g-1"]) == "free"  # cached
+
+    worker_b.invalidate()
+    assert worker_a.get("g-1", lambda: plans["g-1"]) == "gold"
+
+
+def test_value_loaded_across_an_invalidation_is_not_cached(tmp_path):
+    cache = TTLCache(ttl=60, registry_dir=str(tmp_path))
+    other_worker = TTLCache(ttl=60, registry_dir=str(tmp_path))
+    plans = {"g-1": "free"}
+
+    def slow_load():
+        value = plans["g-1"]
+        # The admin's plan change commits and invalidates while this read is in flight
+        plans["g-1"] = "gold"
+        other_worker.invalidate()
+        return value
+
+    assert cache.get("g-1", slow_load) == "free"
+    assert cache.get("g-1", lambda: plans["g-1"]) == "gold"
+
+
+def test_none_is_never_cached(tmp_path):
+    cache = TTLCache(ttl=60, registry_dir=str(tmp_path))
+    assert cache.get("g-1", lambda: None) is None
+    assert cache.get("g-1", lambda: 7) == 7
@@ -0,0 +1,37 @@
+"""
+normalize_requirements: the venv store key is the same for requirement
+files that only differ in comments, order, spacing, line continuations or
+name spelling, and files whose contents it can't see (-r, -e, local paths) aren't stored.
+"""
+import pytest
+from utils.venv_store import normalize_requirements
+
+
+def test_cosmetic_differences_normalize_alike():
+    a = "Flask_Login == 0.6.3  # auth\n\n# tools\nrequests>=2.31\n"
+    b = "requests >= 2.31\nflask.login==0.6.3\nrequests>=2.31\n"
+    assert normalize_requirements(a) == normalize_requirements(b) == "flask-login==0.6.3\nrequests>=2.31"
+
+
+def test_option_lines_are_kept_verbatim():
+    normalized = normalize_requirements("--index-url https://pypi.example/simple\nrequests\n")
+    assert normalized.splitlines() == ["--index-url https://pypi.example/simple", "requests"]
+    assert normalized != normalize_requirements("requests\n")
+
+
+def test_markers_and_urls_keep_their_tail():
+    normalized = normalize_requirements('Foo_Bar; python_version < "3.8"\nbaz @ https://example.com/baz-1.0.whl\n')
+    assert normalized.splitlines() == ['baz@https://example.com/baz-1.0.whl', 'foo-bar;python_version<"3.8"']
+    assert normalize_requirements("git+https://github.com/a/b.git#egg=b") == "git+https://github.com/a/b.git#egg=b"
+
+
+def test_hashed_lock_file_joins_continuations():
+    text = "Requests==2.31.0 \\\n    --hash=sha256:bbb \\\n    --hash=sha256:aaa\nidna==3.6\n"
+    assert normalize_requirements(text).splitlines() == [
+        "idna==3.6", "requests==2.31.0 --hash=sha256:aaa --hash=sha256:bbb"]
+
+
+@pytest.mark.parametrize("text", ["-r base.txt", "--requirement base.txt", "-c constraints.txt",
+                                  "-e .", "--editable ./pkg", "./pkg", "/abs/pkg", "file:pkg"])
+def test_files_referencing_other_files_are_not_normalized(text):
+    assert normalize_requirements("requests\n" + text) is None
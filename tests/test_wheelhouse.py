@@ -0,0 +1,42 @@
+"""
+fully_pinned decides whether an install may go to the wheelhouse alone:
+only exact name==version pins may skip the index.
+"""
+import pytest
+from utils.wheelhouse import fully_pinned
+
+
+def write(tmp_path, text):
+    path = tmp_path / "requirements.txt"
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("text", [
+    "requests==2.31.0\n",
+    "Flask_Login == 0.6.3  # auth\n\n# comment\n",
+    "requests[socks]==2.31.0\n",
+    'pywin32==306; sys_platform == "win32"\n',
+    "requests==2.31.0 \\\n    --hash=sha256:abc \\\n    --hash=sha256:def\nidna==3.6 --hash=sha256:123\n",
+    "",
+])
+def test_exact_pins(tmp_path, text):
+    assert fully_pinned(write(tmp_path, text))
+
+
+@pytest.mark.parametrize("text", [
+    "requests>=2.31\n",
+    "requests\n",
+    "requests==2.*\n",
+    "requests==2.31.0,!=2.31.1\n",
+    "foo @ https://example.com/foo-1.0.whl\n",
+    "git+https://github.com/a/b.git#egg=b\n",
+    "requests==2.31.0\n-r base.txt\n",
+    "--index-url https://pypi.example/simple\nrequests==2.31.0\n",
+])
+def test_anything_else_is_not_pinned(tmp_path, text):
+    assert not fully_pinned(write(tmp_path, text))
+
+
+def test_missing_file_is_not_pinned(tmp_path):
+    assert not fully_pinned(str(tmp_path / "missing.txt"))
@@ -0,0 +1,320 @@
+"""
+App builds off the request path.
+
+/bot/upload only saves the zip (and icon) and queues build_app() on
+build_queue, answering 202 with the build's job id; /bot/edit/<folder>
+queues rebuild_app() the same way. The build extracts the
+zip, creates the venv, installs requirements.txt, swaps the app into place
+(backing up an existing one), records it in the DB and mounts it; an
+edit's replaced version is kept so rollback_app() can swap it back. Stage
+progress and pip's output go to the job's status and log, which the
+dashboard polls (/jobs/<build_id> and its /log), or streams through
+/jobs/<build_id>/events under eventlet.
+
+Builds are staged under BUILD_STAGING_DIR, outside apps/<google_id>/, so a
+half-built or abandoned one is never discovered as an app. Only one build
+per app folder may be queued or running, and the plan limit and name check
+are repeated (per user, under a lock) right before the app is recorded,
+since other uploads may have finished while this one was queued.
+"""
+import os
+import time
+import shutil
+import zipfile
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from utils.jobs import JobQueue, read_status
+from utils.file_lock import file_lock
+from utils.upload_utils import build_venv, sync_requirements
+from utils.venv_store import relocate_venv, copy_venv
+from utils.db_utils import save_uploaded_app, get_user_plan, get_plan_limit, get_bot_count, get_app_by_name
+from utils.app_registry import publish_mount, REGISTRY_DIR
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+STATIC_IMAGE_FOLDER = os.path.join(PROJECT_ROOT, "static", "user_images")
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "2"))
+BUILD_MAX_PENDING = int(os.getenv("BUILD_MAX_PENDING", "10"))
+BUILD_STAGING_DIR = os.getenv("BUILD_STAGING_DIR", os.path.join(REGISTRY_DIR, "staging"))
+BUILDS_DIR = os.path.join(REGISTRY_DIR, "builds")
+# The version an edit replaced (code and venv) is kept here until the next edit, for rollback_app()
+PREVIOUS_DIR = os.path.join(REGISTRY_DIR, "previous")
+# A build still "running" after this long died with its worker; it no longer blocks its folder
+BUILD_STALE_SECONDS = 3600
+
+# Separate from the hosted bots' job pool, so a burst of uploads can't starve their jobs
+build_queue = JobQueue(BUILD_WORKERS, BUILD_MAX_PENDING, name="build")
+
+
+class BuildInProgress(Exception):
+    pass
+
+
+def _user_lock(google_id):
+    return file_lock(os.path.join(BUILDS_DIR, f"{google_id}.lock"))
+
+
+def _marker_path(google_id, folder_name):
+    return os.path.join(BUILDS_DIR, str(google_id), f"{folder_name}.build")
+
+
+def build_in_progress(google_id, folder_name):
+    """Id of the queued or running build of this app folder, or None."""
+    try:
+        with open(_marker_path(google_id, folder_name)) as f:
+            build_id = f.read().strip()
+    except OSError:
+        return None
+    status = read_status(build_id) if build_id else None
+    if status and status.get("status") in ("queued", "running") \
+            and time.time() - (status.get("created_at") or 0) < BUILD_STALE_SECONDS:
+        return build_id
+    return None
+
+
+def _submit(google_id, folder_name, fn, *args):
+    with _user_lock(google_id):
+        if build_in_progress(google_id, folder_name):
+            raise BuildInProgress(f"'{folder_name}' is already being built")
+        build_id = build_queue.submit(fn, google_id, *args, owner=google_id)
+        marker = _marker_path(google_id, folder_name)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, "w") as f:
+            f.write(build_id)
+    return build_id
+
+
+def submit_build(google_id, user_id, button_name, folder_name, zip_path, image_path=None):
+    """
+    Queue a build of the saved zip; returns the build (job) id.
+    Raises JobQueueFull, or BuildInProgress when this folder already has a build queued or running.
+    """
+    return _submit(google_id, folder_name, build_app, user_id, button_name, folder_name, zip_path, image_path)
+
+
+def submit_rebuild(google_id, user_id, folder_name, zip_path):
+    """Queue replacing an existing app's code with the saved zip; returns the build id. Raises like submit_build."""
+    return _submit(google_id, folder_name, rebuild_app, user_id, folder_name, zip_path)
+
+
+def previous_version_dir(google_id, folder_name):
+    return os.path.join(PREVIOUS_DIR, str(google_id), folder_name)
+
+
+def _check_allowed(google_id, user_id, button_name):
+    """The upload route's plan limit and name checks, repeated at deploy time. Raises ValueError."""
+    plan = get_user_plan(google_id)
+    limit = get_plan_limit(plan)
+    if get_bot_count(user_id) >= limit:
+        raise ValueError(f"You have reached your app limit ({limit} apps) for the '{plan}' plan.")
+    if get_app_by_name(user_id, button_name):
+        raise ValueError(f"An app with the name '{button_name}' already exists. Please use a unique name.")
+
+
+def _extract(zip_path, stage_dir):
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extractall(stage_dir)
+
+    # A zip of a single folder: move its contents up
+    extracted_items = os.listdir(stage_dir)
+    if len(extracted_items) == 1:
+        nested = os.path.join(stage_dir, extracted_items[0])
+        if os.path.isdir(nested):
+            holding_dir = tempfile.mkdtemp(dir=os.path.dirname(stage_dir))
+            for item_name in os.listdir(nested):
+                shutil.move(os.path.join(nested, item_name), os.path.join(holding_dir, item_name))
+            shutil.rmtree(nested)
+            for item_name in os.listdir(holding_dir):
+                shutil.move(os.path.join(holding_dir, item_name), os.path.join(stage_dir, item_name))
+            shutil.rmtree(holding_dir)
+
+
+def _backup_and_remove(google_id, folder_name, app_dir, image_dir, job):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_dir = os.path.join(PROJECT_ROOT, "backup", str(google_id), f"{folder_name}_{timestamp}")
+    os.makedirs(os.path.dirname(backup_dir), exist_ok=True)
+    shutil.copytree(app_dir, backup_dir, dirs_exist_ok=True)
+    job.log(f"Backup of the previous version: {backup_dir}")
+
+    retries = 5
+    delay = 1
+    for i in range(retries):
+        try:
+            if os.path.exists(app_dir):
+                shutil.rmtree(app_dir)
+            if os.path.exists(image_dir):
+                shutil.rmtree(image_dir)
+            return
+        except OSError as e:
+            # Windows reports "directory not empty" (145) while files are still being released
+            if getattr(e, "winerror", None) == 145 and platform.system() == "Windows":
+                print(f"⚠️ Attempt {i+1}/{retries}: Directory not empty removing {app_dir}. Retrying after {delay}s...")
+            else:
+                print(f"⚠️ Attempt {i+1}/{retries}: Could not remove {app_dir} or {image_dir}: {e}. Retrying after {delay}s...")
+            time.sleep(delay)
+    raise RuntimeError(f"Failed to remove the existing app after {retries} attempts.")
+
+
+def build_app(job, google_id, user_id, button_name, folder_name, zip_path, image_path=None):
+    """Job function: build and deploy an uploaded app. Returns where it is served."""
+    apps_dir = os.path.join(PROJECT_ROOT, "apps", str(google_id))
+    app_dir = os.path.join(apps_dir, folder_name)
+    image_dir = os.path.join(STATIC_IMAGE_FOLDER, str(google_id), folder_name)
+    stage_dir = None
+    try:
+        job.progress("Extracting ZIP", 5)
+        os.makedirs(BUILD_STAGING_DIR, exist_ok=True)
+        stage_dir = tempfile.mkdtemp(prefix=f"{google_id}_{folder_name}_", dir=BUILD_STAGING_DIR)
+        try:
+            _extract(zip_path, stage_dir)
+        except zipfile.BadZipFile:
+            raise ValueError("Invalid ZIP file.")
+
+        job.progress("Creating virtual environment and installing requirements", 15)
+        venv_path = os.path.join(stage_dir, "venv")
+        req_path = os.path.join(stage_dir, "requirements.txt")
+        try:
+            if build_venv(venv_path, req_path, cwd=stage_dir, log_path=job.log_path):
+                job.log("Reused a stored environment with the same requirements")
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to install dependencies (pip exited with {e.returncode}); see the build log.")
+
+        job.progress("Deploying", 85)
+        # Serialised per user, so two queued uploads can't both take the last free slot
+        with _user_lock(google_id):
+            _check_allowed(google_id, user_id, button_name)
+            os.makedirs(apps_dir, exist_ok=True)
+            if os.path.exists(app_dir):
+                _backup_and_remove(google_id, folder_name, app_dir, image_dir, job)
+            shutil.move(stage_dir, app_dir)
+            stage_dir = None
+            relocate_venv(os.path.join(app_dir, "venv"), venv_path)
+
+            image_url = "/static/images/default-icon.png"
+            if image_path and os.path.exists(image_path):
+                os.makedirs(image_dir, exist_ok=True)
+                shutil.move(image_path, os.path.join(image_dir, "icon.png"))
+                image_url = f"/static/user_images/{google_id}/{folder_name}/icon.png"
+
+            save_uploaded_app(google_id=google_id, user_id=user_id, button_name=button_name,
+                              folder_name=folder_name, image_url=image_url)
+
+        job.progress("Starting app", 95)
+        result = {"app_url": f"/u/{user_id}/{folder_name}", "message": f"App '{button_name}' uploaded successfully!"}
+        try:
+            publish_mount(user_id, google_id, folder_name)
+        except Exception as e:
+            print(f"⚠️ Error mounting {folder_name}: {e}")
+            result["message"] = "App uploaded, but failed to dynamically load it. A server restart might be needed."
+        print(f"✅ Built and deployed {app_dir}")
+        return result
+    finally:
+        if stage_dir and os.path.exists(stage_dir):
+            shutil.rmtree(stage_dir, ignore_errors=True)
+        for path in (zip_path, image_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+def _ensure_main(stage_dir):
+    """The app's entry point is main.py; a zip with another single script gets it renamed."""
+    py_files = sorted(f for f in os.listdir(stage_dir) if f.endswith(".py") and f != "__init__.py")
+    if not py_files:
+        raise ValueError("No Python script found.")
+    main_py_path = os.path.join(stage_dir, "main.py")
+    if not os.path.exists(main_py_path):
+        os.rename(os.path.join(stage_dir, py_files[0]), main_py_path)
+
+
+def rebuild_app(job, google_id, user_id, folder_name, zip_path):
+    """
+    Job function: replace an app's code with a new zip. The new version is
+    staged next to a hardlinked copy of the app's venv, which only gets the
+    changed requirements installed; the live app is swapped out only once
+    all of that worked, so a bad zip or failed install leaves it untouched.
+    The replaced version is kept in previous_version_dir() (it stays at the
+    same filesystem, and its venv is never relocated) until the next edit.
+    """
+    app_dir = os.path.join(PROJECT_ROOT, "apps", str(google_id), folder_name)
+    live_venv = os.path.join(app_dir, "venv")
+    stage_dir = old_dir = None
+    try:
+        job.progress("Extracting ZIP", 5)
+        os.makedirs(BUILD_STAGING_DIR, exist_ok=True)
+        stage_dir = tempfile.mkdtemp(prefix=f"{google_id}_{folder_name}_", dir=BUILD_STAGING_DIR)
+        try:
+            _extract(zip_path, stage_dir)
+        except zipfile.BadZipFile:
+            raise ValueError("Invalid ZIP file.")
+        _ensure_main(stage_dir)
+
+        job.progress("Installing changed requirements", 20)
+        venv_path = os.path.join(stage_dir, "venv")
+        req_path = os.path.join(stage_dir, "requirements.txt")
+        try:
+            if os.path.exists(live_venv):
+                # A venv shipped in the zip doesn't replace the built one
+                shutil.rmtree(venv_path, ignore_errors=True)
+                copy_venv(live_venv, venv_path)
+                job.log(f"Requirements: {sync_requirements(venv_path, req_path, cwd=stage_dir, log_path=job.log_path)}")
+            else:
+                build_venv(venv_path, req_path, cwd=stage_dir, log_path=job.log_path)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to install dependencies (pip exited with {e.returncode}); see the build log.")
+
+        job.progress("Deploying", 85)
+        with _user_lock(google_id):
+            if not os.path.exists(app_dir):
+                raise ValueError("The app was deleted while it was being rebuilt.")
+            # The version before the one being replaced is discarded
+            prev_dir = previous_version_dir(google_id, folder_name)
+            if os.path.exists(prev_dir):
+                old_dir = tempfile.mkdtemp(prefix=f"{google_id}_{folder_name}_old_", dir=BUILD_STAGING_DIR)
+                shutil.move(prev_dir, os.path.join(old_dir, folder_name))
+            os.makedirs(os.path.dirname(prev_dir), exist_ok=True)
+            shutil.move(app_dir, prev_dir)
+            shutil.move(stage_dir, app_dir)
+            stage_dir = None
+            relocate_venv(live_venv, venv_path)
+
+        job.progress("Starting app", 95)
+        result = {"app_url": f"/u/{user_id}/{folder_name}", "message": "App updated successfully"}
+        try:
+            # Replace the mount so every worker imports the new code on its next request
+            publish_mount(user_id, google_id, folder_name)
+        except Exception as e:
+            print(f"⚠️ Error re-mounting app after edit: {e}")
+            result["message"] = "App updated, but failed to reload it. A server restart might be needed."
+        print(f"✅ Rebuilt and deployed {app_dir}")
+        job.log("The previous version is kept for rollback until the next edit")
+        return result
+    finally:
+        for path in (stage_dir, old_dir):
+            if path and os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+        if zip_path and os.path.exists(zip_path):
+            os.remove(zip_path)
+
+
+def rollback_app(google_id, user_id, folder_name):
+    """
+    Swap an app back to the version its last edit replaced; the edited
+    version becomes the previous one, so a second rollback undoes the first.
+    Raises BuildInProgress, or ValueError when there is nothing to roll back to.
+    """
+    app_dir = os.path.join(PROJECT_ROOT, "apps", str(google_id), folder_name)
+    prev_dir = previous_version_dir(google_id, folder_name)
+    with _user_lock(google_id):
+        if build_in_progress(google_id, folder_name):
+            raise BuildInProgress(f"'{folder_name}' is being built")
+        if not os.path.isdir(prev_dir) or not os.path.isdir(app_dir):
+            raise ValueError("There is no previous version of this app to roll back to.")
+        os.makedirs(BUILD_STAGING_DIR, exist_ok=True)
+        swap_dir = tempfile.mkdtemp(prefix=f"{google_id}_{folder_name}_swap_", dir=BUILD_STAGING_DIR)
+        shutil.move(app_dir, os.path.join(swap_dir, folder_name))
+        shutil.move(prev_dir, app_dir)
+        shutil.move(os.path.join(swap_dir, folder_name), prev_dir)
+        os.rmdir(swap_dir)
+    publish_mount(user_id, google_id, folder_name)
+    print(f"♻️ Rolled {app_dir} back to its previous version")
@@ -0,0 +1,338 @@
+import os
+import gc
+import sys
+import time
+import threading
+import psutil
+from importlib import invalidate_caches
+from importlib.util import spec_from_file_location, module_from_spec
+from utils.db_utils import get_all_users
+from utils.upload_utils import get_user_paths
+from utils.app_registry import mount_entry
+from utils.mount_router import MountRouter, split_mount_path
+from utils.app_proxy import ProxyApp, AppProcess
+from utils.app_stats import AppStats, wrap_response
+from utils.async_compat import check_app, is_compatible
+
+
+def discover_user_apps():
+    """Return {mount_path: (modname, main_file)} for every uploaded app without importing any of them."""
+    mounts = {}
+    for user in get_all_users():
+        google_id = user["google_id"]
+        user_id = str(user["id"])
+        _, script_dir, _ = get_user_paths(google_id)
+
+        if not os.path.isdir(script_dir):
+            continue
+
+        for folder in os.listdir(script_dir):
+            mount_path, modname, main_file = mount_entry(user_id, google_id, folder, script_dir)
+            if os.path.isfile(main_file):
+                mounts[mount_path] = (modname, main_file)
+    return mounts
+
+
+def load_user_app(modname, main_file):
+    """Exec a user's main.py and return its `app` object (None if it has none)."""
+    invalidate_caches()
+    spec = spec_from_file_location(modname, main_file)
+    if not spec or not spec.loader:
+        print(f"❌ Could not create spec for {main_file}")
+        return None
+
+    module = module_from_spec(spec)
+    sys.modules[modname] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        sys.modules.pop(modname, None)
+        raise
+
+    if not hasattr(module, "app"):
+        print(f"⚠️ No app found in {main_file}")
+        return None
+    return module.app
+
+
+def unload_user_modules(modname, main_file):
+    """Drop an app's main module and any helper modules it imported from its own folder."""
+    sys.modules.pop(modname, None)
+    app_dir = os.path.dirname(os.path.abspath(main_file)) + os.sep
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, "__file__", None)
+        if module_file and os.path.abspath(module_file).startswith(app_dir):
+            sys.modules.pop(name, None)
+
+
+class Mount:
+    """Router slot for one mount; holds the loaded app so dispatch needs no further lookups."""
+
+    __slots__ = ("mount_path", "app", "last_used", "rss", "failed_at")
+
+    def __init__(self, mount_path):
+        self.mount_path = mount_path
+        self.app = None
+        self.last_used = 0.0
+        self.rss = 0  # estimated bytes the app added to this worker when imported
+        self.failed_at = None  # monotonic time of the last failed import, if any
+
+
+class UserAppDispatcher:
+    """
+    WSGI middleware that serves /u/<user_id>/<folder> from the uploaded apps.
+
+    At boot only the mount_path -> main.py map is known. In lazy mode an app is
+    imported on the first request that hits its mount and the import time is
+    recorded as its cold start; in eager mode every app is imported up front
+    (the old register_all_apps behaviour).
+
+    With a registry attached, single mounts are added, replaced or removed
+    as other workers publish them, without rebuilding the whole map.
+
+    hosting="inprocess" imports main.py into this interpreter;
+    hosting="subprocess" runs each app in its own venv's python and proxies
+    to it (see utils/app_proxy.py).
+
+    With a memory_budget (bytes), in-process apps are evicted least recently
+    used first whenever a cold start pushes their combined estimated RSS over
+    the budget; an evicted app is imported again on its next request.
+    Subprocess-hosted apps live outside the worker and do not count.
+
+    An app whose import fails is answered with a 503 for `load_retry` seconds
+    before it is imported again, so a broken main.py is not re-executed on
+    every request; publishing a new version retries it immediately.
+
+    With a limiter (utils/app_limiter.py), requests to an app that is over its
+    concurrency cap wait briefly in a bounded queue and are otherwise shed
+    with a 503 + Retry-After, so one slow bot cannot occupy every worker.
+    """
+
+    def __init__(self, app, mounts=None, lazy=True, registry=None, hosting="inprocess", memory_budget=0,
+                 limiter=None, retry_after=5, async_check=False, load_retry=30):
+        self.app = app
+        self.async_check = async_check  # warn about apps that would stall an eventlet worker
+        self.lazy = lazy
+        self.hosting = hosting
+        self.memory_budget = memory_budget
+        self.limiter = limiter
+        self.retry_after = retry_after
+        self.registry = registry
+        self.load_retry = load_retry
+        self.lock = threading.RLock()
+        self.mounts = {}       # mount_path -> (modname, main_file)
+        self.router = MountRouter()  # user_id -> folder -> Mount
+        self.apps = {}         # mount_path -> loaded WSGI app
+        self.stats = AppStats()  # per-app requests, CPU, memory, cold starts, evictions
+        self.set_mounts(mounts or {})
+
+    def set_mounts(self, mounts):
+        """Replace the whole mount map; loaded apps are dropped and re-imported on demand."""
+        with self.lock:
+            for mount_path in list(self.mounts):
+                self._drop(mount_path)
+            self.mounts = dict(mounts)
+            self.apps = {}
+            self.router.clear()
+            for mount_path in self.mounts:
+                self.router.add(*split_mount_path(mount_path), Mount(mount_path))
+
+        if not self.lazy:
+            for mount_path in list(self.mounts):
+                self.load(mount_path)
+
+    def add_mount(self, mount_path, modname, main_file):
+        """Add a mount, or replace it so the next request imports the new code."""
+        with self.lock:
+            self._drop(mount_path)
+            self.mounts[mount_path] = (modname, main_file)
+            self.router.add(*split_mount_path(mount_path), Mount(mount_path))
+        if not self.lazy:
+            self.load(mount_path)
+
+    def remove_mount(self, mount_path):
+        with self.lock:
+            self._drop(mount_path)
+            entry = self.mounts.pop(mount_path, None)
+            self.router.remove(*split_mount_path(mount_path))
+            self.stats.forget(mount_path)
+        if self.hosting == "subprocess" and entry is not None:
+            # The host may have been started by another worker; nobody will use it again
+            AppProcess(mount_path, entry[1]).stop()
+
+    def _drop(self, mount_path):
+        entry = self.mounts.get(mount_path)
+        if entry is not None:
+            unload_user_modules(*entry)
+        app = self.apps.pop(mount_path, None)
+        if isinstance(app, ProxyApp):
+            app.close()
+        mount = self.router.match(mount_path)[0]
+        if mount is not None:
+            mount.app = None
+            mount.rss = 0
+
+    def sync(self):
+        """Apply mount changes published by any worker since the last request."""
+        if self.registry is None or not self.registry.changed():
+            return
+        for entry in self.registry.poll():
+            if entry["op"] == "add":
+                self.add_mount(entry["mount_path"], entry["modname"], entry["main_file"])
+                print(f"🔄 Mount updated: {entry['mount_path']}")
+            elif entry["op"] == "remove":
+                self.remove_mount(entry["mount_path"])
+                print(f"🔄 Mount removed: {entry['mount_path']}")
+
+    def load(self, mount_path):
+        """Return the WSGI app for a mount, importing it on first use."""
+        app = self.apps.get(mount_path)
+        if app is not None:
+            return app
+
+        with self.lock:
+            app = self.apps.get(mount_path)
+            if app is not None:
+                return app
+
+            entry = self.mounts.get(mount_path)
+            if entry is None:
+                return None
+
+            modname, main_file = entry
+            mount = self.router.match(mount_path)[0]
+            if self.async_check and self.hosting == "inprocess":
+                self.warn_if_blocking(mount_path, main_file)
+            process = psutil.Process()
+            rss_before = process.memory_info().rss
+            started = time.perf_counter()
+            try:
+                if self.hosting == "subprocess":
+                    app = ProxyApp(mount_path, main_file).start()
+                else:
+                    app = load_user_app(modname, main_file)
+            except Exception as e:
+                print(f"❌ Failed to load {mount_path}: {e}")
+                app = None
+            if app is None:
+                mount.failed_at = time.monotonic()
+                return None
+
+            elapsed = time.perf_counter() - started
+            rss_after = process.memory_info().rss
+            mount.app = app
+            mount.rss = max(rss_after - rss_before, 0) if self.hosting == "inprocess" else 0
+            self.apps[mount_path] = app
+            self.stats.record_import(mount_path, mount.rss, elapsed)
+            if isinstance(app, ProxyApp):
+                self.stats.hosts[mount_path] = lambda app=app: app.process.read_pid()[0]
+            print(f"✅ Mounted: {mount_path} (cold start {elapsed * 1000:.0f} ms, +{mount.rss / 1048576:.1f} MB)")
+
+            if self.memory_budget:
+                # Only what the apps added counts, not the worker's baseline, or every cold start would evict
+                used = self.apps_rss()
+                if used > self.memory_budget:
+                    self.evict(used - self.memory_budget, keep=mount_path)
+            return app
+
+    def apps_rss(self):
+        """Combined estimated RSS of the in-process apps loaded in this worker."""
+        with self.lock:
+            return sum(self.router.match(path)[0].rss for path, app in self.apps.items()
+                       if not isinstance(app, ProxyApp))
+
+    def warn_if_blocking(self, mount_path, main_file):
+        findings = check_app(os.path.dirname(main_file))
+        if not is_compatible(findings):
+            print(f"⚠️ {mount_path} does blocking work the eventlet worker cannot patch:")
+        for f in findings:
+            if f["severity"] != "cpu":
+                print(f"    [{f['severity']}] {f['file']}:{f['line']} {f['what']} - {f['reason']}")
+
+    def evict(self, overshoot, keep=None):
+        """Unload the least recently used apps until their estimated RSS covers `overshoot` bytes."""
+        with self.lock:
+            # Subprocess hosts don't use this worker's memory; unloading them frees nothing here
+            loaded = [self.router.match(path)[0] for path, app in self.apps.items()
+                      if path != keep and not isinstance(app, ProxyApp)]
+            loaded.sort(key=lambda mount: mount.last_used)
+            freed = 0
+            for mount in loaded:
+                if freed >= overshoot:
+                    break
+                rss = mount.rss
+                freed += rss
+                self._drop(mount.mount_path)
+                self.stats.record_eviction(mount.mount_path)
+                print(f"♻️ Evicted idle app {mount.mount_path} (~{rss / 1048576:.1f} MB)")
+            gc.collect()
+            return freed
+
+    def eviction_counts(self):
+        """Return {mount_path: times evicted} for this worker."""
+        return {path: stats["evictions"] for path, stats in self.stats.apps.items() if stats["evictions"]}
+
+    def cold_start_times(self):
+        """Return {mount_path: seconds} for every app imported by this worker so far."""
+        return {path: stats["cold_start"] for path, stats in self.stats.apps.items() if stats["cold_starts"]}
+
+    def failed_recently(self, mount):
+        return mount.failed_at is not None and time.monotonic() - mount.failed_at < self.load_retry
+
+    def unavailable(self, start_response):
+        start_response("503 Service Unavailable", [
+            ("Content-Type", "text/plain; charset=utf-8"),
+            ("Retry-After", str(self.load_retry)),
+        ])
+        return [b"This app failed to start. Please try again later."]
+
+    def __call__(self, environ, start_response):
+        if self.registry is not None and self.registry.changed():
+            self.sync()
+        path = environ.get("PATH_INFO", "")
+        mount, end = self.router.match(path)
+
+        if mount is not None:
+            mount.last_used = time.monotonic()
+            if mount.app is None and self.failed_recently(mount):
+                return self.unavailable(start_response)
+
+            # Take the slot before a cold start: importing main.py is the costliest part of a
+            # request and counts against the app's cap, and a shed request never pays for it
+            slot = None
+            if self.limiter is not None:
+                slot = self.limiter.acquire(mount.mount_path)
+                if slot is None:
+                    self.stats.record_shed(mount.mount_path)
+                    return self.shed(start_response)
+                if slot.waited:
+                    self.stats.record_queue_wait(mount.mount_path, slot.waited)
+
+            app = mount.app or self.load(mount.mount_path)
+            if app is None:
+                if slot is not None:
+                    slot.release()
+                if mount.failed_at is not None:
+                    return self.unavailable(start_response)
+            else:
+                environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + path[:end]
+                environ["PATH_INFO"] = path[end:]
+
+                cpu_started = time.thread_time()
+                try:
+                    result = app(environ, start_response)
+                except Exception:
+                    if slot is not None:
+                        slot.release()
+                    self.stats.record_request(mount.mount_path, time.thread_time() - cpu_started)
+                    raise
+                return wrap_response(result, environ, self.stats, mount.mount_path, cpu_started, slot)
+
+        return self.app(environ, start_response)
+
+    def shed(self, start_response):
+        start_response("503 Service Unavailable", [
+            ("Content-Type", "text/plain; charset=utf-8"),
+            ("Retry-After", str(self.retry_after)),
+        ])
+        return [b"This app is busy right now. Please try again in a few seconds."]
@@ -0,0 +1,233 @@
+"""
+Long-lived host process for one user app.
+
+Started by utils/app_proxy.py with the app's own venv/bin/python, so it must
+only use the standard library. It imports main.py once and serves WSGI
+requests framed over a Unix socket; each connection carries many requests
+so the platform side can keep a pool of them.
+
+A request is one frame with the environ followed by the body as chunks; the
+response is one frame with status and headers followed by the body as
+chunks. Bodies end with an empty chunk, so neither side holds a whole body
+in memory.
+
+    venv/bin/python utils/app_host.py --socket apps/.run/u_1_demo.sock --main apps/<google_id>/demo/main.py
+"""
+import os
+import io
+import sys
+import json
+import struct
+import argparse
+import socketserver
+from importlib.util import spec_from_file_location, module_from_spec
+
+# Frame: 8-byte header (json length, body length) + json + body
+FRAME_HEADER = struct.Struct("!II")
+# Body chunk: 4-byte length + data; length 0 ends the body, ABORT_CHUNK means it was cut short
+CHUNK_HEADER = struct.Struct("!I")
+ABORT_CHUNK = 0xFFFFFFFF
+
+
+def send_frame(sock, meta, body=b""):
+    data = json.dumps(meta).encode("utf-8")
+    sock.sendall(FRAME_HEADER.pack(len(data), len(body)) + data + body)
+
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("connection closed mid-frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    """Return (meta, body), or (None, b"") if the peer closed the connection between frames."""
+    header = sock.recv(FRAME_HEADER.size)
+    if not header:
+        return None, b""
+    if len(header) < FRAME_HEADER.size:
+        header += recv_exact(sock, FRAME_HEADER.size - len(header))
+    meta_len, body_len = FRAME_HEADER.unpack(header)
+    meta = json.loads(recv_exact(sock, meta_len).decode("utf-8"))
+    return meta, recv_exact(sock, body_len) if body_len else b""
+
+
+def send_chunk(sock, data):
+    sock.sendall(CHUNK_HEADER.pack(len(data)) + data)
+
+
+def send_abort(sock):
+    sock.sendall(CHUNK_HEADER.pack(ABORT_CHUNK))
+
+
+def recv_chunk(sock):
+    """Return the next body chunk, b"" at the end of the body."""
+    (size,) = CHUNK_HEADER.unpack(recv_exact(sock, CHUNK_HEADER.size))
+    if size == ABORT_CHUNK:
+        raise ConnectionError("the body was cut short by the sender")
+    return recv_exact(sock, size) if size else b""
+
+
+class ChunkedInput:
+    """wsgi.input that pulls the request body off the socket as the app reads it."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b""
+        self.done = False
+
+    def _fill(self):
+        chunk = recv_chunk(self.sock)
+        if not chunk:
+            self.done = True
+        self.buffer += chunk
+
+    def read(self, size=-1):
+        while not self.done and (size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        while not self.done and b"\n" not in self.buffer and (size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        data, self.buffer = self.buffer[:end], self.buffer[end:]
+        return data
+
+    def readlines(self, hint=-1):
+        return list(self)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def drain(self):
+        """Skip whatever the app left unread so the next request starts on a frame."""
+        self.buffer = b""
+        while not self.done:
+            self.done = not recv_chunk(self.sock)
+
+
+def load_app(main_file):
+    app_dir = os.path.dirname(os.path.abspath(main_file))
+    sys.path.insert(0, app_dir)
+    os.chdir(app_dir)
+    spec = spec_from_file_location("main", main_file)
+    module = module_from_spec(spec)
+    sys.modules["main"] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+
+class ProxyGone(ConnectionError):
+    """The platform side of the connection went away while a response was being sent."""
+
+
+def make_handler(app):
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    meta, _ = recv_frame(self.request)
+                    if meta is None:
+                        return
+                    self.run(meta["environ"])
+                except (ConnectionError, OSError):
+                    return
+
+        def run(self, environ):
+            sock = self.request
+            body = ChunkedInput(sock)
+            environ.update({
+                "wsgi.version": (1, 0),
+                "wsgi.url_scheme": environ.get("wsgi.url_scheme", "http"),
+                "wsgi.input": body,
+                "wsgi.errors": sys.stderr,
+                "wsgi.multithread": True,
+                "wsgi.multiprocess": True,
+                "wsgi.run_once": False,
+            })
+            response = {"sent": False}
+
+            def send_headers():
+                if not response["sent"]:
+                    send_frame(sock, {"status": response.get("status", "500 Internal Server Error"),
+                                      "headers": response.get("headers", [])})
+                    response["sent"] = True
+
+            def write(data):
+                try:
+                    send_headers()
+                    if data:
+                        send_chunk(sock, data)
+                except OSError as e:
+                    raise ProxyGone(e)
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and response["sent"]:
+                    raise exc_info[1].with_traceback(exc_info[2])
+                response["status"] = status
+                response["headers"] = [list(h) for h in headers]
+                return write
+
+            result = None
+            try:
+                result = app(environ, start_response)
+                for data in result:
+                    write(data)
+            except ProxyGone:
+                raise
+            except Exception as e:
+                print(f"❌ Unhandled error in {environ.get('SCRIPT_NAME')}{environ.get('PATH_INFO')}: {e}", file=sys.stderr)
+                if response["sent"]:
+                    # Status already went out: tell the proxy the body is incomplete and drop the connection
+                    send_abort(sock)
+                    raise ConnectionError("response aborted")
+                response["status"] = "500 Internal Server Error"
+                response["headers"] = [["Content-Type", "text/plain"]]
+                write(b"Internal Server Error")
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            send_headers()
+            send_chunk(sock, b"")
+            body.drain()
+
+    return Handler
+
+
+class HostServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--main", required=True)
+    args = parser.parse_args()
+
+    socket_path = os.path.abspath(args.socket)
+    app = load_app(os.path.abspath(args.main))
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = HostServer(socket_path, make_handler(app))
+    print(f"✅ Hosting {args.main} on {socket_path} (pid {os.getpid()})", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
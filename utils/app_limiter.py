@@ -0,0 +1,165 @@
+import os
+import time
+import hashlib
+from utils.app_registry import REGISTRY_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process flock, limiting is disabled
+    fcntl = None
+
+LIMITS_DIR = os.path.join(REGISTRY_DIR, "limits")
+TOTAL_KEY = "_all"
+
+
+def limiter_from_env():
+    """The AppLimiter configured by APP_MAX_CONCURRENCY etc., or None when limits are off."""
+    # An eventlet worker serves many requests at once, so the sync default of one slot per app would serialize every bot
+    async_workers = os.getenv("GUNICORN_WORKER_CLASS") == "eventlet"
+    max_concurrency = int(os.getenv("APP_MAX_CONCURRENCY", "20" if async_workers else "1"))
+    if not max_concurrency:
+        return None
+    # Sync workers: leave one free for the dashboard and login
+    default_total = "0" if async_workers else str(max(int(os.getenv("GUNICORN_WORKERS", "3")) - 1, 1))
+    return AppLimiter(
+        max_concurrency=max_concurrency,
+        # A queued request sleep-polls for its slot; on a sync worker that blocks the whole worker, so don't queue there by default
+        max_queue=int(os.getenv("APP_MAX_QUEUE", "50" if async_workers else "0")),
+        queue_timeout=float(os.getenv("APP_QUEUE_TIMEOUT", "2")),
+        total=int(os.getenv("APP_TOTAL_CONCURRENCY", default_total)),
+        overrides=parse_overrides(os.getenv("APP_CONCURRENCY_OVERRIDES")),
+    )
+
+
+def parse_overrides(value):
+    """'/u/1/test_book=2,/u/3/x=4' -> {'/u/1/test_book': 2, '/u/3/x': 4}"""
+    overrides = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            mount_path, limit = item.rsplit("=", 1)
+            overrides[mount_path.strip()] = int(limit)
+    return overrides
+
+
+class Slot:
+    """A held concurrency slot (one flock'd file descriptor per key)."""
+
+    def __init__(self, fds, waited):
+        self.fds = fds
+        self.waited = waited
+
+    def release(self):
+        for fd in self.fds:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self.fds = []
+
+
+class AppLimiter:
+    """
+    Cross-worker concurrency caps for hosted apps.
+
+    Every app gets `max_concurrency` slot files and `max_queue` queue files;
+    a request holds a slot by flock()ing one of them, so the count is shared
+    by all gunicorn workers and threads. When the slots are taken a request
+    may wait (holding a queue file) for up to `queue_timeout` seconds; when
+    the queue is full too, or the wait times out, acquire() returns None and
+    the dispatcher sheds the request with a 503. Waiting polls the slot files
+    every 50 ms and occupies the caller's thread meanwhile - a whole sync
+    worker, or one green thread under eventlet. An optional `total` cap
+    limits how many worker slots all hosted apps may occupy together, so the
+    dashboard and login always have a worker left.
+    """
+
+    def __init__(self, max_concurrency=1, max_queue=2, queue_timeout=2.0, total=0, overrides=None, limits_dir=LIMITS_DIR):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.total = total
+        self.overrides = overrides or {}
+        self.limits_dir = limits_dir
+        os.makedirs(limits_dir, exist_ok=True)
+
+    def limit_for(self, key):
+        if key == TOTAL_KEY:
+            return self.total
+        return self.overrides.get(key, self.max_concurrency)
+
+    def _path(self, key, kind, index):
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.limits_dir, f"{name}.{kind}{index}")
+
+    def _try_take(self, key, kind, count):
+        for index in range(count):
+            fd = os.open(self._path(key, kind, index), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def _acquire_one(self, key):
+        """Return (fd, seconds waited) or (None, seconds waited) when shed."""
+        limit = self.limit_for(key)
+        fd = self._try_take(key, "slot", limit)
+        if fd is not None:
+            return fd, 0.0
+
+        ticket = self._try_take(key, "queue", self.max_queue)
+        if ticket is None:
+            return None, 0.0
+
+        started = time.monotonic()
+        try:
+            while time.monotonic() - started < self.queue_timeout:
+                time.sleep(0.05)
+                fd = self._try_take(key, "slot", limit)
+                if fd is not None:
+                    return fd, time.monotonic() - started
+            return None, time.monotonic() - started
+        finally:
+            fcntl.flock(ticket, fcntl.LOCK_UN)
+            os.close(ticket)
+
+    def acquire(self, mount_path):
+        """Return a Slot to release when the response is done, or None to shed the request."""
+        if fcntl is None:
+            return Slot([], 0.0)
+
+        keys = [mount_path] + ([TOTAL_KEY] if self.total else [])
+        fds = []
+        waited = 0.0
+        for key in keys:
+            fd, seconds = self._acquire_one(key)
+            waited += seconds
+            if fd is None:
+                Slot(fds, waited).release()
+                return None
+            fds.append(fd)
+        return Slot(fds, waited)
+
+    def _count_held(self, key, kind, count):
+        held = 0
+        for index in range(count):
+            path = self._path(key, kind, index)
+            if not os.path.exists(path):
+                continue
+            fd = os.open(path, os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except BlockingIOError:
+                held += 1
+            finally:
+                os.close(fd)
+        return held
+
+    def usage(self, mount_path):
+        """Live, cross-worker {"active": .., "queued": .., "limit": ..} for one app."""
+        if fcntl is None:
+            return {"active": 0, "queued": 0, "limit": self.limit_for(mount_path)}
+        limit = self.limit_for(mount_path)
+        return {"active": self._count_held(mount_path, "slot", limit),
+                "queued": self._count_held(mount_path, "queue", self.max_queue),
+                "limit": limit}
@@ -0,0 +1,308 @@
+import os
+import sys
+import time
+import queue
+import socket
+import signal
+import hashlib
+import platform
+import subprocess
+import psutil
+from utils.file_lock import file_lock
+from utils.app_host import send_frame, recv_frame, send_chunk, recv_chunk
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HOST_SCRIPT = os.path.join(PROJECT_ROOT, "utils", "app_host.py")
+RUN_DIR = os.getenv("APP_HOST_RUN_DIR", os.path.join(PROJECT_ROOT, "apps", ".run"))
+POOL_SIZE = int(os.getenv("APP_HOST_POOL_SIZE", "4"))
+START_TIMEOUT = float(os.getenv("APP_HOST_START_TIMEOUT", "30"))
+REQUEST_TIMEOUT = float(os.getenv("APP_HOST_REQUEST_TIMEOUT", "300"))
+BODY_CHUNK_SIZE = 64 * 1024
+
+# Only plain values cross the socket; wsgi.* objects are rebuilt in the host
+SKIP_ENVIRON_KEYS = ("wsgi.", "werkzeug.", "gunicorn.", "eventlet.")
+# Safe to send twice if the host may already have handled the first attempt
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Host processes started by this worker, by pid; waited on so they don't linger as zombies
+_children = {}
+
+
+def _reap_children():
+    """Collect the exit status of any host this worker started that has since died (e.g. stopped by another worker)."""
+    for pid, process in list(_children.items()):
+        if process.poll() is not None:
+            del _children[pid]
+
+
+def venv_python(app_dir):
+    """The app's own venv interpreter, or the platform's if the app has no venv."""
+    if platform.system() == "Windows":
+        python_executable = os.path.join(app_dir, "venv", "Scripts", "python.exe")
+    else:
+        python_executable = os.path.join(app_dir, "venv", "bin", "python")
+    return python_executable if os.path.exists(python_executable) else sys.executable
+
+
+class AppProcess:
+    """
+    The host process serving one mount. Its socket, pid file and log live in
+    RUN_DIR under a name derived from the mount path, so every gunicorn
+    worker finds and shares the same process.
+
+    The pid file also records the code version the host was started with; a
+    host found running an older upload (or left over from before a restart)
+    is stopped and replaced instead of being reused.
+    """
+
+    def __init__(self, mount_path, main_file):
+        self.mount_path = mount_path
+        self.main_file = main_file
+        # Keep socket paths short: AF_UNIX paths are limited to ~100 bytes
+        name = hashlib.sha1(mount_path.encode("utf-8")).hexdigest()[:16]
+        self.socket_path = os.path.join(RUN_DIR, f"{name}.sock")
+        self.pid_path = os.path.join(RUN_DIR, f"{name}.pid")
+        self.lock_path = os.path.join(RUN_DIR, f"{name}.lock")
+        self.log_path = os.path.join(RUN_DIR, f"{name}.log")
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(REQUEST_TIMEOUT)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def is_running(self):
+        try:
+            self.connect().close()
+            return True
+        except OSError:
+            return False
+
+    def code_version(self):
+        """Fingerprint of the app's files (names, sizes, mtimes; venv excluded), None once main.py is gone."""
+        if not os.path.isfile(self.main_file):
+            return None
+        app_dir = os.path.dirname(self.main_file)
+        digest = hashlib.sha1()
+        for root, dirs, files in os.walk(app_dir):
+            dirs[:] = sorted(d for d in dirs if d not in ("venv", "__pycache__"))
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                digest.update(f"{os.path.relpath(path, app_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def read_pid(self):
+        try:
+            with open(self.pid_path) as f:
+                pid, version = f.read().split()
+            return int(pid), version
+        except (OSError, ValueError):
+            return None, None
+
+    def is_host(self, pid):
+        """True if pid is this mount's host, not some process that got a recycled pid."""
+        try:
+            return self.socket_path in psutil.Process(pid).cmdline()
+        except psutil.Error:
+            return False
+
+    def is_current(self):
+        return self.is_running() and self.read_pid()[1] == self.code_version()
+
+    def start(self):
+        """Start the host process unless a worker already started one for the current code."""
+        _reap_children()
+        if self.is_current():
+            return
+        with file_lock(self.lock_path):
+            if self.is_current():
+                return
+            # Nothing running, or a host still serving an older upload: replace it
+            self._stop()
+            os.makedirs(RUN_DIR, exist_ok=True)
+
+            app_dir = os.path.dirname(self.main_file)
+            with open(self.log_path, "a") as log:
+                process = subprocess.Popen(
+                    [venv_python(app_dir), HOST_SCRIPT, "--socket", self.socket_path, "--main", self.main_file],
+                    cwd=app_dir, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                    start_new_session=True,  # outlives the gunicorn worker that spawned it
+                )
+            _children[process.pid] = process
+            with open(self.pid_path, "w") as f:
+                f.write(f"{process.pid} {self.code_version()}")
+
+            deadline = time.monotonic() + START_TIMEOUT
+            while time.monotonic() < deadline:
+                if process.poll() is not None:
+                    _children.pop(process.pid, None)
+                    raise RuntimeError(f"host for {self.mount_path} exited with code {process.returncode}, see {self.log_path}")
+                if self.is_running():
+                    print(f"✅ Started host process for {self.mount_path} (pid {process.pid})")
+                    return
+                time.sleep(0.05)
+            process.kill()
+            process.wait()
+            _children.pop(process.pid, None)
+            raise RuntimeError(f"host for {self.mount_path} did not start within {START_TIMEOUT:.0f}s")
+
+    def stop(self, only_if_stale=False):
+        """Stop the host process; with only_if_stale, keep it if it already runs the current code."""
+        with file_lock(self.lock_path):
+            if only_if_stale and self.read_pid()[1] == self.code_version():
+                return
+            self._stop()
+        _reap_children()
+
+    def _stop(self):
+        """Stop whatever host the pid file points at and clear its files. Caller holds the lock."""
+        pid, _ = self.read_pid()
+        if pid is not None and self.is_host(pid):
+            try:
+                os.kill(pid, signal.SIGTERM)
+                print(f"🛑 Stopped host process for {self.mount_path} (pid {pid})")
+            except (OSError, AttributeError):
+                pass
+            process = _children.pop(pid, None)
+            if process is not None:
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+        for path in (self.pid_path, self.socket_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ProxyApp:
+    """WSGI app that forwards requests to an AppProcess over pooled Unix-socket connections."""
+
+    def __init__(self, mount_path, main_file, pool_size=POOL_SIZE):
+        self.process = AppProcess(mount_path, main_file)
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.pid = os.getpid()
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def close(self):
+        """Called when the mount is replaced or removed."""
+        self._drain()
+        self.process.stop(only_if_stale=True)
+
+    def _drain(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _checkout(self):
+        if self.pid != os.getpid():
+            # Forked: pooled sockets belong to the parent
+            self.pool = queue.LifoQueue(maxsize=self.pool.maxsize)
+            self.pid = os.getpid()
+        try:
+            return self.pool.get_nowait(), True
+        except queue.Empty:
+            pass
+        try:
+            return self.process.connect(), False
+        except OSError:
+            self.process.start()  # crashed or never started
+            return self.process.connect(), False
+
+    def _checkin(self, sock):
+        try:
+            self.pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+    def forward(self, environ):
+        """Send the request, streaming its body; return (sock, response meta) with the response body still on sock."""
+        meta = {"environ": {k: v for k, v in environ.items()
+                            if isinstance(v, (str, int, float, bool)) and not k.startswith(SKIP_ENVIRON_KEYS)}}
+        meta["environ"]["wsgi.url_scheme"] = environ.get("wsgi.url_scheme", "http")
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+
+        idempotent = environ.get("REQUEST_METHOD", "GET").upper() in IDEMPOTENT_METHODS
+        for attempt in range(2):
+            sock, pooled = self._checkout()
+            sent = body_read = False
+            try:
+                send_frame(sock, meta)
+                sent = True
+                body_read = length > 0
+                self._send_body(sock, environ["wsgi.input"], length)
+                response, _ = recv_frame(sock)
+                if response is None:
+                    raise ConnectionError("host closed the connection")
+            except (OSError, ConnectionError):
+                sock.close()
+                # A pooled connection may have gone stale (host restarted); retry once on a fresh one,
+                # unless the host may already have handled a request that isn't safe to repeat,
+                # or the request body has already been read off the client
+                if pooled and attempt == 0 and not body_read and (not sent or idempotent):
+                    continue
+                raise
+            except BaseException:
+                sock.close()
+                raise
+            return sock, response
+
+    def _send_body(self, sock, stream, length):
+        while length > 0:
+            data = stream.read(min(length, BODY_CHUNK_SIZE))
+            if not data:
+                break
+            send_chunk(sock, data)
+            length -= len(data)
+        send_chunk(sock, b"")
+
+    def __call__(self, environ, start_response):
+        try:
+            sock, response = self.forward(environ)
+        except (OSError, ConnectionError, RuntimeError) as e:
+            print(f"❌ Proxy to {self.process.mount_path} failed: {e}")
+            start_response("502 Bad Gateway", [("Content-Type", "text/plain")])
+            return [b"The app is not responding. Please try again shortly."]
+
+        start_response(response["status"], [tuple(h) for h in response["headers"]])
+        return ProxyResponse(self, sock)
+
+
+class ProxyResponse:
+    """Response body read from the host chunk by chunk as the server sends it; the connection is pooled again once the body is done."""
+
+    def __init__(self, proxy, sock):
+        self.proxy = proxy
+        self.sock = sock
+        self.done = False
+
+    def __iter__(self):
+        while True:
+            chunk = recv_chunk(self.sock)
+            if not chunk:
+                self.done = True
+                return
+            yield chunk
+
+    def close(self):
+        if self.done:
+            self.proxy._checkin(self.sock)
+        else:
+            # Client went away or the host aborted mid-body: the connection is not at a frame boundary
+            self.sock.close()
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+from utils.file_lock import file_lock
+from utils.generation import SharedGeneration
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+REGISTRY_DIR = os.getenv("APP_REGISTRY_DIR", os.path.join(PROJECT_ROOT, "apps", ".registry"))
+COMPACT_ENTRIES = int(os.getenv("APP_REGISTRY_COMPACT_ENTRIES", "1000"))
+
+
+def mount_entry(user_id, google_id, folder, script_dir=None):
+    """Return (mount_path, modname, main_file) for one uploaded app."""
+    if script_dir is None:
+        # Imported here: upload_utils -> db_utils -> db_metrics imports this module
+        from utils.upload_utils import get_user_paths
+        _, script_dir, _ = get_user_paths(google_id)
+    main_file = os.path.join(script_dir, folder, "main.py")
+    return f"/u/{user_id}/{folder}", f"{google_id}_{folder}_app", main_file
+
+
+class AppRegistry:
+    """
+    Cross-worker journal of mount changes.
+
+    Uploads, edits and deletes append one "add"/"remove" entry to an
+    append-only journal and bump a shared generation counter. Each worker
+    compares the counter with the last generation it applied on every request
+    and, only when it moved, reads the new journal entries from its saved
+    offset - no rescan of users or app folders.
+
+    Once the journal holds more than `compact_entries` entries it is rewritten
+    with only the latest entry per mount. Every entry carries the generation
+    it was published at, so a worker that finds a rewritten journal re-reads
+    it from the start and skips what it has already applied.
+    """
+
+    def __init__(self, registry_dir=REGISTRY_DIR, compact_entries=COMPACT_ENTRIES):
+        self.journal_path = os.path.join(registry_dir, "mounts.jsonl")
+        self.lock_path = os.path.join(registry_dir, "mounts.lock")
+        self.generation = SharedGeneration(os.path.join(registry_dir, "generation"))
+        self.compact_entries = compact_entries
+        self.seen_generation = 0
+        self.offset = 0
+        self.inode = None
+
+    def snapshot(self):
+        """Mark the journal position that a full scan taken right after this call reflects."""
+        with file_lock(self.lock_path):
+            self.seen_generation = self.generation.get()
+            try:
+                stat = os.stat(self.journal_path)
+                self.offset, self.inode = stat.st_size, stat.st_ino
+            except FileNotFoundError:
+                self.offset, self.inode = 0, None
+
+    def publish(self, op, mount_path, modname=None, main_file=None):
+        entry = {"op": op, "mount_path": mount_path, "modname": modname,
+                 "main_file": main_file, "at": time.time()}
+        with file_lock(self.lock_path):
+            entry["generation"] = self.generation.get() + 1
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            generation = self.generation.bump()
+            if self.compact_entries:
+                self._compact()
+            return generation
+
+    def _compact(self):
+        """Rewrite an oversized journal as the latest entry per mount. Caller holds the lock."""
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        if len(entries) <= self.compact_entries:
+            return
+
+        latest = {}
+        for entry in entries:
+            latest.pop(entry["mount_path"], None)  # keep journal order: last write goes last
+            latest[entry["mount_path"]] = entry
+        if len(latest) == len(entries):
+            return
+
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in latest.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.journal_path)
+        self.generation.bump()
+        print(f"♻️ Compacted app registry journal: {len(entries)} -> {len(latest)} entries")
+
+    def changed(self):
+        return self.generation.get() != self.seen_generation
+
+    def poll(self):
+        """Return the journal entries published since the last poll ([] if none)."""
+        if not self.changed():
+            return []
+
+        seen = self.seen_generation
+        with file_lock(self.lock_path):
+            generation = self.generation.get()
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                stat = os.fstat(f.fileno())
+                inode = stat.st_ino
+                rewritten = inode != self.inode or stat.st_size < self.offset
+                if rewritten:
+                    # Compacted (or created) since the last read: saved offset is meaningless
+                    self.inode, self.offset = inode, 0
+                f.seek(self.offset)
+                data = f.read()
+                self.offset = f.tell()
+            self.seen_generation = generation
+
+        entries = [json.loads(line) for line in data.splitlines() if line.strip()]
+        if rewritten:
+            entries = [entry for entry in entries if entry.get("generation", 0) > seen]
+        return entries
+
+
+_registry = None
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = AppRegistry()
+    return _registry
+
+
+def publish_mount(user_id, google_id, folder):
+    """Add or replace a single app mount in every worker."""
+    mount_path, modname, main_file = mount_entry(user_id, google_id, folder)
+    get_registry().publish("add", mount_path, modname, main_file)
+    print(f"✅ Published mount: {mount_path}")
+
+
+def publish_unmount(user_id, folder):
+    """Remove a single app mount from every worker."""
+    mount_path = f"/u/{user_id}/{folder}"
+    get_registry().publish("remove", mount_path)
+    print(f"✅ Published unmount: {mount_path}")
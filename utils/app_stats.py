@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import glob
+import psutil
+import threading
+from utils.app_registry import REGISTRY_DIR
+
+STATS_DIR = os.path.join(REGISTRY_DIR, "stats")
+FLUSH_SECONDS = float(os.getenv("APP_STATS_FLUSH_SECONDS", "10"))
+
+# Counters that add up across workers; everything else is a high-water mark
+SUMMED_FIELDS = ("requests", "cpu_seconds", "evictions", "cold_starts", "shed", "queued", "queue_wait_seconds")
+
+
+def _empty():
+    return {"requests": 0, "cpu_seconds": 0.0, "import_rss": 0, "peak_rss": 0,
+            "cold_start": 0.0, "cold_starts": 0, "evictions": 0, "last_used": 0.0,
+            "host_cpu_seconds": 0.0, "host_rss": 0,
+            "shed": 0, "queued": 0, "queue_wait_seconds": 0.0}
+
+
+class AppStats:
+    """
+    Per-worker resource accounting for mounted apps.
+
+    The dispatcher records import-time RSS delta and cold start per import,
+    and thread CPU time plus worker RSS after every request. Each worker
+    writes its numbers to STATS_DIR/<pid>-<start time>.json at most every
+    FLUSH_SECONDS so the admin panel can add up all workers (see
+    load_all_stats). Counters are updated under a lock: threaded and eventlet
+    workers record from many requests at once.
+    """
+
+    def __init__(self):
+        self.apps = {}
+        self.pid = None
+        self.process = None
+        self.last_flush = 0.0
+        self.hosts = {}  # mount_path -> callable returning the host pid (subprocess hosting)
+        self.lock = threading.Lock()
+
+    def _process(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.process = psutil.Process(self.pid)
+        return self.process
+
+    def get(self, mount_path):
+        stats = self.apps.get(mount_path)
+        if stats is None:
+            stats = self.apps[mount_path] = _empty()
+        return stats
+
+    def record_import(self, mount_path, rss, seconds):
+        with self.lock:
+            stats = self.get(mount_path)
+            stats["import_rss"] = rss
+            stats["cold_start"] = seconds
+            stats["cold_starts"] += 1
+
+    def record_eviction(self, mount_path):
+        with self.lock:
+            self.get(mount_path)["evictions"] += 1
+
+    def record_shed(self, mount_path):
+        with self.lock:
+            self.get(mount_path)["shed"] += 1
+
+    def record_queue_wait(self, mount_path, seconds):
+        with self.lock:
+            stats = self.get(mount_path)
+            stats["queued"] += 1
+            stats["queue_wait_seconds"] += seconds
+
+    def record_request(self, mount_path, cpu_seconds):
+        rss = self._process().memory_info().rss
+        with self.lock:
+            stats = self.get(mount_path)
+            stats["requests"] += 1
+            stats["cpu_seconds"] += cpu_seconds
+            stats["last_used"] = time.time()
+            if rss > stats["peak_rss"]:
+                stats["peak_rss"] = rss
+
+        if time.monotonic() - self.last_flush > FLUSH_SECONDS:
+            self.flush()
+
+    def forget(self, mount_path):
+        with self.lock:
+            self.apps.pop(mount_path, None)
+            self.hosts.pop(mount_path, None)
+
+    def snapshot(self):
+        hosts = {}
+        for mount_path, host_pid in list(self.hosts.items()):
+            pid = host_pid()
+            if not pid:
+                continue
+            try:
+                host = psutil.Process(pid)
+                cpu = host.cpu_times()
+                hosts[mount_path] = (cpu.user + cpu.system, host.memory_info().rss)
+            except psutil.Error:
+                pass
+        with self.lock:
+            for mount_path, (cpu_seconds, rss) in hosts.items():
+                stats = self.get(mount_path)
+                stats["host_cpu_seconds"] = cpu_seconds
+                stats["host_rss"] = rss
+            return {path: dict(stats) for path, stats in self.apps.items()}
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        os.makedirs(STATS_DIR, exist_ok=True)
+        process = self._process()
+        path = os.path.join(STATS_DIR, f"{process.pid}-{int(process.create_time())}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"⚠️ Could not write app stats: {e}")
+
+
+class StatsResponse:
+    """
+    Wraps an app's response iterable so CPU spent streaming the body is
+    counted too, and the app's concurrency slot is held until it is sent.
+    """
+
+    def __init__(self, result, stats, mount_path, cpu_started, slot=None):
+        self.result = result
+        self.result_close = getattr(result, "close", None)
+        self.stats = stats
+        self.mount_path = mount_path
+        self.cpu_started = cpu_started
+        self.slot = slot
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.result_close is not None:
+                self.result_close()
+        finally:
+            if self.slot is not None:
+                self.slot.release()
+            self.stats.record_request(self.mount_path, time.thread_time() - self.cpu_started)
+
+
+def wrap_response(result, environ, stats, mount_path, cpu_started, slot=None):
+    """
+    StatsResponse around an app's result. A wsgi.file_wrapper result is
+    returned as is with its close() hooked instead, so the server still
+    recognises it and can sendfile() the file.
+    """
+    response = StatsResponse(result, stats, mount_path, cpu_started, slot)
+    file_wrapper = environ.get("wsgi.file_wrapper")
+    if isinstance(file_wrapper, type) and isinstance(result, file_wrapper):
+        try:
+            result.close = response.close
+            return result
+        except AttributeError:  # wrapper with __slots__
+            pass
+    return response
+
+
+def _worker_alive(path):
+    """False for the stats file of a worker that exited, or whose pid now belongs to another process."""
+    pid, _, started = os.path.basename(path)[:-len(".json")].partition("-")
+    try:
+        process = psutil.Process(int(pid))
+        return not started or int(process.create_time()) == int(started)
+    except (ValueError, psutil.Error):
+        return False
+
+
+def load_all_stats():
+    """Add up the stats files of every live worker: {mount_path: stats}."""
+    totals = {}
+    for path in glob.glob(os.path.join(STATS_DIR, "*.json")):
+        if not _worker_alive(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                worker = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for mount_path, stats in worker.items():
+            total = totals.setdefault(mount_path, _empty())
+            for field, value in stats.items():
+                if field in SUMMED_FIELDS:
+                    total[field] = total.get(field, 0) + value
+                else:
+                    total[field] = max(total.get(field, value), value)
+    return totals
+
+
+def stats_by_user(totals=None):
+    """Group load_all_stats() by user: {user_id: {"apps": {folder: stats}, "requests": .., "cpu_seconds": .., "peak_rss": ..}}."""
+    users = {}
+    for mount_path, stats in (totals if totals is not None else load_all_stats()).items():
+        _, _, user_id, folder = mount_path.split("/", 3)
+        user = users.setdefault(user_id, {"apps": {}, "requests": 0, "cpu_seconds": 0.0, "peak_rss": 0})
+        user["apps"][folder] = stats
+        user["requests"] += stats["requests"]
+        user["cpu_seconds"] += stats["cpu_seconds"] + stats["host_cpu_seconds"]
+        user["peak_rss"] = max(user["peak_rss"], stats["peak_rss"], stats["host_rss"])
+    return users
@@ -0,0 +1,151 @@
+"""
+Compatibility check for running hosted bots under the eventlet worker
+(GUNICORN_WORKER_CLASS=eventlet).
+
+Eventlet makes pure-Python socket I/O cooperative (requests, urllib3,
+smtplib, time.sleep...), but C extensions doing their own I/O, a second
+event loop, or long CPU-bound work never yield and stall every other
+request in the same worker. This scans each app's sources for those.
+
+    python -m utils.async_compat            # every app under apps/
+    python -m utils.async_compat --json
+"""
+import os
+import ast
+import sys
+import json
+import glob
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# module -> (severity, reason). "blocking" stalls the worker's hub; "cpu" only
+# stalls it for as long as the work runs.
+FLAGGED_MODULES = {
+    "MySQLdb": ("blocking", "C client does its own socket I/O; use PyMySQL or mysql-connector with use_pure=True"),
+    "_mysql_connector": ("blocking", "mysql-connector C extension; connect with use_pure=True"),
+    "psycopg2": ("blocking", "libpq I/O is only cooperative with psycogreen/eventlet's psycopg patch"),
+    "pymssql": ("blocking", "FreeTDS C I/O cannot be monkey-patched"),
+    "pyodbc": ("blocking", "ODBC driver I/O cannot be monkey-patched"),
+    "cx_Oracle": ("blocking", "OCI C I/O cannot be monkey-patched"),
+    "grpc": ("blocking", "gRPC core runs its own C threads and polling"),
+    "pycurl": ("blocking", "libcurl I/O cannot be monkey-patched"),
+    "asyncio": ("blocking", "a second event loop does not cooperate with eventlet's hub"),
+    "aiohttp": ("blocking", "asyncio-based; does not cooperate with eventlet's hub"),
+    "httpx": ("blocking", "sync client is fine, but its asyncio client does not cooperate with eventlet"),
+    "playwright": ("blocking", "asyncio/driver-process based; does not cooperate with eventlet"),
+    "multiprocessing": ("blocking", "process pools and their pipes/locks are not green"),
+    "numpy": ("cpu", "long numeric work never yields"),
+    "pandas": ("cpu", "long dataframe work never yields"),
+    "torch": ("cpu", "model inference never yields"),
+    "tensorflow": ("cpu", "model inference never yields"),
+    "cv2": ("cpu", "image processing never yields"),
+    "PIL": ("cpu", "large image processing never yields"),
+    "lxml": ("cpu", "parsing large documents never yields"),
+    "openpyxl": ("cpu", "building large workbooks never yields"),
+}
+
+# Calls that block the whole worker even when the module itself is patched
+FLAGGED_CALLS = {
+    ("mysql.connector", "connect"): ("blocking", "mysql.connector.connect() without use_pure=True uses the C extension when it is installed"),
+    ("subprocess", "run"): ("cpu", "waits for the child; fine for short commands, stalls the worker for long ones"),
+    ("subprocess", "check_output"): ("cpu", "waits for the child; fine for short commands, stalls the worker for long ones"),
+    ("os", "system"): ("blocking", "os.system() is not green"),
+}
+
+
+def _call_target(node):
+    """'mysql.connector.connect' style dotted name for a Call node, if any."""
+    parts = []
+    func = node.func
+    while isinstance(func, ast.Attribute):
+        parts.append(func.attr)
+        func = func.value
+    if isinstance(func, ast.Name):
+        parts.append(func.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+def check_source(source, filename="<app>"):
+    """Return a list of findings {"file", "line", "severity", "what", "reason"} for one source file."""
+    try:
+        tree = ast.parse(source, filename=filename)
+    except SyntaxError as e:
+        return [{"file": filename, "line": e.lineno, "severity": "error", "what": "syntax", "reason": str(e)}]
+
+    findings = []
+    for node in ast.walk(tree):
+        names = []
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        for name in names:
+            top = name.split(".")[0]
+            for module in (name, top):
+                if module in FLAGGED_MODULES:
+                    severity, reason = FLAGGED_MODULES[module]
+                    findings.append({"file": filename, "line": node.lineno, "severity": severity,
+                                     "what": f"import {name}", "reason": reason})
+                    break
+
+        if isinstance(node, ast.Call):
+            target = _call_target(node)
+            if not target or "." not in target:
+                continue
+            module, func = target.rsplit(".", 1)
+            flagged = FLAGGED_CALLS.get((module, func))
+            if not flagged:
+                continue
+            if (module, func) == ("mysql.connector", "connect") and any(
+                    kw.arg == "use_pure" and isinstance(kw.value, ast.Constant) and kw.value.value for kw in node.keywords):
+                continue
+            severity, reason = flagged
+            findings.append({"file": filename, "line": node.lineno, "severity": severity,
+                             "what": f"{target}()", "reason": reason})
+    return findings
+
+
+def check_app(app_dir):
+    """Check every .py file of one app (its venv excluded)."""
+    findings = []
+    for root, dirs, files in os.walk(app_dir):
+        dirs[:] = [d for d in dirs if d not in ("venv", "__pycache__", ".git")]
+        for name in files:
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    findings.extend(check_source(f.read(), os.path.relpath(path, app_dir)))
+    return findings
+
+
+def is_compatible(findings):
+    return not any(f["severity"] in ("blocking", "error") for f in findings)
+
+
+def check_all_apps(apps_root=None):
+    """{app_dir: findings} for every apps/<google_id>/<folder> with a main.py."""
+    apps_root = apps_root or os.path.join(PROJECT_ROOT, "apps")
+    return {os.path.dirname(main_file): check_app(os.path.dirname(main_file))
+            for main_file in sorted(glob.glob(os.path.join(apps_root, "*", "*", "main.py")))}
+
+
+def main():
+    report = check_all_apps()
+    if "--json" in sys.argv:
+        print(json.dumps(report, indent=2))
+        return
+
+    incompatible = 0
+    for app_dir, findings in report.items():
+        ok = is_compatible(findings)
+        incompatible += not ok
+        print(f"{'✅' if ok else '❌'} {os.path.relpath(app_dir, PROJECT_ROOT)}")
+        for f in findings:
+            print(f"    [{f['severity']}] {f['file']}:{f['line']} {f['what']} - {f['reason']}")
+    print(f"\n{len(report) - incompatible}/{len(report)} apps look safe for the eventlet worker.")
+    sys.exit(1 if incompatible else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import os
+import re
+import sys
+import json
+import time
+import glob
+import bisect
+import functools
+from utils.app_registry import REGISTRY_DIR, PROJECT_ROOT
+
+DB_STATS_DIR = os.path.join(REGISTRY_DIR, "dbstats")
+QUERY_STATS_DIR = os.path.join(DB_STATS_DIR, "queries")
+SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG", os.path.join(DB_STATS_DIR, "slow_queries.jsonl"))
+FLUSH_SECONDS = float(os.getenv("DB_STATS_FLUSH_SECONDS", "10"))
+# Requests running more queries than this are printed as they finish
+DB_QUERY_WARN = int(os.getenv("DB_QUERY_WARN", "10"))
+# Statements slower than this go to the slow-query log with their call site
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+SLOW_LOG_MAX_BYTES = 5 * 1024 * 1024
+
+# Histogram bucket upper bounds in ms; the last bucket counts everything slower
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+def _empty():
+    return {"requests": 0, "queries": 0, "db_seconds": 0.0, "max_queries": 0, "max_db_seconds": 0.0}
+
+
+class EndpointStats:
+    """
+    Per-worker DB round trips and time per Flask endpoint.
+
+    Filled in from each request's counters on flask.g (see
+    db_utils.init_request_db) and written to DB_STATS_DIR/<pid>.json at most
+    every FLUSH_SECONDS, so load_endpoint_stats() can add up all workers.
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.last_flush = 0.0
+
+    def record(self, endpoint, queries, seconds):
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = _empty()
+        stats["requests"] += 1
+        stats["queries"] += queries
+        stats["db_seconds"] += seconds
+        stats["max_queries"] = max(stats["max_queries"], queries)
+        stats["max_db_seconds"] = max(stats["max_db_seconds"], seconds)
+
+        if queries > DB_QUERY_WARN:
+            print(f"⚠️ {endpoint} ran {queries} queries ({seconds * 1000:.1f} ms in MySQL)")
+        if time.monotonic() - self.last_flush > FLUSH_SECONDS:
+            self.flush()
+
+    def reset(self):
+        self.endpoints = {}
+        self.last_flush = 0.0
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        os.makedirs(DB_STATS_DIR, exist_ok=True)
+        path = os.path.join(DB_STATS_DIR, f"{os.getpid()}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.endpoints, f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"⚠️ Could not write DB stats: {e}")
+
+
+endpoint_stats = EndpointStats()
+
+
+def load_endpoint_stats():
+    """Add up every worker's file: {endpoint: stats} with per-request averages."""
+    totals = {}
+    for path in glob.glob(os.path.join(DB_STATS_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                worker = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for endpoint, stats in worker.items():
+            total = totals.setdefault(endpoint, _empty())
+            for field, value in stats.items():
+                if field.startswith("max_"):
+                    total[field] = max(total.get(field, value), value)
+                else:
+                    total[field] = total.get(field, 0) + value
+
+    for stats in totals.values():
+        requests = stats["requests"] or 1
+        stats["avg_queries"] = stats["queries"] / requests
+        stats["avg_db_ms"] = stats["db_seconds"] * 1000 / requests
+    return totals
+
+
+# --- Per-statement latency ---
+
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*%s\s*,)*\s*%s\s*\)", re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_SPACE_RE = re.compile(r"\s+")
+# Frames inside these files are the instrumentation itself, not the call site
+_INTERNAL_FILES = ("db_utils.py", "db_metrics.py", "contextlib.py")
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Statement shape: literals become ?, IN (%s, %s, ...) becomes IN (...), whitespace collapsed."""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def call_site():
+    """'routes/admin_routes.py:42 in admin_panel' for the code that issued the query."""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename.endswith(_INTERNAL_FILES):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    path = os.path.relpath(frame.f_code.co_filename, PROJECT_ROOT)
+    return f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def _empty_query():
+    return {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+            "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+
+
+class QueryStats:
+    """
+    Per-worker latency histogram for every SQL statement fingerprint.
+
+    db_utils.TimedCursor reports each execute() here. Statements slower than
+    DB_SLOW_QUERY_MS, and failed ones, are appended to SLOW_QUERY_LOG with
+    their call site. Workers write their numbers to QUERY_STATS_DIR/<pid>.json
+    at most every FLUSH_SECONDS (see load_query_stats).
+    """
+
+    def __init__(self):
+        self.queries = {}
+        self.last_flush = 0.0
+
+    def record(self, sql, seconds, error=None):
+        if isinstance(sql, bytes):
+            sql = sql.decode("utf-8", "replace")
+        key = fingerprint(sql)
+        stats = self.queries.get(key)
+        if stats is None:
+            stats = self.queries[key] = _empty_query()
+        stats["calls"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        stats["buckets"][bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+        if error is not None:
+            stats["errors"] += 1
+        if error is not None or seconds * 1000 >= DB_SLOW_QUERY_MS:
+            log_slow_query(key, seconds, call_site(), error)
+        if time.monotonic() - self.last_flush > FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        os.makedirs(QUERY_STATS_DIR, exist_ok=True)
+        path = os.path.join(QUERY_STATS_DIR, f"{os.getpid()}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.queries, f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"⚠️ Could not write query stats: {e}")
+
+
+query_stats = QueryStats()
+
+
+def log_slow_query(statement, seconds, site, error=None):
+    entry = {"at": time.time(), "ms": round(seconds * 1000, 1), "statement": statement,
+             "call_site": site, "pid": os.getpid()}
+    if error is not None:
+        entry["error"] = str(error)
+        print(f"❌ Query failed after {entry['ms']} ms at {site}: {error}")
+    else:
+        print(f"⚠️ Slow query ({entry['ms']} ms) at {site}: {statement[:120]}")
+    try:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+        if os.path.exists(SLOW_QUERY_LOG) and os.path.getsize(SLOW_QUERY_LOG) > SLOW_LOG_MAX_BYTES:
+            os.replace(SLOW_QUERY_LOG, SLOW_QUERY_LOG + ".1")
+        # One short O_APPEND write per entry, so lines from different workers don't interleave
+        with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write slow query log: {e}")
+
+
+def recent_slow_queries(limit=50):
+    """The last `limit` slow-query log entries, newest first."""
+    try:
+        with open(SLOW_QUERY_LOG, encoding="utf-8") as f:
+            lines = f.readlines()[-limit:]
+    except OSError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+def _percentile_ms(buckets, calls, fraction):
+    """Upper bound of the histogram bucket holding the given fraction of calls."""
+    target = calls * fraction
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS + (None,), buckets):
+        seen += count
+        if seen >= target:
+            return bound
+    return None
+
+
+def load_query_stats():
+    """Add up every worker's file: [{statement, calls, total_seconds, avg_ms, p50_ms, p95_ms, ...}], most total time first."""
+    totals = {}
+    for path in glob.glob(os.path.join(QUERY_STATS_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                worker = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for statement, stats in worker.items():
+            total = totals.setdefault(statement, _empty_query())
+            total["calls"] += stats.get("calls", 0)
+            total["errors"] += stats.get("errors", 0)
+            total["total_seconds"] += stats.get("total_seconds", 0.0)
+            total["max_seconds"] = max(total["max_seconds"], stats.get("max_seconds", 0.0))
+            for index, count in enumerate(stats.get("buckets", [])[:len(total["buckets"])]):
+                total["buckets"][index] += count
+
+    rows = []
+    for statement, stats in totals.items():
+        calls = stats["calls"] or 1
+        rows.append(dict(stats, statement=statement,
+                         avg_ms=stats["total_seconds"] * 1000 / calls,
+                         p50_ms=_percentile_ms(stats["buckets"], calls, 0.5),
+                         p95_ms=_percentile_ms(stats["buckets"], calls, 0.95),
+                         histogram=dict(zip([f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"],
+                                            stats["buckets"]))))
+    rows.sort(key=lambda row: row["total_seconds"], reverse=True)
+    return rows
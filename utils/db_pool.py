@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's timeout."""
+    pass
+
+
+class ConnectionPool:
+    """
+    A small, fork-safe pool of MySQL connections.
+
+    Connections are opened on demand up to `size`; callers beyond that wait up
+    to `timeout` seconds for one to be returned. A connection idle for longer
+    than `health_check_after` seconds is pinged (and reconnected) before it is
+    handed out. After a fork the child starts with an empty pool instead of
+    sharing the parent's sockets.
+    """
+
+    def __init__(self, connect, size=5, timeout=10.0, health_check_after=30.0):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.cond = threading.Condition()
+        self.idle = deque()  # (conn, returned_at)
+        self.open = 0        # idle + checked out
+        self.stats = {"checkouts": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                      "timeouts": 0, "connects": 0, "health_check_failures": 0, "discarded": 0}
+
+    def _check_fork(self):
+        if self.pid != os.getpid():
+            # Don't close the inherited connections: that would end the parent's sessions
+            self._reset()
+
+    def acquire(self):
+        self._check_fork()
+        started = time.perf_counter()
+        conn = None
+        returned_at = 0.0
+        with self.cond:
+            while True:
+                if self.idle:
+                    conn, returned_at = self.idle.pop()
+                    break
+                if self.open < self.size:
+                    self.open += 1
+                    break
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise PoolTimeout(f"no DB connection free after {self.timeout:g}s (pool size {self.size})")
+                self.cond.wait(remaining)
+
+            waited = time.perf_counter() - started
+            self.stats["checkouts"] += 1
+            if waited > 0.001:
+                self.stats["waits"] += 1
+                self.stats["wait_seconds"] += waited
+                self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+
+        try:
+            if conn is None:
+                conn = self._new_connection()
+            elif time.monotonic() - returned_at > self.health_check_after:
+                try:
+                    conn.ping(reconnect=True, attempts=1, delay=0)
+                except Exception:
+                    self.stats["health_check_failures"] += 1
+                    self._close_quietly(conn)
+                    conn = self._new_connection()
+        except Exception:
+            with self.cond:
+                self.open -= 1
+                self.cond.notify()
+            raise
+        return conn
+
+    def _new_connection(self):
+        self.stats["connects"] += 1
+        return self.connect()
+
+    def release(self, conn, discard=False):
+        if self.pid != os.getpid():
+            return  # checked out before a fork; belongs to the old pool
+        if not discard:
+            try:
+                # Never hand a half-finished transaction (or a stale snapshot) to the next user
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self.cond:
+            if discard:
+                self.open -= 1
+                self.stats["discarded"] += 1
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.cond.notify()
+        if discard:
+            self._close_quietly(conn)
+
+    def close_all(self):
+        """Close idle connections (e.g. in the gunicorn master before it forks workers)."""
+        with self.cond:
+            idle, self.idle = list(self.idle), deque()
+            self.open -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def snapshot(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats.update(size=self.size, open=self.open, idle=len(self.idle), in_use=self.open - len(self.idle), pid=self.pid)
+        return stats
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -1,176 +1,456 @@
 import mysql.connector
 import os
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from utils.db_pool import ConnectionPool, PoolTimeout
+from utils.db_metrics import endpoint_stats, query_stats
+from utils.user_cache import get_user_cache, invalidate_user_cache
 
 load_dotenv()
 
-def get_db():
+def get_db(host=None, port=None):
+    """Open a new, unpooled connection. Application code should use db_cursor()/db_connection()."""
     return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
+        host=host or os.getenv("DB_HOST"),
+        port=port or os.getenv("DB_PORT"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
+        database=os.getenv("DB_NAME"),
+        # Pure-Python protocol so eventlet workers can yield during queries
+        use_pure=os.getenv("DB_USE_PURE", "1" if os.getenv("GUNICORN_WORKER_CLASS") == "eventlet" else "0") == "1"
     )
 
+# Optional read replicas, e.g. DB_REPLICA_HOSTS=10.0.0.2:3306,10.0.0.3:3306
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()]
+# After a session writes, its reads stay on the primary this long (covers replication lag)
+DB_REPLICA_LAG_SECONDS = float(os.getenv("DB_REPLICA_LAG_SECONDS", "5"))
+# A replica that failed is skipped for this long
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+
+def _new_pool(connect):
+    return ConnectionPool(
+        connect,
+        size=int(os.getenv("DB_POOL_SIZE", "5")),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        health_check_after=float(os.getenv("DB_POOL_HEALTH_CHECK_SECONDS", "30")),
+    )
+
+_pool = None
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = _new_pool(get_db)
+    return _pool
+
+class Replica:
+    """One read replica: its own connection pool plus a back-off after failures."""
+
+    def __init__(self, address):
+        host, _, port = address.partition(":")
+        self.address = address
+        self.host = host
+        self.port = port or os.getenv("DB_PORT")
+        self.down_until = 0.0
+        self.failures = 0
+        self.pool = _new_pool(self.connect)
+
+    def connect(self):
+        conn = get_db(self.host, self.port)
+        cursor = conn.cursor()
+        # A helper wrongly routed here fails loudly instead of writing to a replica
+        cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        cursor.close()
+        return conn
+
+    def mark_down(self, err):
+        self.failures += 1
+        self.down_until = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+        print(f"⚠️ Read replica {self.address} failed ({err}); using the primary for {DB_REPLICA_RETRY_SECONDS:g}s")
+
+_replicas = None
+_next_replica = 0
+
+def get_replicas():
+    global _replicas
+    if _replicas is None:
+        _replicas = [Replica(address) for address in DB_REPLICA_HOSTS]
+    return _replicas
+
+def _wrote_recently():
+    """Read-your-writes: this request, or this session within DB_REPLICA_LAG_SECONDS, committed a write."""
+    if not has_request_context():
+        return False
+    return g.get("_db_wrote", False) or time.time() - session.get("db_wrote_at", 0) < DB_REPLICA_LAG_SECONDS
+
+def _mark_write():
+    if DB_REPLICA_HOSTS and has_request_context():
+        g._db_wrote = True
+        session["db_wrote_at"] = time.time()
+
+def _pick_replica():
+    """A healthy replica (round robin), or None to read from the primary."""
+    global _next_replica
+    replicas = get_replicas()
+    if not replicas or _wrote_recently():
+        return None
+    now = time.monotonic()
+    for _ in range(len(replicas)):
+        replica = replicas[_next_replica % len(replicas)]
+        _next_replica += 1
+        if replica.down_until <= now:
+            return replica
+    return None
+
+def pool_stats():
+    """Checkout counts, wait times and open/idle connections of this worker's pools."""
+    stats = get_pool().snapshot()
+    if DB_REPLICA_HOSTS:
+        stats["replicas"] = [dict(replica.pool.snapshot(), address=replica.address, failures=replica.failures,
+                                  down=replica.down_until > time.monotonic())
+                             for replica in get_replicas()]
+    return stats
+
+def close_pool():
+    """Close idle pooled connections, e.g. in the gunicorn master before it forks."""
+    if _pool is not None:
+        _pool.close_all()
+    for replica in _replicas or []:
+        replica.pool.close_all()
+
+_BROKEN_ERRORS = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+
+def _request_scoped():
+    return has_app_context() and "request_db" in current_app.extensions
+
+def _checkout(read_only):
+    """(pool, conn, replica or None): a replica connection for reads when one is usable, else the primary."""
+    replica = _pick_replica() if read_only else None
+    if replica is not None:
+        try:
+            return replica.pool, replica.pool.acquire(), replica
+        except (mysql.connector.Error, PoolTimeout) as err:
+            replica.mark_down(err)
+    pool = get_pool()
+    return pool, pool.acquire(), None
+
+@contextmanager
+def db_connection(read_only=False):
+    """
+    Borrow a pooled connection; uncommitted work is rolled back when it is returned.
+
+    Inside a request the connection is checked out once, kept on flask.g and
+    shared by every helper until the request ends (see init_request_db).
+    read_only=True may be served by a read replica (DB_REPLICA_HOSTS), except
+    right after the session wrote something.
+    """
+    if _request_scoped():
+        scoped = None
+        if read_only and DB_REPLICA_HOSTS and not _wrote_recently():
+            if "_db_replica" not in g:
+                # Decided once per request; None means this request reads from the primary
+                g._db_replica = None
+                replica = _pick_replica()
+                if replica is not None:
+                    try:
+                        g._db_replica = (replica, replica.pool.acquire())
+                    except (mysql.connector.Error, PoolTimeout) as err:
+                        replica.mark_down(err)
+            scoped = g._db_replica
+        if scoped is not None:
+            replica, conn = scoped
+            try:
+                yield conn
+            except _BROKEN_ERRORS as err:
+                g._db_replica_broken = True
+                replica.mark_down(err)
+                raise
+            return
+
+        conn = g.get("_db_conn")
+        if conn is None:
+            conn = g._db_conn = get_pool().acquire()
+        try:
+            yield conn
+        except _BROKEN_ERRORS:
+            g._db_broken = True
+            raise
+        return
+
+    pool, conn, replica = _checkout(read_only)
+    broken = False
+    try:
+        yield conn
+    except _BROKEN_ERRORS as err:
+        broken = True
+        if replica is not None:
+            replica.mark_down(err)
+        raise
+    finally:
+        pool.release(conn, discard=broken)
+
+class TimedCursor:
+    """
+    Cursor proxy that adds each query's round trip to the request's counters
+    on flask.g and to the per-statement latency histogram (db_metrics.query_stats).
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, method, sql, *args, **kwargs):
+        started = time.perf_counter()
+        error = None
+        try:
+            return method(sql, *args, **kwargs)
+        except mysql.connector.Error as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            query_stats.record(sql, elapsed, error)
+            if has_app_context():
+                g.db_queries = g.get("db_queries", 0) + 1
+                g.db_seconds = g.get("db_seconds", 0.0) + elapsed
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self._cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self._cursor.executemany, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+@contextmanager
+def db_cursor(dictionary=False, commit=False, read_only=False):
+    """
+    Pooled cursor for one unit of work:
+
+        with db_cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT ...")
+
+    With commit=True the transaction is committed when the block exits cleanly
+    and rolled back when it raises, so a half-done unit never reaches the next
+    commit on the shared request connection (whatever earlier units left
+    uncommitted on it is rolled back too). read_only=True lets the query go to
+    a read replica; use it only for reads that may be a few seconds stale for
+    other sessions.
+    """
+    with db_connection(read_only=read_only and not commit) as conn:
+        # Buffered, so a half-read result never blocks the next query on the shared request connection
+        cursor = conn.cursor(dictionary=dictionary, buffered=True)
+        try:
+            yield TimedCursor(cursor)
+            if commit:
+                conn.commit()
+                _mark_write()
+        except BaseException:
+            if commit:
+                try:
+                    conn.rollback()
+                except mysql.connector.Error:
+                    pass  # a broken connection is discarded by db_connection anyway
+            raise
+        finally:
+            cursor.close()
+
+def release_request_db():
+    """Give the request's connections back early, e.g. before a long venv build; later queries check out new ones."""
+    conn = g.pop("_db_conn", None)
+    if conn is not None:
+        # Anything not committed by a helper is rolled back on release
+        get_pool().release(conn, discard=g.pop("_db_broken", False))
+    scoped = g.pop("_db_replica", None)
+    if scoped is not None:
+        replica, conn = scoped
+        replica.pool.release(conn, discard=g.pop("_db_replica_broken", False))
+
+def init_request_db(app):
+    """Return the request's connection to the pool at teardown and record its DB round trips per endpoint."""
+    app.extensions["request_db"] = True
+
+    @app.after_request
+    def add_db_timing(response):
+        queries = g.get("db_queries", 0)
+        if queries:
+            # Visible in the browser's network panel
+            response.headers.add("Server-Timing", f'db;dur={g.db_seconds * 1000:.1f};desc="{queries} queries"')
+        return response
+
+    @app.teardown_request
+    def record_request_db(exc):
+        queries = g.pop("db_queries", 0)
+        seconds = g.pop("db_seconds", 0.0)
+        if queries and request.endpoint:
+            endpoint_stats.record(request.endpoint, queries, seconds)
+
+    @app.teardown_appcontext
+    def end_request_db(exc):
+        release_request_db()
+
+@contextmanager
+def _fresh_connection():
+    """
+    A primary connection without an open transaction snapshot: the request's
+    own while it has none, else a separate pooled one. Under REPEATABLE READ a
+    request that already read something keeps seeing the data as of then.
+    """
+    if _request_scoped():
+        conn = g.get("_db_conn")
+        if conn is None or not conn.in_transaction:
+            with db_connection() as conn:
+                yield conn
+            return
+    pool = get_pool()
+    conn = pool.acquire()
+    broken = False
+    try:
+        yield conn
+    except _BROKEN_ERRORS:
+        broken = True
+        raise
+    finally:
+        pool.release(conn, discard=broken)
+
+def _fetch_client_row(query, google_id):
+    # Feeds the user cache, so it must not come from a snapshot taken before another worker's write
+    with _fresh_connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        try:
+            timed = TimedCursor(cursor)
+            timed.execute(query, (google_id,))
+            return timed.fetchone()
+        finally:
+            cursor.close()
+
 def get_user_id(google_id):
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id FROM clients WHERE google_id = %s", (google_id,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    # Cached per worker for USER_CACHE_TTL; writers call invalidate_user_cache()
+    result = get_user_cache().get(("id", google_id), lambda: _fetch_client_row(
+        "SELECT id FROM clients WHERE google_id = %s", google_id))
     return result["id"] if result else None
 
 def get_user_plan(google_id):
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT plan FROM clients WHERE google_id = %s", (google_id,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    result = get_user_cache().get(("plan", google_id), lambda: _fetch_client_row(
+        "SELECT plan FROM clients WHERE google_id = %s", google_id))
     return result["plan"] if result else "free"
 
 def get_all_users():
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, google_id FROM clients")
-    result = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return result
+    with db_cursor(dictionary=True, read_only=True) as cursor:
+        cursor.execute("SELECT id, google_id FROM clients")
+        return cursor.fetchall()
 
 def get_latest_upgrade_request(user_id):
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT requested_plan, status, created_at 
-        FROM upgrade_requests 
-        WHERE user_id = %s 
-        ORDER BY created_at DESC LIMIT 1
-    """, (user_id,))
-    request = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return request
+    with db_cursor(dictionary=True, read_only=True) as cursor:
+        cursor.execute("""
+            SELECT requested_plan, status, created_at 
+            FROM upgrade_requests 
+            WHERE user_id = %s 
+            ORDER BY created_at DESC LIMIT 1
+        """, (user_id,))
+        return cursor.fetchone()
 
 def save_bot_to_db(button_name, folder_name, image_url):
     from utils.upload_utils import get_user_paths
     from flask import session
-    conn = get_db()
-    cursor = conn.cursor()
     google_id = session.get("google_id")
     user_id = get_user_id(google_id)
-    cursor.execute(
-        "INSERT INTO bots (user_id, button_name, folder_name, image_url) VALUES (%s, %s, %s, %s)",
-        (user_id, button_name, folder_name, image_url)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        cursor.execute(
+            "INSERT INTO bots (user_id, button_name, folder_name, image_url) VALUES (%s, %s, %s, %s)",
+            (user_id, button_name, folder_name, image_url)
+        )
+        # clients.bot_count moves in the same transaction as the bots row (see utils/migrations.py)
+        cursor.execute("UPDATE clients SET bot_count = bot_count + 1 WHERE id = %s", (user_id,))
 
 def update_button_metadata(google_id, folder_name, new_button_name):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE bots SET button_name = %s WHERE folder_name = %s AND user_id = (SELECT id FROM clients WHERE google_id = %s)",
-        (new_button_name, folder_name, google_id)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        cursor.execute(
+            "UPDATE bots SET button_name = %s WHERE folder_name = %s AND user_id = (SELECT id FROM clients WHERE google_id = %s)",
+            (new_button_name, folder_name, google_id)
+        )
 
 def update_user_plan(google_id, plan_name):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE clients SET plan = %s WHERE google_id = %s", (plan_name, google_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("UPDATE clients SET plan = %s WHERE google_id = %s", (plan_name, google_id))
+    invalidate_user_cache()
 
 def get_user_apps(user_id):
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    # Ensure user_id is passed correctly as a tuple even if it's a single value
-    cursor.execute("SELECT * FROM bots WHERE user_id=%s ORDER BY id DESC", (user_id,))
-    apps = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return apps
+    with db_cursor(dictionary=True, read_only=True) as cursor:
+        # Ensure user_id is passed correctly as a tuple even if it's a single value
+        cursor.execute("SELECT * FROM bots WHERE user_id=%s ORDER BY id DESC", (user_id,))
+        return cursor.fetchall()
+
+def get_bot_count(user_id):
+    """Number of apps the user has, from the maintained clients.bot_count (no scan of bots)."""
+    with db_cursor() as cursor:
+        cursor.execute("SELECT bot_count FROM clients WHERE id = %s", (user_id,))
+        result = cursor.fetchone()
+    return result[0] if result else 0
 
 # Add this new function
 def get_app_by_name(user_id, button_name):
     """Checks if an app with the given button_name exists for the user."""
-    conn = None
-    cursor = None
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT id FROM bots WHERE user_id = %s AND button_name = %s",
-            (user_id, button_name)
-        )
-        app = cursor.fetchone()
-        return app # Returns the app dict if found, None otherwise
+        with db_cursor(dictionary=True) as cursor:
+            cursor.execute(
+                "SELECT id FROM bots WHERE user_id = %s AND button_name = %s",
+                (user_id, button_name)
+            )
+            app = cursor.fetchone()
+            return app # Returns the app dict if found, None otherwise
     except mysql.connector.Error as err:
         print(f"❌ Database error checking app name '{button_name}' for user {user_id}: {err}")
         return None # Return None on error to prevent upload
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
 def save_uploaded_app(user_id, google_id, button_name, folder_name, image_url):
-    conn = get_db()
-    cursor = conn.cursor()
-    # Check if google_id needs to be inserted or if user_id is sufficient
-    # Assuming 'google_id' column exists in 'bots' table based on previous code context
-    cursor.execute(
-        "INSERT INTO bots (user_id, google_id, button_name, folder_name, image_url) VALUES (%s, %s, %s, %s, %s)",
-        (user_id, google_id, button_name, folder_name, image_url)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        # Check if google_id needs to be inserted or if user_id is sufficient
+        # Assuming 'google_id' column exists in 'bots' table based on previous code context
+        cursor.execute(
+            "INSERT INTO bots (user_id, google_id, button_name, folder_name, image_url) VALUES (%s, %s, %s, %s, %s)",
+            (user_id, google_id, button_name, folder_name, image_url)
+        )
+        cursor.execute("UPDATE clients SET bot_count = bot_count + 1 WHERE id = %s", (user_id,))
 
 def delete_app_from_db(user_id, folder_name):
     """Deletes an app record from the database for a specific user."""
-    conn = None
-    cursor = None
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        # Ensure deletion is specific to the user and folder name
-        cursor.execute(
-            "DELETE FROM bots WHERE user_id = %s AND folder_name = %s",
-            (user_id, folder_name)
-        )
-        conn.commit()
-        # Check if any row was actually deleted
-        return cursor.rowcount > 0
+        # db_cursor rolls back if either statement fails, so bots and bot_count stay in step
+        with db_cursor(commit=True) as cursor:
+            # Ensure deletion is specific to the user and folder name
+            cursor.execute(
+                "DELETE FROM bots WHERE user_id = %s AND folder_name = %s",
+                (user_id, folder_name)
+            )
+            # Check if any row was actually deleted
+            deleted = cursor.rowcount
+            if deleted:
+                cursor.execute("UPDATE clients SET bot_count = GREATEST(bot_count - %s, 0) WHERE id = %s",
+                               (deleted, user_id))
+        return deleted > 0
     except mysql.connector.Error as err:
         print(f"❌ Database error deleting app {folder_name} for user {user_id}: {err}")
-        if conn:
-            conn.rollback() # Rollback in case of error
         return False
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
+# App limit of each plan; also the list of plans an admin may assign
+PLAN_LIMITS = {
+    "free": 2,
+    "silver": 10,
+    "gold": float('inf')  # Infinite
+}
+
 # Helper function to get app limit based on plan
 def get_plan_limit(plan):
     """Returns the app limit for a given plan."""
-    plan_limits = {
-        "free": 2,
-        "silver": 10,
-        "gold": float('inf')  # Infinite
-    }
     # Return the limit for the plan (case-insensitive), default to 2 if plan is unknown
-    return plan_limits.get(str(plan).lower(), 2)
+    return PLAN_LIMITS.get(str(plan).lower(), 2)
 
 
@@ -1,3 +1,4 @@
+from flask import Flask
 from flask_mail import Mail, Message
 import os
 
@@ -13,7 +14,7 @@ def init_mail(app):
     )
     mail.init_app(app)
 
-def send_upgrade_confirmation(email, name, plan):
+def upgrade_confirmation_message(email, name, plan):
     msg = Message(
         subject="✅ Your Plan Has Been Upgraded!",
         sender=os.getenv("MAIL_USERNAME"),
@@ -33,7 +34,31 @@ You can now upload more apps at:
 Thanks for being with us!
 - Team Online2Study
 """
-    mail.send(msg)
+    return msg
+
+def send_upgrade_confirmation(email, name, plan):
+    mail.send(upgrade_confirmation_message(email, name, plan))
+
+def send_upgrade_confirmations(job, recipients):
+    """
+    Background job (utils.jobs.submit_job) for bulk approvals: send every
+    [email, name, plan] over one SMTP connection. Runs outside any request,
+    so it sets up its own mail app from the MAIL_* settings.
+    """
+    mail_app = Flask(__name__)
+    init_mail(mail_app)
+    sent, failed = 0, []
+    with mail_app.app_context():
+        with mail.connect() as connection:
+            for index, (email, name, plan) in enumerate(recipients, 1):
+                try:
+                    connection.send(upgrade_confirmation_message(email, name, plan))
+                    sent += 1
+                except Exception as e:
+                    print(f"❌ Could not send upgrade confirmation to {email}: {e}")
+                    failed.append(email)
+                job.progress(f"Sent {sent} of {len(recipients)} emails", int(index * 100 / len(recipients)))
+    return {"sent": sent, "failed": failed}
 
 def plan_limit_display(plan):
     limits = {"free": 2, "silver": 10, "gold": "Unlimited"}
@@ -0,0 +1,31 @@
+import os
+import mmap
+import struct
+
+
+class SharedGeneration:
+    """
+    A 64-bit counter kept in an 8-byte mmap'd file and shared by every worker.
+
+    Reading it is a plain memory access (no syscall), so it is cheap enough to
+    check on every request. Callers serialise bump() with a file_lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+            self._map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    def get(self):
+        return struct.unpack_from("<Q", self._map, 0)[0]
+
+    def bump(self):
+        value = self.get() + 1
+        struct.pack_into("<Q", self._map, 0, value)
+        return value
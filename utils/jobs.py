@@ -0,0 +1,207 @@
+"""
+Background jobs for long-running bot work.
+
+A hosted bot hands slow work (scraping, downloads, building Excel/zip files)
+to a bounded pool instead of doing it inside the request:
+
+    from utils.jobs import submit_job, job_urls
+
+    def build_export(job, test_id):
+        job.progress("Scraping questions...", 10)
+        ...
+        path = os.path.join(job.artifact_dir, "export.zip")
+        ...
+        return "export.zip"          # name(s) of files written to artifact_dir
+
+    @app.route("/scrape", methods=["POST"])
+    def scrape():
+        job_id = submit_job(build_export, request.form["test_id"])
+        return jsonify(job_urls(job_id)), 202
+
+Job state is kept in JOBS_DIR/<job_id>/status.json, with job.log() lines in
+log.txt next to it, so any gunicorn worker can answer status and log polls,
+event streams and artifact downloads (routes/job_routes.py).
+The default thread pool needs no broker; JOB_EXECUTOR=process runs jobs in
+a process pool instead (the function must then be importable by module path).
+
+Only in-process apps can submit jobs: under APP_HOSTING=subprocess a bot runs
+in its own venv's python (utils/app_host.py), which cannot import utils.jobs.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(PROJECT_ROOT, "jobs"))
+JOB_EXECUTOR = os.getenv("JOB_EXECUTOR", "thread")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "20"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobQueueFull(Exception):
+    """Raised by submit_job when this worker already has JOB_MAX_PENDING jobs queued or running (or a JobQueue its max_pending)."""
+    pass
+
+
+def job_dir(job_id):
+    if not JOB_ID_RE.match(job_id or ""):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def read_status(job_id):
+    """Return the job's status dict, or None if there is no such job."""
+    try:
+        with open(os.path.join(job_dir(job_id), "status.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def log_path(job_id):
+    return os.path.join(job_dir(job_id), "log.txt")
+
+
+def write_status(job_id, **changes):
+    path = os.path.join(job_dir(job_id), "status.json")
+    status = read_status(job_id) or {}
+    status.update(changes)
+    with open(path + ".tmp", "w") as f:
+        json.dump(status, f)
+    os.replace(path + ".tmp", path)
+    return status
+
+
+class JobContext:
+    """Handed to the job function as its first argument (picklable, so it works with either pool)."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.artifact_dir = os.path.join(job_dir(job_id), "artifacts")
+        self.log_path = log_path(job_id)
+
+    def progress(self, message, percent=None):
+        write_status(self.job_id, progress=message, percent=percent)
+        self.log(f"==> {message}")
+
+    def log(self, line):
+        """Append a line to the job's log (streamed by /jobs/<job_id>/events)."""
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(line.rstrip("\n") + "\n")
+
+
+def _run(job_id, fn, args, kwargs):
+    job = JobContext(job_id)
+    write_status(job_id, status="running", started_at=time.time())
+    try:
+        result = fn(job, *args, **kwargs)
+    except Exception as e:
+        print(f"❌ Job {job_id} failed: {e}")
+        job.log(f"Failed: {e}")
+        write_status(job_id, status="failed", finished_at=time.time(), error=str(e),
+                     traceback=traceback.format_exc())
+        return
+
+    artifacts = sorted(os.listdir(job.artifact_dir)) if os.path.isdir(job.artifact_dir) else []
+    if isinstance(result, str) and result in artifacts:
+        result = {"artifact": result}
+    try:
+        json.dumps(result)
+    except TypeError:
+        result = repr(result)
+    write_status(job_id, status="done", finished_at=time.time(), percent=100, result=result, artifacts=artifacts)
+
+
+class JobQueue:
+    """
+    A bounded pool of job workers. submit_job() uses the default one; other
+    kinds of work (e.g. app builds, utils/app_builder.py) get their own so
+    they can't starve it. Job state is shared: every queue writes to JOBS_DIR.
+    """
+
+    def __init__(self, workers, max_pending, kind="thread", name="job"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self.name = name
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    def get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            # Pools don't survive a fork; each worker builds its own
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            self._executor_pid = os.getpid()
+            self._pending = 0
+        return self._executor
+
+    def _job_finished(self, _future):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args, owner=None, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return its job id. Raises JobQueueFull when the pool is saturated."""
+        executor = self.get_executor()
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} {self.name}s already pending, try again later")
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(job_dir(job_id), "artifacts"), exist_ok=True)
+        write_status(job_id, id=job_id, status="queued", owner=owner, created_at=time.time(),
+                     name=getattr(fn, "__name__", str(fn)), progress=None, percent=0)
+        try:
+            future = executor.submit(_run, job_id, fn, args, kwargs)
+        except Exception:
+            with self._pending_lock:
+                self._pending -= 1
+            write_status(job_id, status="failed", error="could not be queued")
+            raise
+        future.add_done_callback(self._job_finished)
+
+        prune_old_jobs()
+        return job_id
+
+
+default_queue = JobQueue(JOB_WORKERS, JOB_MAX_PENDING, JOB_EXECUTOR)
+
+
+def submit_job(fn, *args, owner=None, **kwargs):
+    """Queue fn(job, *args, **kwargs) on the default pool and return its job id. Raises JobQueueFull when it is saturated."""
+    return default_queue.submit(fn, *args, owner=owner, **kwargs)
+
+
+def job_urls(job_id):
+    """Platform URLs for polling a job and downloading its artifacts (outside the bot's /u/ mount)."""
+    return {"job_id": job_id, "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events",
+            "log_url": f"/jobs/{job_id}/log", "artifacts_url": f"/jobs/{job_id}/artifacts/"}
+
+
+_last_prune = 0.0
+
+def prune_old_jobs():
+    """Delete finished jobs older than JOB_RETENTION_HOURS (at most once a minute)."""
+    global _last_prune
+    if time.monotonic() - _last_prune < 60 or not os.path.isdir(JOBS_DIR):
+        return
+    _last_prune = time.monotonic()
+    cutoff = time.time() - JOB_RETENTION_HOURS * 3600
+    for job_id in os.listdir(JOBS_DIR):
+        status = read_status(job_id) if JOB_ID_RE.match(job_id) else None
+        if status and status.get("status") in ("done", "failed") and (status.get("finished_at") or 0) < cutoff:
+            shutil.rmtree(os.path.join(JOBS_DIR, job_id), ignore_errors=True)
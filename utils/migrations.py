@@ -0,0 +1,237 @@
+"""
+Versioned schema migrations for the platform database.
+
+    python -m utils.migrations            # apply pending migrations
+    python -m utils.migrations --status   # list applied / pending
+
+Applied versions are recorded in `schema_migrations`. Migrations only add
+(tables, columns, indexes) and check before they do, so they can be run
+against a database that was created by hand before this module existed.
+The one exception is m002, which merges duplicate clients rows (same
+google_id, from the old login race) before adding its unique index.
+The app applies them when it starts (DB_AUTO_MIGRATE=1, the default) and
+refuses to start on a schema that is still missing any of them.
+"""
+import os
+import sys
+import mysql.connector
+from utils.db_utils import get_db
+from utils.file_lock import file_lock
+from utils.app_registry import REGISTRY_DIR
+
+
+def _table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return cursor.fetchone()[0] > 0
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def index_exists(cursor, table, name):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, name))
+    return cursor.fetchone()[0] > 0
+
+
+def _add_index(cursor, table, name, columns, unique=False):
+    if index_exists(cursor, table, name):
+        return
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cursor.execute(f"ALTER TABLE `{table}` ADD {kind} `{name}` ({', '.join(columns)})")
+    print(f"✅ Added index {table}.{name} ({', '.join(columns)})")
+
+
+def _merge_duplicate_clients(cursor):
+    """
+    Fold clients rows sharing a google_id into the oldest one: their bots and
+    upgrade requests move to it, then the extra rows are deleted.
+    """
+    cursor.execute("SELECT google_id, MIN(id) FROM clients GROUP BY google_id HAVING COUNT(*) > 1")
+    for google_id, keep_id in cursor.fetchall():
+        cursor.execute("SELECT id FROM clients WHERE google_id = %s AND id <> %s", (google_id, keep_id))
+        extra_ids = [row[0] for row in cursor.fetchall()]
+        placeholders = ", ".join(["%s"] * len(extra_ids))
+        cursor.execute(f"UPDATE bots SET user_id = %s WHERE user_id IN ({placeholders})", [keep_id, *extra_ids])
+        cursor.execute(f"UPDATE upgrade_requests SET user_id = %s WHERE user_id IN ({placeholders})",
+                       [keep_id, *extra_ids])
+        cursor.execute(f"DELETE FROM clients WHERE id IN ({placeholders})", extra_ids)
+        if _column_exists(cursor, "clients", "bot_count"):
+            cursor.execute("UPDATE clients SET bot_count = (SELECT COUNT(*) FROM bots WHERE user_id = %s) WHERE id = %s",
+                           (keep_id, keep_id))
+        print(f"♻️ Merged duplicate clients {extra_ids} into {keep_id} (google_id {google_id})")
+
+
+def m001_base_tables(cursor):
+    """The tables the app has always used, for fresh installs."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS clients (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            google_id VARCHAR(64) NOT NULL,
+            email VARCHAR(255),
+            name VARCHAR(255),
+            plan VARCHAR(32) DEFAULT 'free',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bots (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            google_id VARCHAR(64),
+            button_name VARCHAR(255) NOT NULL,
+            folder_name VARCHAR(255) NOT NULL,
+            image_url VARCHAR(512),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upgrade_requests (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(255),
+            email VARCHAR(255),
+            current_plan VARCHAR(32),
+            requested_plan VARCHAR(32),
+            message TEXT,
+            status VARCHAR(16) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def m002_lookup_indexes(cursor):
+    """Indexes for the per-request lookups (login, plan, app list, name check, latest upgrade request)."""
+    _merge_duplicate_clients(cursor)
+    _add_index(cursor, "clients", "uq_clients_google_id", ["google_id"], unique=True)
+    _add_index(cursor, "clients", "idx_clients_created", ["created_at", "id"])
+    _add_index(cursor, "bots", "idx_bots_user_button", ["user_id", "button_name"])
+    _add_index(cursor, "bots", "idx_bots_user_folder", ["user_id", "folder_name"])
+    _add_index(cursor, "upgrade_requests", "idx_upgrade_user_created", ["user_id", "created_at"])
+    _add_index(cursor, "upgrade_requests", "idx_upgrade_created", ["created_at", "id"])
+
+
+def m003_client_bot_count(cursor):
+    """Denormalised clients.bot_count, kept up to date by the bot insert/delete helpers in db_utils."""
+    if not _column_exists(cursor, "clients", "bot_count"):
+        cursor.execute("ALTER TABLE clients ADD COLUMN bot_count INT NOT NULL DEFAULT 0")
+    cursor.execute("""
+        UPDATE clients c
+        LEFT JOIN (SELECT user_id, COUNT(*) AS n FROM bots GROUP BY user_id) b ON b.user_id = c.id
+        SET c.bot_count = COALESCE(b.n, 0)
+    """)
+
+
+def m004_admin_filter_indexes(cursor):
+    """(filter, created_at, id) indexes for the keyset-paginated admin views (utils/pagination.py)."""
+    _add_index(cursor, "clients", "idx_clients_plan_created", ["plan", "created_at", "id"])
+    _add_index(cursor, "upgrade_requests", "idx_upgrade_status_created", ["status", "created_at", "id"])
+
+
+# (version, function) in the order they must be applied; never renumber or edit an applied one
+MIGRATIONS = [
+    (1, m001_base_tables),
+    (2, m002_lookup_indexes),
+    (3, m003_client_bot_count),
+    (4, m004_admin_filter_indexes),
+]
+
+
+def applied_versions(cursor):
+    if not _table_exists(cursor, "schema_migrations"):
+        return set()
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate():
+    """Apply pending migrations in order; return the versions applied. Safe to call from several workers."""
+    applied = []
+    # One process migrates at a time; the others then find nothing pending
+    with file_lock(os.path.join(REGISTRY_DIR, "migrations.lock")):
+        conn = get_db()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            done = applied_versions(cursor)
+            for version, migration in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"ℹ️ Applying migration {version}: {migration.__name__}")
+                # DDL commits implicitly in MySQL, so each step is written to be re-runnable
+                migration(cursor)
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                               (version, migration.__name__))
+                conn.commit()
+                applied.append(version)
+        except mysql.connector.Error as err:
+            conn.rollback()
+            print(f"❌ Migration failed: {err}")
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    if applied:
+        print(f"✅ Applied migrations: {applied}")
+    return applied
+
+
+def pending_versions():
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+        conn.close()
+    return [version for version, _ in MIGRATIONS if version not in done]
+
+
+def ensure_schema(auto_migrate=True):
+    """
+    Called at startup: apply pending migrations (or, without auto_migrate,
+    only look for them) and raise RuntimeError unless every one is applied.
+    The code relies on all of them (e.g. clients.bot_count, the unique google_id).
+    """
+    if auto_migrate:
+        migrate()
+    pending = pending_versions()
+    if pending:
+        raise RuntimeError(f"database schema is missing migrations {pending}; run: python -m utils.migrations")
+
+
+def main():
+    if "--status" in sys.argv:
+        conn = get_db()
+        cursor = conn.cursor()
+        try:
+            done = applied_versions(cursor)
+        finally:
+            cursor.close()
+            conn.close()
+        for version, migration in MIGRATIONS:
+            print(f"{'✅' if version in done else '⏳'} {version:03d} {migration.__name__}")
+        return
+    if not migrate():
+        print("✅ Database schema is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+class MountRouter:
+    """
+    Router for the fixed /u/<user_id>/<folder> mount scheme.
+
+    Mounts live in a two-level segment trie ({user_id: {folder: value}}), so a
+    lookup is one bounded str.split() and two dict lookups no matter how many
+    users or apps are mounted, and the path is never re-joined segment by
+    segment the way DispatcherMiddleware's rsplit() loop does.
+    """
+
+    def __init__(self):
+        self.users = {}
+
+    def __len__(self):
+        return sum(len(folders) for folders in self.users.values())
+
+    def add(self, user_id, folder, value):
+        self.users.setdefault(str(user_id), {})[folder] = value
+
+    def remove(self, user_id, folder):
+        folders = self.users.get(str(user_id))
+        if folders is None:
+            return None
+        value = folders.pop(folder, None)
+        if not folders:
+            del self.users[str(user_id)]
+        return value
+
+    def clear(self):
+        self.users = {}
+
+    def match(self, path):
+        """Return (value, end) where path[:end] is the mount prefix, or (None, 0) if nothing is mounted there."""
+        # One C-level split; the segments after the folder are never touched.
+        parts = path.split("/", 4)
+        if len(parts) < 4 or parts[1] != "u":
+            return None, 0
+
+        folders = self.users.get(parts[2])
+        if folders is None:
+            return None, 0
+        value = folders.get(parts[3])
+        if value is None:
+            return None, 0
+        return value, len(parts[2]) + len(parts[3]) + 4
+
+
+def split_mount_path(mount_path):
+    """'/u/<user_id>/<folder>' -> (user_id, folder)."""
+    _, _, user_id, folder = mount_path.split("/", 3)
+    return user_id, folder
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import hashlib
+import requests
+from utils.file_lock import file_lock
+from utils.app_registry import REGISTRY_DIR
+
+OIDC_CACHE_DIR = os.path.join(REGISTRY_DIR, "oidc")
+OIDC_METADATA_TTL = float(os.getenv("OIDC_METADATA_TTL", "86400"))
+OIDC_FETCH_TIMEOUT = float(os.getenv("OIDC_FETCH_TIMEOUT", "5"))
+
+
+def _cache_path(metadata_url):
+    name = hashlib.sha1(metadata_url.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(OIDC_CACHE_DIR, f"{name}.json")
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _fresh(metadata, ttl):
+    return metadata is not None and time.time() - metadata.get("_loaded_at", 0) < ttl
+
+
+def _fetch(metadata_url):
+    resp = requests.get(metadata_url, timeout=OIDC_FETCH_TIMEOUT)
+    resp.raise_for_status()
+    metadata = resp.json()
+    if metadata.get("jwks_uri"):
+        resp = requests.get(metadata["jwks_uri"], timeout=OIDC_FETCH_TIMEOUT)
+        resp.raise_for_status()
+        metadata["jwks"] = resp.json()
+    metadata["_loaded_at"] = time.time()
+    return metadata
+
+
+def load_provider_metadata(metadata_url, ttl=OIDC_METADATA_TTL, fetch=True):
+    """
+    OpenID provider metadata plus its JWKS ("jwks"), cached on disk for `ttl` seconds.
+
+    The result carries authlib's "_loaded_at" marker, so a client registered
+    with it never fetches server_metadata_url or jwks_uri itself; a restarted
+    worker reads one small file instead of making two HTTPS round trips on its
+    first login. Only one process refreshes an expired file; if the provider
+    is unreachable a stale copy is used, and with no copy at all {} is
+    returned and authlib falls back to fetching on first use. With
+    fetch=False only the disk copy (fresh or not) is used, never the network.
+    """
+    path = _cache_path(metadata_url)
+    metadata = _read(path)
+    if _fresh(metadata, ttl) or not fetch:
+        return metadata or {}
+
+    os.makedirs(OIDC_CACHE_DIR, exist_ok=True)
+    with file_lock(path + ".lock"):
+        # Another worker may have refreshed it while we waited for the lock
+        metadata = _read(path)
+        if _fresh(metadata, ttl):
+            return metadata
+        try:
+            fetched = _fetch(metadata_url)
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ Could not refresh OpenID metadata from {metadata_url}: {e}")
+            return metadata or {}
+        with open(path + ".tmp", "w") as f:
+            json.dump(fetched, f)
+        os.replace(path + ".tmp", path)
+        print(f"✅ Cached OpenID metadata and JWKS from {metadata_url}")
+        return fetched
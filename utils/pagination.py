@@ -0,0 +1,93 @@
+import json
+import base64
+from datetime import datetime, timedelta
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row):
+    """Opaque 'next page' token for the last row of a page ordered by (created_at, id)."""
+    created_at = row["created_at"]
+    raw = json.dumps([created_at.isoformat() if created_at is not None else None, row["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    """(created_at or None, id) from encode_cursor(); raises ValueError for a malformed token."""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return (datetime.fromisoformat(created_at) if created_at is not None else None), int(row_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid page cursor: {e}")
+
+
+def parse_date(value):
+    """'YYYY-MM-DD' -> datetime, '' -> None; raises ValueError otherwise."""
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+
+def page_request(args):
+    """Read ?limit=, ?sort=newest|oldest, ?after=, ?from=, ?to= from request.args; raises ValueError."""
+    limit = min(max(int(args.get("limit") or PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    sort = args.get("sort", "newest")
+    if sort not in ("newest", "oldest"):
+        raise ValueError("sort must be 'newest' or 'oldest'")
+    after = decode_cursor(args["after"]) if args.get("after") else None
+    return {"limit": limit, "sort": sort, "after": after,
+            "date_from": parse_date(args.get("from", "")), "date_to": parse_date(args.get("to", ""))}
+
+
+def fetch_page(cursor, select_from, filters, params, page):
+    """
+    Run one keyset page of `select_from` ordered by (created_at, id).
+
+    `filters` are SQL conditions (ANDed, with %s placeholders in `params`).
+    Instead of OFFSET, the page continues after the previous page's last
+    (created_at, id), so every page costs the same and uses the
+    (filter, created_at, id) indexes added in utils/migrations.py.
+    Rows without a created_at sort as MySQL puts NULLs: first when oldest
+    first, last when newest first. Returns (rows, next_cursor or None).
+    """
+    filters = list(filters)
+    params = list(params)
+    if page["date_from"]:
+        filters.append("created_at >= %s")
+        params.append(page["date_from"])
+    if page["date_to"]:
+        # Inclusive end date
+        filters.append("created_at < %s")
+        params.append(page["date_to"] + timedelta(days=1))
+
+    desc = page["sort"] == "newest"
+    op, order = ("<", "DESC") if desc else (">", "ASC")
+    if page["after"]:
+        created_at, row_id = page["after"]
+        if created_at is None:
+            if desc:
+                # NULLs come last: only the rest of them are left
+                filters.append(f"(created_at IS NULL AND id {op} %s)")
+            else:
+                # NULLs come first: the rest of them, then every dated row
+                filters.append(f"((created_at IS NULL AND id {op} %s) OR created_at IS NOT NULL)")
+            params.append(row_id)
+        else:
+            null_rows = " OR created_at IS NULL" if desc else ""
+            filters.append(f"(created_at {op} %s OR (created_at = %s AND id {op} %s){null_rows})")
+            params.extend([created_at, created_at, row_id])
+
+    where = f" WHERE {' AND '.join(filters)}" if filters else ""
+    cursor.execute(f"{select_from}{where} ORDER BY created_at {order}, id {order} LIMIT %s",
+                   params + [page["limit"] + 1])
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > page["limit"]:
+        rows = rows[:page["limit"]]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def jsonable(row):
+    """Row dict with datetimes as ISO strings, for the JSON variants of the admin views."""
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
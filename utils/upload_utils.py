@@ -1,13 +1,20 @@
 import os
 import subprocess
 # Import get_plan_limit and potentially remove get_db if no longer needed here
-from utils.db_utils import get_db, get_user_id, get_user_plan, get_plan_limit
+from utils.db_utils import get_bot_count, get_user_id, get_user_plan, get_plan_limit
 import zipfile
 from werkzeug.utils import secure_filename
 # Removed save_uploaded_app as it's handled in routes
 # from utils.db_utils import save_uploaded_app
 import platform
 import sys
+import re
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from utils import venv_store, venv_pool, wheelhouse
 
 # Get base directory for a user
 def get_user_paths(google_id):
@@ -32,14 +39,8 @@ def get_user_paths(google_id):
 # Check if user can upload more apps based on their plan
 def is_upload_allowed(user_id, plan):
     """Checks if the user can upload a new app based on their plan limit."""
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
-    # Count bots associated with the user_id
-    cursor.execute("SELECT COUNT(*) as count FROM bots WHERE user_id = %s", (user_id,))
-    result = cursor.fetchone()
-    count = result["count"] if result else 0
-    cursor.close()
-    conn.close()
+    # Maintained counter instead of counting the user's bots rows
+    count = get_bot_count(user_id)
 
     # Get the limit using the helper function
     limit = get_plan_limit(plan)
@@ -52,10 +53,215 @@ def is_upload_allowed(user_id, plan):
 
 # Create virtual environment if it doesn't exist
 def create_venv_if_missing(venv_path):
+    if os.path.exists(venv_path):
+        return
+    # A pre-built one from the pool takes milliseconds instead of seconds
+    if venv_pool.claim(venv_path):
+        return
+    # The platform's own interpreter, whatever 'python' on PATH happens to be
+    subprocess.run([sys.executable, "-m", "venv", venv_path], check=True)
+    print(f"✅ Virtualenv created at {venv_path}")
+
+
+def build_venv(venv_path, requirements_path=None, cwd=None, log_path=None):
+    """
+    Create venv_path with requirements_path installed. When a venv with the
+    same requirements was built before, it is cloned from the venv store
+    (utils/venv_store.py) instead. Returns True if a stored venv was reused.
+    """
+    if os.path.exists(venv_path):
+        # The upload brought its own venv; keep using it as before
+        if requirements_path and os.path.exists(requirements_path):
+            install_requirements(venv_path, requirements_path, cwd=cwd, log_path=log_path)
+        write_lock(venv_path, requirements_path)
+        return False
+
+    key = venv_store.requirements_key(requirements_path, venv_pool.PYTHON_TAG)
+    if venv_store.clone(key, venv_path) is not None:
+        return True
+
+    started = time.perf_counter()
+    create_venv_if_missing(venv_path)
+    if requirements_path and os.path.exists(requirements_path):
+        install_requirements(venv_path, requirements_path, cwd=cwd, log_path=log_path)
+    write_lock(venv_path, requirements_path)
+    venv_store.add(key, venv_path, time.perf_counter() - started, requirements_path)
+    return False
+
+
+# --- Incremental sync on edit ---
+
+# Written into each app venv: the requirements it was built from and what pip installed
+LOCK_FILE = "requirements.lock.json"
+# A normalized plain requirement: name, optional [extras], optional version specifiers, nothing else
+# (no markers, URLs or per-requirement options such as --hash)
+_PROJECT_NAME_RE = re.compile(r"^([a-z0-9][a-z0-9-]*)(\[[^\]]*\])?([=<>!~][^;@\s]*)?$")
+
+
+# Run with an app venv's python: prints {project: [projects it requires]} for every installed
+# distribution (PEP 503 names; extras and markers are ignored, so it can only over-keep)
+_DEPENDENCY_GRAPH_SCRIPT = """
+import json, re
+from importlib import metadata
+def name(text):
+    return re.sub(r"[-_.]+", "-", re.match(r"\\s*([A-Za-z0-9][A-Za-z0-9._-]*)", text).group(1)).lower()
+print(json.dumps({name(d.metadata["Name"]): [name(r) for r in d.requires or []]
+                  for d in metadata.distributions() if d.metadata["Name"]}))
+"""
+
+
+def _venv_python(venv_path):
+    if platform.system() == "Windows":
+        return os.path.join(venv_path, "Scripts", "python.exe")
+    return os.path.join(venv_path, "bin", "python")
+
+
+def _read_requirements(requirements_path):
+    if requirements_path and os.path.exists(requirements_path):
+        with open(requirements_path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+    return ""
+
+
+def read_lock(venv_path):
+    try:
+        with open(os.path.join(venv_path, LOCK_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_lock(venv_path, requirements_path):
+    """Record requirements_path (normalized, hashed) and the venv's installed packages in the venv's lock file."""
+    text = _read_requirements(requirements_path)
+    normalized = venv_store.normalize_requirements(text)
+    try:
+        listed = subprocess.run([_venv_python(venv_path), "-m", "pip", "list", "--format=json"],
+                                check=True, capture_output=True, text=True, env=wheelhouse.pip_env()).stdout
+        packages = {p["name"]: p["version"] for p in json.loads(listed)}
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"⚠️ Could not list packages in {venv_path}: {e}")
+        packages = None
+    lock = {"requirements_hash": hashlib.sha256((normalized if normalized is not None else text).encode("utf-8")).hexdigest(),
+            # None when the file pulls in others (-r, -e, local paths): those are always fully reinstalled
+            "requirements": normalized.splitlines() if normalized is not None else None,
+            "packages": packages, "written_at": time.time()}
+    path = os.path.join(venv_path, LOCK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(lock, f, indent=2)
+    # Replaced, not rewritten, so a venv hardlinked from the venv store keeps the store's copy intact
+    os.replace(path + ".tmp", path)
+    return lock
+
+
+def _by_project(lines):
+    """
+    {project name: requirement line} plus the set of option lines (--index-url ...),
+    or (None, None) if a line is a URL, VCS or marker requirement whose project
+    name can't be read off the line, or carries --hash options (pip's hash
+    checking needs the whole file); those files are always fully reinstalled.
+    """
+    requirements, options = {}, set()
+    for line in lines:
+        if line.startswith("-"):
+            options.add(line)
+            continue
+        match = _PROJECT_NAME_RE.match(line)
+        if not match:
+            return None, None
+        requirements[match.group(1)] = line
+    return requirements, options
+
+
+def _dependency_graph(venv_path):
+    """{project: [projects it requires]} for what is installed in venv_path, or None if it can't be read."""
+    try:
+        listed = subprocess.run([_venv_python(venv_path), "-c", _DEPENDENCY_GRAPH_SCRIPT],
+                                check=True, capture_output=True, text=True).stdout
+        graph = json.loads(listed)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"⚠️ Could not read the dependency graph of {venv_path}: {e}")
+        return None
+    return graph if isinstance(graph, dict) else None
+
+
+def _required_by(graph, projects):
+    """projects plus everything they depend on, directly or not."""
+    required, pending = set(), list(projects)
+    while pending:
+        project = pending.pop()
+        if project not in required:
+            required.add(project)
+            pending.extend(graph.get(project, ()))
+    return required
+
+
+def sync_requirements(venv_path, requirements_path, cwd=None, log_path=None):
+    """
+    Bring an existing app venv in line with requirements_path, using the
+    lock written at its last build/sync: nothing when the normalized
+    requirements hash is unchanged, otherwise install only the added or
+    changed lines, then uninstall the removed projects that nothing left
+    still depends on. Falls back to a full install when there is no usable
+    lock, and to a fresh venv when lines were removed but the installed
+    dependency graph can't be read. A missing venv is built.
+    Returns "built", "unchanged", "synced" or "installed".
+    """
     if not os.path.exists(venv_path):
-        # Change 'python3' to 'python' for Windows compatibility
-        subprocess.run(["python", "-m", "venv", venv_path], check=True)
-        print(f"✅ Virtualenv created at {venv_path}")
+        build_venv(venv_path, requirements_path, cwd=cwd, log_path=log_path)
+        return "built"
+
+    normalized = venv_store.normalize_requirements(_read_requirements(requirements_path))
+    lock = read_lock(venv_path)
+    if lock and normalized is not None and lock.get("requirements") is not None:
+        if lock.get("requirements_hash") == hashlib.sha256(normalized.encode("utf-8")).hexdigest():
+            print(f"ℹ️ Requirements unchanged for {venv_path}, skipping install")
+            return "unchanged"
+
+        old, old_options = _by_project(lock["requirements"])
+        new, new_options = _by_project(normalized.splitlines())
+        if old is not None and new is not None and old_options == new_options:
+            removed = sorted(set(old) - set(new))
+            changed = [line for name, line in sorted(new.items()) if old.get(name) != line]
+            print(f"⏳ Syncing {venv_path}: {len(changed)} added/changed, {len(removed)} removed")
+            if changed:
+                with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+                    f.write("\n".join(changed) + "\n")
+                try:
+                    install_requirements(venv_path, f.name, cwd=cwd, log_path=log_path)
+                finally:
+                    os.remove(f.name)
+            if removed:
+                # After the install, so what the new lines pull in counts as still needed
+                graph = _dependency_graph(venv_path)
+                if graph is None:
+                    print(f"♻️ Rebuilding {venv_path} from scratch instead of uninstalling {', '.join(removed)}")
+                    shutil.rmtree(venv_path)
+                    build_venv(venv_path, requirements_path, cwd=cwd, log_path=log_path)
+                    return "built"
+                needed = _required_by(graph, new)
+                kept = [name for name in removed if name in needed]
+                if kept:
+                    print(f"ℹ️ Keeping {', '.join(kept)}: still required by the remaining requirements")
+                unused = [name for name in removed if name not in needed]
+                if unused:
+                    _run_pip(venv_path, ["uninstall", "-y", *unused], cwd, log_path)
+            write_lock(venv_path, requirements_path)
+            return "synced"
+
+    # No lock yet (venv built before locks existed), index options changed, or URL/VCS/marker lines
+    if requirements_path and os.path.exists(requirements_path):
+        install_requirements(venv_path, requirements_path, cwd=cwd, log_path=log_path)
+    write_lock(venv_path, requirements_path)
+    return "installed"
+
+
+def _run_pip(venv_path, args, cwd=None, log_path=None):
+    command = [_venv_python(venv_path), "-m", "pip", *args]
+    if log_path:
+        _run_logged(command, cwd, log_path)
+    else:
+        subprocess.run(command, check=True, cwd=cwd, capture_output=True, text=True, env=wheelhouse.pip_env())
 
 # Install requirements.txt inside user's venv
 import subprocess
@@ -63,7 +269,7 @@ import os
 import platform
 import sys # sys मॉड्यूल इम्पोर्ट करें
 
-def install_requirements(venv_path, requirements_path, cwd=None):
+def install_requirements(venv_path, requirements_path, cwd=None, log_path=None):
     """
     Installs packages from a requirements file into the specified virtual environment.
 
@@ -71,6 +277,8 @@ def install_requirements(venv_path, requirements_path, cwd=None):
         venv_path (str): The path to the virtual environment.
         requirements_path (str): The path to the requirements.txt file.
         cwd (str, optional): The working directory for the subprocess. Defaults to None.
+        log_path (str, optional): Append pip's output to this file as it runs
+            (app builds stream it to the dashboard) instead of capturing it.
     """
     if not os.path.exists(requirements_path):
         print(f"ℹ️ Requirements file not found at {requirements_path}, skipping installation.")
@@ -97,16 +305,23 @@ def install_requirements(venv_path, requirements_path, cwd=None):
          raise FileNotFoundError(f"Python executable missing in venv: {python_executable}")
 
 
+    if log_path:
+        def run(command):
+            _run_logged(command, cwd, log_path)
+
+        def note(message):
+            print(message)
+            with open(log_path, "a", encoding="utf-8") as log:
+                log.write(message + "\n")
+    else:
+        def run(command):
+            subprocess.run(command, check=True, cwd=cwd, capture_output=True, text=True, env=wheelhouse.pip_env())
+        note = print
+
     try:
-        # Use the venv's python to run pip
-        command = [
-            python_executable,
-            "-m", "pip", "install",
-            "-r", requirements_path,
-            "--log", os.path.join(os.path.dirname(venv_path), f"{os.path.basename(venv_path)}_pip_install.log") # Log output
-            # Add other pip options if needed, e.g., --no-cache-dir
-        ]
-        subprocess.run(command, check=True, cwd=cwd, capture_output=True, text=True) # Use capture_output and text=True
+        # Use the venv's python to run pip; the wheelhouse and shared pip cache are tried first
+        pip_log = os.path.join(os.path.dirname(venv_path), f"{os.path.basename(venv_path)}_pip_install.log")
+        wheelhouse.install(python_executable, requirements_path, run, pip_args=["--log", pip_log], note=note)
         print(f"✅ Successfully installed requirements into {venv_path}")
     except subprocess.CalledProcessError as e:
         print(f"❌ Failed to install requirements into {venv_path}.")
@@ -118,6 +333,20 @@ def install_requirements(venv_path, requirements_path, cwd=None):
          raise # Re-raise the error
 
 
+def _run_logged(command, cwd, log_path):
+    """Run command with stdout and stderr appended to log_path; on failure the log's tail becomes e.stderr."""
+    with open(log_path, "a", encoding="utf-8") as log:
+        log.flush()
+        start = log.tell()
+        returncode = subprocess.run(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT,
+                                    env=wheelhouse.pip_env()).returncode
+    if returncode != 0:
+        with open(log_path, encoding="utf-8", errors="replace") as log:
+            log.seek(start)
+            tail = log.read()[-4000:]
+        raise subprocess.CalledProcessError(returncode, command, stderr=tail)
+
+
 # Save uploaded files (This function might not need changes if routes/bot_manager.py handles paths correctly)
 # Review routes/bot_manager.py upload_app function to ensure it uses the returned paths correctly.
 # The second returned path from get_user_paths (scripts_dir) is the final destination.
@@ -0,0 +1,79 @@
+import os
+import time
+from utils.file_lock import file_lock
+from utils.generation import SharedGeneration
+from utils.app_registry import REGISTRY_DIR
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+class TTLCache:
+    """
+    Per-worker read-through cache for values that rarely change (user id, plan).
+
+    Entries expire after `ttl` seconds. invalidate() bumps a generation
+    counter shared by every gunicorn worker; each worker compares it on
+    every lookup (a memory read) and drops its whole cache when it moved,
+    so a plan change is visible everywhere on the next request. load()
+    must read committed data as of now (not an older transaction
+    snapshot), or a value from before an invalidation could be cached.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_MAX_ENTRIES, registry_dir=REGISTRY_DIR):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock_path = os.path.join(registry_dir, "user_cache.lock")
+        self.generation = SharedGeneration(os.path.join(registry_dir, "user_cache.generation"))
+        self.seen_generation = self.generation.get()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        """Return the cached value for key, calling load() on a miss. None is never cached."""
+        if self.ttl <= 0:
+            return load()
+
+        generation = self.generation.get()
+        if generation != self.seen_generation:
+            self.entries.clear()
+            self.seen_generation = generation
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        value = load()
+        # An invalidate() that landed while loading may mean load() read the old value; don't keep it
+        if value is not None and self.generation.get() == generation:
+            if len(self.entries) >= self.max_entries:
+                self.entries.clear()
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+        return value
+
+    def invalidate(self):
+        """Drop cached entries in every worker. Call after the write is committed."""
+        with file_lock(self.lock_path):
+            self.generation.bump()
+        self.entries.clear()
+
+    def snapshot(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "ttl": self.ttl, "generation": self.generation.get()}
+
+
+_cache = None
+
+def get_user_cache():
+    global _cache
+    if _cache is None:
+        _cache = TTLCache()
+    return _cache
+
+
+def invalidate_user_cache():
+    """Forget cached user ids and plans in every worker (after a plan change, approval or user delete)."""
+    get_user_cache().invalidate()
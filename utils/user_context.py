@@ -0,0 +1,54 @@
+from flask import g, session
+from utils.db_utils import db_cursor, get_user_apps, get_plan_limit
+
+
+class UserContext:
+    """
+    What the dashboard, profile and contact pages show about the logged-in
+    user: id, plan and its app limit, app count and the latest upgrade
+    request - loaded with one query. The app list itself is fetched (one more
+    query) only by pages that use it.
+    """
+
+    def __init__(self, google_id, row):
+        self.google_id = google_id
+        self.user_id = row["id"] if row else session.get("user_id")
+        self.plan = (row["plan"] if row else None) or "free"
+        self.plan_limit = get_plan_limit(self.plan)
+        self.app_count = row["bot_count"] if row else 0
+        self.latest_upgrade_request = None
+        if row and row["request_status"] is not None:
+            self.latest_upgrade_request = {"requested_plan": row["requested_plan"],
+                                           "status": row["request_status"],
+                                           "created_at": row["request_created_at"]}
+        self._apps = None
+
+    @property
+    def apps(self):
+        if self._apps is None:
+            self._apps = get_user_apps(self.user_id)
+        return self._apps
+
+
+def load_user_context(google_id):
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute("""
+            SELECT c.id, c.plan, c.bot_count,
+                   r.requested_plan, r.status AS request_status, r.created_at AS request_created_at
+            FROM clients c
+            LEFT JOIN upgrade_requests r ON r.id = (
+                SELECT id FROM upgrade_requests WHERE user_id = c.id
+                ORDER BY created_at DESC, id DESC LIMIT 1
+            )
+            WHERE c.google_id = %s
+        """, (google_id,))
+        return UserContext(google_id, cursor.fetchone())
+
+
+def get_user_context():
+    """The logged-in user's UserContext, loaded once per request and kept on flask.g."""
+    context = g.get("user_context")
+    if context is None or context.google_id != session.get("google_id"):
+        context = g.user_context = load_user_context(session.get("google_id"))
+    return context
+
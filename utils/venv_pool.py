@@ -0,0 +1,117 @@
+"""
+Pool of pre-built, empty virtualenvs.
+
+`python -m venv` bootstraps pip through ensurepip, which takes seconds. The
+pool keeps VENV_POOL_SIZE skeleton venvs ready in VENV_POOL_DIR/<python
+tag>/ready/; claim() moves one to where an app needs it (a rename plus
+rewriting the venv's own paths) and refills the pool in a background thread.
+
+    python -m utils.venv_pool          # fill the pool now, e.g. from a deploy script
+    python -m utils.venv_pool --status
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import argparse
+import threading
+import subprocess
+import sysconfig
+from utils.file_lock import file_lock
+from utils.app_registry import REGISTRY_DIR
+from utils.venv_store import relocate_venv
+
+VENV_POOL_DIR = os.getenv("VENV_POOL_DIR", os.path.join(REGISTRY_DIR, "venv_pool"))
+VENV_POOL_SIZE = int(os.getenv("VENV_POOL_SIZE", "2"))
+
+# Skeletons only fit the interpreter they were made with
+PYTHON_TAG = f"{sys.implementation.cache_tag}-{sysconfig.get_platform()}"
+_READY_DIR = os.path.join(VENV_POOL_DIR, PYTHON_TAG, "ready")
+_BUILDING_DIR = os.path.join(VENV_POOL_DIR, PYTHON_TAG, "building")
+_REFILL_LOCK = os.path.join(VENV_POOL_DIR, PYTHON_TAG, "refill.lock")
+
+
+def _ready():
+    try:
+        return sorted(os.listdir(_READY_DIR))
+    except FileNotFoundError:
+        return []
+
+
+def claim(venv_path):
+    """Move a ready skeleton venv to venv_path. Returns False when the pool is empty (or off)."""
+    if VENV_POOL_SIZE <= 0:
+        return False
+    claimed = False
+    for name in _ready():
+        skeleton = os.path.join(_READY_DIR, name, "venv")
+        try:
+            # Atomic, so two workers can never claim the same skeleton
+            os.rename(skeleton, venv_path)
+        except FileNotFoundError:
+            continue  # another worker took it
+        except OSError as e:
+            # e.g. venv_path on another filesystem; fall back to python -m venv
+            print(f"⚠️ Could not claim pooled venv for {venv_path}: {e}")
+            break
+        shutil.rmtree(os.path.join(_READY_DIR, name), ignore_errors=True)
+        # Its scripts still name the building/ path it was created at
+        relocate_venv(venv_path, os.path.join(_BUILDING_DIR, name, "venv"))
+        print(f"✅ Claimed pooled venv for {venv_path}")
+        claimed = True
+        break
+    start_refill()
+    return claimed
+
+
+def _create_skeleton():
+    name = uuid.uuid4().hex
+    building = os.path.join(_BUILDING_DIR, name)
+    os.makedirs(building)
+    subprocess.run([sys.executable, "-m", "venv", os.path.join(building, "venv")],
+                   check=True, capture_output=True)
+    os.makedirs(_READY_DIR, exist_ok=True)
+    os.rename(building, os.path.join(_READY_DIR, name))
+
+
+def refill():
+    """Build skeletons until VENV_POOL_SIZE are ready. Only one process refills at a time."""
+    if VENV_POOL_SIZE <= 0:
+        return
+    os.makedirs(_BUILDING_DIR, exist_ok=True)
+    with file_lock(_REFILL_LOCK, blocking=False) as locked:
+        if not locked:
+            return
+        # Whatever is still here was left by a refill that died halfway
+        for name in os.listdir(_BUILDING_DIR):
+            shutil.rmtree(os.path.join(_BUILDING_DIR, name), ignore_errors=True)
+        while len(_ready()) < VENV_POOL_SIZE:
+            try:
+                _create_skeleton()
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"⚠️ Could not pre-build a venv: {e}")
+                return
+
+
+def start_refill():
+    threading.Thread(target=refill, name="venv-pool-refill", daemon=True).start()
+
+
+def pool_status():
+    return {"python": PYTHON_TAG, "size": VENV_POOL_SIZE, "ready": len(_ready())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-build the app venv pool.")
+    parser.add_argument("--status", action="store_true", help="only show how many venvs are ready")
+    args = parser.parse_args()
+    if not args.status:
+        started = time.perf_counter()
+        refill()
+        print(f"✅ Venv pool filled in {time.perf_counter() - started:.1f}s")
+    print(pool_status())
+
+
+if __name__ == "__main__":
+    main()
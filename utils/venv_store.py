@@ -0,0 +1,238 @@
+"""
+Content-addressed store of built virtualenvs.
+
+Most hosted apps ask for the same handful of packages, so a venv built for
+one requirements.txt is kept in VENV_STORE_DIR/<key>/venv, keyed by the
+normalized requirements plus the interpreter they were installed for. The
+next app with matching requirements gets a clone made of hardlinks (a copy
+across filesystems) with the venv's absolute paths rewritten, instead of a
+fresh `python -m venv` and `pip install`.
+
+    key = requirements_key(req_path, python_tag)
+    if not clone(key, venv_path):
+        ...build venv_path...
+        add(key, venv_path, build_seconds)
+
+Hits, misses and the build time saved are counted across workers in
+VENV_STORE_DIR/stats.json (see store_stats, /admin/venv-store).
+"""
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from utils.file_lock import file_lock
+from utils.app_registry import REGISTRY_DIR
+
+VENV_STORE_DIR = os.getenv("VENV_STORE_DIR", os.path.join(REGISTRY_DIR, "venvs"))
+VENV_STORE_MAX_ENTRIES = int(os.getenv("VENV_STORE_MAX_ENTRIES", "20"))
+# Unpinned requirements would otherwise keep resolving to the versions of the first build
+VENV_STORE_MAX_AGE_DAYS = float(os.getenv("VENV_STORE_MAX_AGE_DAYS", "7"))
+VENV_STORE_ENABLED = os.getenv("VENV_STORE_ENABLED", "1") == "1"
+
+STATS_PATH = os.path.join(VENV_STORE_DIR, "stats.json")
+_NAME_RE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$")
+# Venv files that embed the venv's own absolute path
+_RELOCATE_DIRS = ("bin", "Scripts")
+_RELOCATE_FILES = ("pyvenv.cfg",)
+_RELOCATE_MAX_BYTES = 1024 * 1024
+
+
+def normalize_requirements(text):
+    """
+    Canonical form of a requirements file: comments and blank lines dropped,
+    continuations joined, project names normalized (PEP 503), one
+    requirement per line, sorted.
+    Returns None for files that reference other files or local paths
+    (-r, -e, ./pkg), whose contents the hash can't see.
+    """
+    lines = []
+    # pip's line continuations, as in hashed lock files (name==version \ --hash=...)
+    for raw in re.sub(r"\\\r?\n", " ", text).splitlines():
+        line = raw.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith(("-r", "-c", "-e", "--requirement", "--constraint", "--editable", ".", "/", "file:")):
+            return None
+        match = _NAME_RE.match(line)
+        if match and not line.startswith("-"):
+            name, rest = match.groups()
+            # Per-requirement options (--hash=...) stay apart from the specifier
+            spec, *options = re.split(r"\s+(?=--)", rest)
+            line = " ".join([re.sub(r"[-_.]+", "-", name).lower() + re.sub(r"\s+", "", spec), *sorted(options)])
+        lines.append(line)
+    return "\n".join(sorted(set(lines)))
+
+
+def requirements_key(requirements_path, python_tag):
+    """Store key for a requirements file (None: no file means an empty one) and interpreter, or None if it can't be cached."""
+    text = ""
+    if requirements_path and os.path.exists(requirements_path):
+        with open(requirements_path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    normalized = normalize_requirements(text)
+    if normalized is None:
+        return None
+    return hashlib.sha256(f"{python_tag}\n{normalized}".encode("utf-8")).hexdigest()[:32]
+
+
+def _entry_dir(key):
+    return os.path.join(VENV_STORE_DIR, key)
+
+
+def _read_meta(key):
+    try:
+        with open(os.path.join(_entry_dir(key), "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def relocate_venv(venv_path, old_path):
+    """
+    Point a venv that was created at old_path (then copied or moved) at
+    venv_path: rewrites the script shebangs, activate scripts and pyvenv.cfg.
+    Rewritten files are replaced, never written through, so hardlinks stay intact.
+    """
+    old, new = os.path.abspath(old_path).encode(), os.path.abspath(venv_path).encode()
+    if old == new:
+        return
+    candidates = [os.path.join(venv_path, name) for name in _RELOCATE_FILES]
+    for folder in _RELOCATE_DIRS:
+        folder = os.path.join(venv_path, folder)
+        if os.path.isdir(folder):
+            candidates += [os.path.join(folder, name) for name in os.listdir(folder)]
+    for path in candidates:
+        if os.path.islink(path) or not os.path.isfile(path) or os.path.getsize(path) > _RELOCATE_MAX_BYTES:
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        if old not in data:
+            continue
+        mode = os.stat(path).st_mode
+        # Replace the link rather than writing through it into the store
+        os.remove(path)
+        with open(path, "wb") as f:
+            f.write(data.replace(old, new))
+        os.chmod(path, mode)
+
+
+def copy_venv(src, dst):
+    """Clone src to dst with hardlinks, then give dst its own copies of the files that name src."""
+    shutil.copytree(src, dst, symlinks=True, copy_function=_link_or_copy)
+    relocate_venv(dst, src)
+
+
+def _count(**changes):
+    os.makedirs(VENV_STORE_DIR, exist_ok=True)
+    with file_lock(STATS_PATH + ".lock"):
+        try:
+            with open(STATS_PATH) as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            stats = {}
+        for field, value in changes.items():
+            stats[field] = stats.get(field, 0) + value
+        with open(STATS_PATH + ".tmp", "w") as f:
+            json.dump(stats, f)
+        os.replace(STATS_PATH + ".tmp", STATS_PATH)
+
+
+def clone(key, venv_path):
+    """Clone the stored venv for `key` to venv_path. Returns the build seconds saved, or None on a miss."""
+    if not VENV_STORE_ENABLED or key is None:
+        return None
+    meta = _read_meta(key)
+    if meta is None or time.time() - meta.get("created_at", 0) > VENV_STORE_MAX_AGE_DAYS * 86400:
+        _count(misses=1)
+        return None
+
+    started = time.perf_counter()
+    try:
+        # add() may be replacing this entry right now
+        with file_lock(os.path.join(VENV_STORE_DIR, "store.lock")):
+            copy_venv(os.path.join(_entry_dir(key), "venv"), venv_path)
+    except OSError as e:
+        print(f"⚠️ Could not clone stored venv {key}: {e}")
+        shutil.rmtree(venv_path, ignore_errors=True)
+        _count(misses=1)
+        return None
+    elapsed = time.perf_counter() - started
+    saved = max(meta.get("build_seconds", 0) - elapsed, 0)
+    os.utime(os.path.join(_entry_dir(key), "meta.json"))  # last use, for eviction
+    _count(hits=1, seconds_saved=saved)
+    print(f"✅ Reused stored venv {key} for {venv_path} in {elapsed:.2f}s (saved ~{saved:.0f}s)")
+    return saved
+
+
+def add(key, venv_path, build_seconds, requirements_path=None):
+    """Put a freshly built venv into the store (a hardlinked copy; venv_path stays as it is)."""
+    if not VENV_STORE_ENABLED or key is None:
+        return
+    os.makedirs(VENV_STORE_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{key}_", dir=VENV_STORE_DIR)
+    try:
+        copy_venv(venv_path, os.path.join(staging, "venv"))
+        requirements = ""
+        if requirements_path and os.path.exists(requirements_path):
+            with open(requirements_path, encoding="utf-8", errors="replace") as f:
+                requirements = normalize_requirements(f.read()) or ""
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"created_at": time.time(), "build_seconds": build_seconds, "requirements": requirements}, f)
+
+        with file_lock(os.path.join(VENV_STORE_DIR, "store.lock")):
+            entry = _entry_dir(key)
+            if os.path.exists(entry):
+                # An expired entry being rebuilt, or another worker got there first
+                shutil.rmtree(entry, ignore_errors=True)
+            os.rename(staging, entry)
+            relocate_venv(os.path.join(entry, "venv"), os.path.join(staging, "venv"))
+            staging = None
+            _evict()
+        print(f"✅ Stored venv {key} ({build_seconds:.0f}s build)")
+    except OSError as e:
+        print(f"⚠️ Could not store venv {key}: {e}")
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _evict():
+    """Drop the least recently used entries beyond VENV_STORE_MAX_ENTRIES (caller holds store.lock)."""
+    entries = []
+    for key in os.listdir(VENV_STORE_DIR):
+        meta_path = os.path.join(VENV_STORE_DIR, key, "meta.json")
+        if not key.startswith(".") and os.path.exists(meta_path):
+            entries.append((os.path.getmtime(meta_path), key))
+    entries.sort(reverse=True)
+    for _, key in entries[VENV_STORE_MAX_ENTRIES:]:
+        shutil.rmtree(_entry_dir(key), ignore_errors=True)
+        print(f"ℹ️ Evicted stored venv {key}")
+
+
+def store_stats():
+    """{hits, misses, hit_ratio, seconds_saved, entries: [...]} for the whole store."""
+    try:
+        with open(STATS_PATH) as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        stats = {}
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    entries = []
+    if os.path.isdir(VENV_STORE_DIR):
+        for key in sorted(os.listdir(VENV_STORE_DIR)):
+            meta = None if key.startswith(".") else _read_meta(key)
+            if meta is not None:
+                entries.append(dict(meta, key=key, requirements=meta.get("requirements", "").splitlines(),
+                                    last_used=os.path.getmtime(os.path.join(_entry_dir(key), "meta.json"))))
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / (hits + misses) if hits + misses else None,
+            "seconds_saved": stats.get("seconds_saved", 0.0), "entries": entries}
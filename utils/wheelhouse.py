@@ -0,0 +1,142 @@
+"""
+Platform-managed wheelhouse and shared pip cache for app builds.
+
+Every wheel pip builds or downloads for a hosted app is kept in
+WHEELHOUSE_DIR, and every pip run shares PIP_CACHE_DIR. With
+WHEELHOUSE_MODE=prefer (default) a requirements file whose lines are all
+pinned (name==version) is first installed from the wheelhouse alone
+(--no-index --find-links); otherwise, or when something is missing, pip
+resolves against the index (so unpinned requirements get their latest
+release, not whatever the wheelhouse happens to hold), the wheels are added
+to the wheelhouse and installed from there. offline never touches the
+network; off is plain `pip install`.
+
+    python -m utils.wheelhouse             # pre-populate from every app's requirements.txt
+    python -m utils.wheelhouse --status
+"""
+import os
+import re
+import sys
+import glob
+import shutil
+import argparse
+import tempfile
+import subprocess
+from utils.app_registry import PROJECT_ROOT, REGISTRY_DIR
+
+WHEELHOUSE_DIR = os.getenv("WHEELHOUSE_DIR", os.path.join(REGISTRY_DIR, "wheelhouse"))
+PIP_CACHE_DIR = os.getenv("PIP_CACHE_DIR", os.path.join(REGISTRY_DIR, "pip-cache"))
+WHEELHOUSE_MODE = os.getenv("WHEELHOUSE_MODE", "prefer")  # prefer, offline or off
+
+# name[extras]==version, optionally with an environment marker
+_PINNED_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*(\[[^\]]*\])?\s*==\s*[^\s*,;]+\s*(;.*)?$")
+
+
+def pip_env():
+    """Environment for pip subprocesses: the shared cache, unbuffered output."""
+    return dict(os.environ, PIP_CACHE_DIR=PIP_CACHE_DIR, PYTHONUNBUFFERED="1")
+
+
+def add_wheels(python_executable, requirements_path, run):
+    """Build/download wheels for requirements_path with `python_executable` and add them to the wheelhouse."""
+    os.makedirs(WHEELHOUSE_DIR, exist_ok=True)
+    # Written aside first, so a concurrent install never sees a half-written wheel
+    staging = tempfile.mkdtemp(prefix=".incoming_", dir=WHEELHOUSE_DIR)
+    try:
+        run([python_executable, "-m", "pip", "wheel", "-r", requirements_path,
+             "-w", staging, "--find-links", WHEELHOUSE_DIR])
+        added = 0
+        for wheel in glob.glob(os.path.join(staging, "*.whl")):
+            target = os.path.join(WHEELHOUSE_DIR, os.path.basename(wheel))
+            if not os.path.exists(target):
+                added += 1
+            os.replace(wheel, target)
+        return added
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def fully_pinned(requirements_path):
+    """True if every requirement is an exact name==version pin (no ranges, URLs, -r/-e or other options)."""
+    try:
+        with open(requirements_path, encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return False
+    # pip's line continuations, as in hashed lock files (name==version \ --hash=... \ --hash=...)
+    for line in re.sub(r"\\\r?\n", " ", text).splitlines():
+        line = line.split(" #", 1)[0].strip()
+        line = re.sub(r"\s+--hash[= ]\S+", "", line)
+        if not line or line.startswith("#"):
+            continue
+        if not _PINNED_RE.match(line):
+            return False
+    return True
+
+
+def install(python_executable, requirements_path, run, pip_args=(), note=print):
+    """
+    pip install -r requirements_path into the venv of python_executable,
+    according to WHEELHOUSE_MODE. `run(command)` runs pip and raises
+    CalledProcessError on failure; `note(message)` reports fallbacks.
+    """
+    command = [python_executable, "-m", "pip", "install", "-r", requirements_path, *pip_args]
+    if WHEELHOUSE_MODE == "off":
+        return run(command)
+
+    local = command + ["--no-index", "--find-links", WHEELHOUSE_DIR]
+    if WHEELHOUSE_MODE == "offline":
+        return run(local)
+    # Only exact pins can safely skip the index; anything else would freeze at the wheelhouse's version
+    if os.path.isdir(WHEELHOUSE_DIR) and fully_pinned(requirements_path):
+        try:
+            return run(local)
+        except subprocess.CalledProcessError:
+            note("ℹ️ Not everything is in the wheelhouse yet, fetching the missing wheels")
+    try:
+        add_wheels(python_executable, requirements_path, run)
+    except subprocess.CalledProcessError:
+        # e.g. a package that can't be built as a wheel; let pip install handle it directly
+        note("⚠️ Could not add these requirements to the wheelhouse, installing from the index")
+        return run(command)
+    return run(local)
+
+
+def app_requirements():
+    """requirements.txt of every hosted app (apps/<google_id>/<app>/requirements.txt)."""
+    return sorted(glob.glob(os.path.join(PROJECT_ROOT, "apps", "*", "*", "requirements.txt")))
+
+
+def wheelhouse_status():
+    wheels = glob.glob(os.path.join(WHEELHOUSE_DIR, "*.whl"))
+    return {"mode": WHEELHOUSE_MODE, "dir": WHEELHOUSE_DIR, "wheels": len(wheels),
+            "megabytes": round(sum(os.path.getsize(w) for w in wheels) / 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-populate the wheelhouse from all apps' requirements files.")
+    parser.add_argument("--status", action="store_true", help="only show what is in the wheelhouse")
+    args = parser.parse_args()
+
+    if not args.status:
+        def run(command):
+            subprocess.run(command, check=True, env=pip_env())
+
+        failed = []
+        for requirements_path in app_requirements():
+            print(f"⏳ {os.path.relpath(requirements_path, PROJECT_ROOT)}")
+            try:
+                added = add_wheels(sys.executable, requirements_path, run)
+                print(f"✅ {added} new wheel(s)")
+            except subprocess.CalledProcessError as e:
+                print(f"❌ pip wheel failed ({e.returncode})")
+                failed.append(requirements_path)
+        if failed:
+            print(f"⚠️ {len(failed)} requirements file(s) could not be fully added:")
+            for path in failed:
+                print(f"   {path}")
+    print(wheelhouse_status())
+
+
+if __name__ == "__main__":
+    main()